@@ -0,0 +1,90 @@
+'''
+Benchmark of the placement of the cells in the sparse volume
+
+A random circuit is laid out, and the cells of its operations are placed again in an empty volume:
+once cell by cell, like volume[i][j][t] = cell, and once with a single place_cells call per operation,
+like configure_operation does. The time of the whole layout is printed, too.
+
+Usage: python benchmark_volume.py [nr_qubits] [nr_gates]
+'''
+
+import contextlib
+import io
+import random
+import sys
+import time
+
+import main
+import volume as vol
+
+
+def random_qasm(nr_qubits, nr_gates, seed=0):
+    '''
+    :return: QASM string of a random circuit of Clifford gates and a few T gates
+    '''
+    rnd = random.Random(seed)
+    lines = ["// Generated from Cirq", "", "OPENQASM 2.0;", "include \"qelib1.inc\";", "",
+             "// Qubits: []", "qreg q[%d];" % nr_qubits, ""]
+    nr_t_gates = 0
+    for _ in range(nr_gates):
+        qubit = rnd.randrange(nr_qubits)
+        gate = rnd.randrange(4)
+        if gate == 0 and nr_t_gates < 5:
+            lines.append("rz(pi*0.25) q[%d];" % qubit)
+            nr_t_gates += 1
+        elif gate == 1:
+            lines.append("rz(pi*0.5) q[%d];" % qubit)
+        elif gate == 2:
+            lines.append("h q[%d];" % qubit)
+        else:
+            qubit2 = (qubit + rnd.randrange(1, nr_qubits)) % nr_qubits
+            lines.append("cx q[%d],q[%d];" % (qubit, qubit2))
+    return "\n".join(lines)
+
+
+def operation_cells(layout):
+    '''
+    :return: for each operation of the layout, in the order of their ids, the dictionary {(i, j, t): cell}
+    of the cells it spans
+    '''
+    coordinates_of_ids = {cell_id: coordinate for coordinate, cell_id in layout.cell_dictionary.items()}
+    operations = []
+    for op_id in sorted(layout.operations_dictionary):
+        cells = {}
+        for cell_id in layout.operations_dictionary[op_id].spans:
+            (si, sj, st) = coordinates_of_ids[cell_id]
+            cells[(si, sj, st)] = layout.coordinates[si][sj][st]
+        operations.append(cells)
+    return operations
+
+
+def place_each_cell(volume, operations):
+    for cells in operations:
+        for (si, sj, st), cell in cells.items():
+            volume[si][sj][st] = cell
+
+
+def place_batched(volume, operations):
+    for cells in operations:
+        volume.place_cells(cells)
+
+
+if __name__ == "__main__":
+    nr_qubits = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    nr_gates = int(sys.argv[2]) if len(sys.argv) > 2 else 1500
+
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        layout = main.process_string_of_circuit(random_qasm(nr_qubits, nr_gates))
+    print("layout of %d qubits and %d gates: %.2f s, %d cells, depth %d"
+          % (nr_qubits, nr_gates, time.time() - start,
+             layout.coordinates.get_number_of_cells(), layout.coordinates.get_depth()))
+
+    operations = operation_cells(layout)
+    print("%d operations, %d cells" % (len(operations), sum(len(cells) for cells in operations)))
+
+    for (name, place) in [("cell by cell", place_each_cell), ("place_cells", place_batched)]:
+        volume = vol.SparseVolume(layout.get_isize(), layout.get_jsize(), layout.get_tsize())
+        start = time.time()
+        place(volume, operations)
+        print("%15s: %.3f s" % (name, time.time() - start))
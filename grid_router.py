@@ -0,0 +1,188 @@
+from collections import deque
+
+import numpy
+
+# The neighbours of a cell in the order of the adjacency of nx.grid_2d_graph,
+# such that the routes are the routes which nx.astar_path found before
+ROUTE_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+# the direction of the cells which were not reached, and of the start cell
+NO_ROUTE_DIRECTION = 255
+
+
+class GridRouter:
+    def __init__(self, dimension_i, dimension_j, free_coordinates):
+        '''
+            Routes over the free cells of a dimension_i x dimension_j grid.
+            The cells are indexed by i * dimension_j + j
+        :param dimension_i: number of rows
+        :param dimension_j: number of columns
+        :param free_coordinates: the 2D coordinates of the cells which a route can use
+        '''
+        self.dimension_i = dimension_i
+        self.dimension_j = dimension_j
+
+        nr_cells = dimension_i * dimension_j
+        self.is_free = numpy.zeros(nr_cells, dtype=bool)
+        free_coordinates = numpy.array(list(free_coordinates), dtype=numpy.int64).reshape(-1, 2)
+        self.is_free[free_coordinates[:, 0] * dimension_j + free_coordinates[:, 1]] = True
+
+        # for each cell, the index of the neighbour in each of the ROUTE_DIRECTIONS, -1 if it is not free
+        step_i = numpy.array([step[0] for step in ROUTE_DIRECTIONS])
+        step_j = numpy.array([step[1] for step in ROUTE_DIRECTIONS])
+        cells = numpy.arange(nr_cells)
+        next_i = (cells // dimension_j)[:, None] + step_i
+        next_j = (cells % dimension_j)[:, None] + step_j
+        inside = (next_i >= 0) & (next_i < dimension_i) & (next_j >= 0) & (next_j < dimension_j)
+        self.neighbours = numpy.where(inside, next_i * dimension_j + next_j, -1)
+        self.neighbours[inside] = numpy.where(self.is_free[self.neighbours[inside]], self.neighbours[inside], -1)
+
+        # the free neighbours of each cell as lists, which are faster to read one by one
+        self.neighbour_lists = [[cell for cell in row if cell >= 0] for row in self.neighbours.tolist()]
+
+    def cell_index(self, coordinate):
+        return coordinate[0] * self.dimension_j + coordinate[1]
+
+    def cell_coordinate(self, cell):
+        return (cell // self.dimension_j, cell % self.dimension_j)
+
+    def is_free_coordinate(self, coordinate):
+        (qi, qj) = coordinate
+        return (0 <= qi < self.dimension_i) and (0 <= qj < self.dimension_j) and \
+            bool(self.is_free[self.cell_index(coordinate)])
+
+    def find_route(self, start, end, usable_cells=None):
+        '''
+            Breadth first search from start, which stops when end is reached.
+            A cell is reached from the first cell which has it as a neighbour, like
+            in nx.astar_path without a heuristic, so the routes are the same
+        :param start: 2D coordinate of the first cell
+        :param end: 2D coordinate of the last cell
+        :param usable_cells: if not None, a list of booleans indexed by cell, the route uses only
+        the free cells which are usable (for example, the cells which are not busy at some time)
+        :return: list of 2D coordinates from start to end, None if there is no route
+        '''
+        return self.find_shortest_route([start], [end], usable_cells)
+
+    def find_shortest_route(self, starts, ends, usable_cells=None):
+        '''
+            Breadth first search from all the starts at once, which stops when one of the ends is reached.
+            With a single start and a single end, this is find_route
+        :param starts: list of 2D coordinates where the route can begin
+        :param ends: list of 2D coordinates where the route can end
+        :param usable_cells: see find_route
+        :return: the shortest list of 2D coordinates from one of the starts to one of the ends,
+        None if there is no route
+        '''
+        start_cells = [self.cell_index(start) for start in starts if self.is_free_coordinate(start)]
+        end_cells = set(self.cell_index(end) for end in ends if self.is_free_coordinate(end))
+        if usable_cells is not None:
+            start_cells = [cell for cell in start_cells if usable_cells[cell]]
+            end_cells = set(cell for cell in end_cells if usable_cells[cell])
+        if (len(start_cells) == 0) or (len(end_cells) == 0):
+            return None
+
+        predecessors = {}
+        for cell in start_cells:
+            predecessors.setdefault(cell, -1)
+        reached = [cell for cell in start_cells if cell in end_cells]
+        queue = deque(predecessors)
+        while queue and (len(reached) == 0):
+            cell = queue.popleft()
+            for next_cell in self.neighbour_lists[cell]:
+                if (next_cell not in predecessors) and ((usable_cells is None) or usable_cells[next_cell]):
+                    predecessors[next_cell] = cell
+                    queue.append(next_cell)
+                    if next_cell in end_cells:
+                        reached.append(next_cell)
+
+        if len(reached) == 0:
+            return None
+
+        route = []
+        cell = reached[0]
+        while cell != -1:
+            route.append(self.cell_coordinate(cell))
+            cell = predecessors[cell]
+        route.reverse()
+
+        return route
+
+    def compute_route_table(self, sources):
+        '''
+            Breadth first searches from all the sources at once, one distance at a time.
+            A cell is reached by the first cell of the previous distance which has it
+            as a neighbour, like in find_route, so the routes are the same
+        :param sources: the 2D coordinates of the cells where the routes start
+        :return: uint8 array (number of sources, number of cells), the index in
+        ROUTE_DIRECTIONS of the step which reached each cell from each source
+        '''
+        nr_sources = len(sources)
+        nr_cells = self.dimension_i * self.dimension_j
+        source_cells = numpy.array([self.cell_index(source) for source in sources], dtype=numpy.int64)
+
+        route_table = numpy.full((nr_sources, nr_cells), NO_ROUTE_DIRECTION, dtype=numpy.uint8)
+        reached = numpy.zeros((nr_sources, nr_cells), dtype=bool)
+        reached[numpy.arange(nr_sources), source_cells] = True
+
+        # the cells at the current distance from each source, in the order in which they were reached
+        frontier_sources = numpy.arange(nr_sources)
+        frontier_cells = source_cells
+        while len(frontier_cells) > 0:
+            # the neighbours of the frontier cells, in the order of the cells and then of the directions
+            next_cells = self.neighbours[frontier_cells].ravel()
+            next_sources = numpy.repeat(frontier_sources, len(ROUTE_DIRECTIONS))
+            next_directions = numpy.tile(numpy.arange(len(ROUTE_DIRECTIONS)), len(frontier_cells))
+
+            new = next_cells >= 0
+            new[new] = ~reached[next_sources[new], next_cells[new]]
+            next_sources = next_sources[new]
+            next_directions = next_directions[new]
+            next_cells = next_cells[new]
+
+            # keep the first step which reaches a cell, in the order of the frontier
+            (_, first) = numpy.unique(next_sources * nr_cells + next_cells, return_index=True)
+            first.sort()
+            frontier_sources = next_sources[first]
+            frontier_cells = next_cells[first]
+            reached[frontier_sources, frontier_cells] = True
+            route_table[frontier_sources, frontier_cells] = next_directions[first]
+
+        return route_table
+
+    def route_from_table(self, directions, start, end):
+        '''
+            Reads a route backwards from the row of the route table of start, in O(route length)
+        :param directions: the row of start in the table of compute_route_table
+        :param start: 2D coordinate of the first cell
+        :param end: 2D coordinate of the last cell
+        :return: list of 2D coordinates from start to end, None if there is no route
+        '''
+        if (end != start) and \
+                ((not self.is_free_coordinate(end)) or (directions[self.cell_index(end)] == NO_ROUTE_DIRECTION)):
+            return None
+
+        route = [end]
+        (qi, qj) = end
+        while (qi, qj) != start:
+            step = ROUTE_DIRECTIONS[directions[qi * self.dimension_j + qj]]
+            qi -= step[0]
+            qj -= step[1]
+            route.append((qi, qj))
+        route.reverse()
+
+        return route
+
+    def to_networkx(self):
+        '''
+            The free cells as a networkx graph, like the grid graph LayerMap used to build.
+            networkx is imported only here
+        :return: networkx.Graph with 2D coordinates as nodes
+        '''
+        import networkx as nx
+
+        graph = nx.Graph()
+        for cell in numpy.flatnonzero(self.is_free).tolist():
+            graph.add_node(self.cell_coordinate(cell))
+            for next_cell in self.neighbour_lists[cell]:
+                graph.add_edge(self.cell_coordinate(cell), self.cell_coordinate(next_cell))
+        return graph
@@ -1,14 +1,24 @@
 from enum import Enum
+import hashlib
 import math
-import networkx as nx
+import os
+import zipfile
+import numpy
+
+import multibody_commands as mc
+from grid_router import GridRouter, ROUTE_DIRECTIONS
+
+# changes when the routes of a table are computed differently, such that the stored tables are not used
+ROUTE_TABLE_VERSION = 1
 
 class MapCellType(Enum):
     QUBIT = 3
     ANCILLA = 5
     DISTILLATION = 7
 
+
 class LayerMap:
-    def __init__(self, distillation_box_dimensions):
+    def __init__(self, distillation_box_dimensions, precompute_routes=False, route_table_dirname=None):
         # two-dimensional array storing the type of the cells using MapCellType
         self.placement_map = []
 
@@ -23,10 +33,28 @@ class LayerMap:
         # ancilla coordinate will be changed when the placement_one method is called
         self.circuit_qubits_to_patches = {'A': (3, 0), 'ANCILLA': (4, 0)}
 
+        # the corners of the distillation factories and the coordinates where they output the A state
+        # will be changed when the placement_one method is called
+        self.distillation_corners = []
+        self.distillation_outputs = [self.circuit_qubits_to_patches['A']]
+
         # collection of routes between pairs of ancilla patches
         # indexed by tuples formed of ancilla patch 2D coordinates
         self.routes = {}
-        self.grid_graph = None
+        # routes over the ancilla patches, see grid_router
+        self.grid_router = None
+
+        # if True, setup_arrangement_one computes the routes from all the ancilla patches
+        # and the routes are read from the table instead of being searched
+        self.precompute_routes = precompute_routes
+        # the route tables are stored in this directory, one file per arrangement
+        # if None, the table is computed again for every arrangement
+        self.route_table_dirname = route_table_dirname
+        # the index of the ancilla patches in the route table
+        self.route_table_sources = None
+        # for each ancilla patch and each cell of the map, the index in grid_router.ROUTE_DIRECTIONS
+        # of the step which reached the cell from the ancilla patch
+        self.route_table = None
 
     def compute_routes_between_qubits(self):
         '''
@@ -37,21 +65,15 @@ class LayerMap:
         :return: nothing
         '''
 
-        if self.grid_graph != None:
+        if self.grid_router != None:
             raise Exception("The layer map is already arranged!")
 
         ancilla_patch_coordinates_2d = self.get_potential_ancilla_patches_coordinates_2d()
 
-        # begin version two with networkx
-        self.grid_graph = nx.grid_2d_graph(self.dimension_i, self.dimension_j)
-        for qi in range(self.dimension_i):
-            for qj in range(self.dimension_j):
-                # consider only ANCILLA patches
-                coord_ancilla = (qi, qj)
-                if coord_ancilla not in ancilla_patch_coordinates_2d:
-                    # if it is not ancilla, remove it
-                    self.grid_graph.remove_node((qi, qj))
-        # end new version
+        # version three with the grid router
+        # the routes use only ANCILLA patches
+        self.grid_router = GridRouter(self.dimension_i, self.dimension_j, ancilla_patch_coordinates_2d)
+        # end version three
 
         # #
         # # Compute routes between pairs of ancilla coordinates
@@ -100,11 +122,16 @@ class LayerMap:
         # The route is missing
         # Compute routes between pairs of ancilla coordinates
         #
-        # version two with networkx
-        # print("a12", ancilla1, ancilla2)
-        back_path = nx.astar_path(self.grid_graph, ancilla1, ancilla2)
+        if (self.route_table is not None) and (ancilla1 in self.route_table_sources):
+            back_path = self.get_route_from_table(ancilla1, ancilla2)
+        else:
+            # version three with the grid router
+            # print("a12", ancilla1, ancilla2)
+            back_path = self.grid_router.find_route(ancilla1, ancilla2)
+            # end version three
 
-        # end version two
+        if back_path is None:
+            return None
 
         # store the paths, if something was found
         if len(back_path) > 0:
@@ -120,6 +147,99 @@ class LayerMap:
         # there is no path computed between the two patches
         return None
 
+    def compute_route_table(self):
+        '''
+            Computes the routes from every ancilla patch to all the other ancilla patches,
+            which are then read by get_route_from_table instead of being searched
+        :return: nothing
+        '''
+        # the same ancilla patch can appear twice
+        ancilla_coordinates = list(dict.fromkeys(self.get_potential_ancilla_patches_coordinates_2d()))
+        self.route_table_sources = {coord: index for index, coord in enumerate(ancilla_coordinates)}
+        self.route_table = self.grid_router.compute_route_table(ancilla_coordinates)
+
+    def get_route_from_table(self, ancilla1, ancilla2):
+        '''
+        Reads a route backwards from the route table, in O(path length)
+        :param ancilla1: 2D coordinate of first ancilla
+        :param ancilla2: 2D coordinate of second ancilla
+        :return: a list of ancilla 2D coordinates over which the path runs, None if there is no path
+        '''
+        directions = self.route_table[self.route_table_sources[ancilla1]]
+        return self.grid_router.route_from_table(directions, ancilla1, ancilla2)
+
+    def get_route_table_arrangement(self):
+        '''
+            The route table depends only on the dimensions of the map, on the ancilla patches
+            and on how the routes are computed
+        :return: dictionary of numpy arrays, which are stored next to the route table
+        '''
+        sources = numpy.array(list(self.route_table_sources), dtype=numpy.int64).reshape(-1, 2)
+        return {"version": numpy.array([ROUTE_TABLE_VERSION]),
+                "dimensions": numpy.array([self.dimension_i, self.dimension_j]),
+                "directions": numpy.array(ROUTE_DIRECTIONS),
+                "sources": sources}
+
+    def get_route_table_filename(self):
+        '''
+        :return: the name of the file of the route table of this arrangement
+        '''
+        arrangement = self.get_route_table_arrangement()
+        arrangement_id = hashlib.md5(repr({name: array.tolist() for name, array in arrangement.items()})
+                                     .encode()).hexdigest()
+        return os.path.join(self.route_table_dirname, "routes-" + arrangement_id + ".npz")
+
+    def load_route_table(self, filename):
+        '''
+            The file name is only a hash, so the arrangement stored in the file is compared with this one
+        :param filename: the file of the route table
+        :return: the route table, or None if the file is unreadable or belongs to another arrangement
+        '''
+        try:
+            with numpy.load(filename) as stored:
+                for name, array in self.get_route_table_arrangement().items():
+                    if (name not in stored) or not numpy.array_equal(stored[name], array):
+                        print("ERROR! The route table", filename, "is for another arrangement, it is computed again")
+                        return None
+
+                route_table = stored["route_table"]
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print("ERROR! Could not read the route table, it is computed again: " + str(e))
+            return None
+
+        nr_cells = self.dimension_i * self.dimension_j
+        if route_table.shape != (len(self.route_table_sources), nr_cells):
+            print("ERROR! The route table", filename, "has the shape", route_table.shape, "it is computed again")
+            return None
+
+        return route_table
+
+    def load_or_compute_route_table(self):
+        '''
+            Loads the route table of this arrangement, if it was stored, otherwise computes and stores it
+        :return: nothing
+        '''
+        if self.route_table_dirname is None:
+            self.compute_route_table()
+            return
+
+        ancilla_coordinates = list(dict.fromkeys(self.get_potential_ancilla_patches_coordinates_2d()))
+        self.route_table_sources = {coord: index for index, coord in enumerate(ancilla_coordinates)}
+        filename = self.get_route_table_filename()
+        if os.path.exists(filename):
+            self.route_table = self.load_route_table(filename)
+            if self.route_table is not None:
+                return
+
+        self.compute_route_table()
+
+        # write a new file and rename it, such that a reader never finds half a table
+        os.makedirs(self.route_table_dirname, exist_ok=True)
+        temporary_filename = filename + ".tmp"
+        with open(temporary_filename, "wb") as f:
+            numpy.savez(f, route_table=self.route_table, **self.get_route_table_arrangement())
+        os.replace(temporary_filename, filename)
+
     def get_circuit_qubit_name(self, index):
         '''
             Generates the name of circuit qubits
@@ -134,6 +254,9 @@ class LayerMap:
         #
         if isinstance(index, str) and ((index == "ANCILLA") or (index == "A")):
             return index
+        # the ids of the special patches in the multibody commands
+        if index in mc.QUBIT_NAMES:
+            return mc.QUBIT_NAMES[index]
         # Assume it is an int (even as string) and that it should work
         # Otherwise...problem
         return "circuit_" + str(index)
@@ -167,17 +290,21 @@ class LayerMap:
         # qubit_name = self.get_circuit_qubit_name(qubit_index)
         return self.circuit_qubits_to_patches[qubit_string_name]
 
-    def setup_arrangement_one(self, nr_logical_qubits, patches_to_track):
+    def setup_arrangement_one(self, nr_logical_qubits, patches_to_track, number_of_factories=1):
         '''
             Setups a grid layout similar to the one from Austin's paper
 
         :param nr_logical_qubits: how many of the data patches are required for circuit qubits
         :param patches_to_track: a PatchesState object to track the active data patches
+        :param number_of_factories: how many distillation regions are placed next to each other
         :return: nothing
         '''
 
+        # the arrangement has the width of the distillations
+        self.dimension_j = self.distillation_j_length * number_of_factories
+
         # total patches
-        nr_data_patches_per_line = self.distillation_j_length - 2# two because of ancilla
+        nr_data_patches_per_line = self.dimension_j - 2# two because of ancilla
         nr_data_lines = math.ceil(nr_logical_qubits / nr_data_patches_per_line)
         nr_non_distillation_lines = math.ceil(1.5 * nr_data_lines)
 
@@ -185,8 +312,6 @@ class LayerMap:
             # Due to the arrangement the last line of qubits will not be able to exit
             nr_non_distillation_lines += 1
 
-        # the arrangement has the width of a distillation
-        self.dimension_j = self.distillation_j_length
         self.dimension_i = nr_non_distillation_lines + self.distillation_i_length
 
         # for the beginning everything is ancilla
@@ -199,7 +324,7 @@ class LayerMap:
         # Place distillation cells
         #
         for i in range(self.distillation_i_length):
-            for j in range(self.distillation_j_length):
+            for j in range(self.dimension_j):
                 self.placement_map[i][j] = MapCellType.DISTILLATION
 
         #
@@ -232,9 +357,13 @@ class LayerMap:
         self.circuit_qubits_to_patches['ANCILLA'] = (self.dimension_i - 1, self.dimension_j // 2 - 1)
 
         #
-        # The A output is in the corner of the distillation
+        # The A output is in the corner of each distillation
         #
-        self.circuit_qubits_to_patches['A'] = (self.distillation_i_length - 1, 0)
+        self.distillation_corners = [(0, factory * self.distillation_j_length)
+                                     for factory in range(number_of_factories)]
+        self.distillation_outputs = [(self.distillation_i_length - 1, corner[1])
+                                     for corner in self.distillation_corners]
+        self.use_distillation_factory(0)
 
         #
         # Map the logical qubits to data patches
@@ -253,6 +382,8 @@ class LayerMap:
         # compute the distances between the ancilla patches
         #
         self.compute_routes_between_qubits()
+        if self.precompute_routes:
+            self.load_or_compute_route_table()
 
 
     def get_closest_ancillas(self, qub_i, qub_j, search_directions = None):
@@ -323,11 +454,15 @@ class LayerMap:
 
         return qubits
 
-    def get_distillation_corner(self):
+    def get_distillation_corner(self, factory_index=0):
         """
         Finds the corner of the distillation region
+        :param factory_index: which of the distillation factories
         :return: coordinate tuple; (-1, -1) if not found
         """
+        if factory_index < len(self.distillation_corners):
+            return self.distillation_corners[factory_index]
+
         for qi in range(self.dimension_i):
             for qj in range(self.dimension_j):
                 if self.placement_map[qi][qj] == MapCellType.DISTILLATION:
@@ -335,6 +470,15 @@ class LayerMap:
 
         return -1, -1
 
+    def use_distillation_factory(self, factory_index):
+        """
+        The A state of the following commands is output by the distillation factory
+        :param factory_index: index in distillation_outputs
+        :return: the 2D coordinate of the A state
+        """
+        self.circuit_qubits_to_patches['A'] = self.distillation_outputs[factory_index]
+        return self.circuit_qubits_to_patches['A']
+
     def get_potential_data_patches_coordinates_2d(self):
         """
         Returns a set of 2D coordinates where data qubits can be stored
@@ -378,10 +522,11 @@ class LayerMap:
         # There is space for an ancilla after a distillation was performed
         # Without rotating the patch
         # Next to the hardcoded A state coordinates, are the X touch patch coordinates
+        # There is one for each of the distillation factories
         #
-        coord_a_state = self.circuit_qubits_to_patches["A"]
-        coord_x_touch_a_state = (coord_a_state[0], coord_a_state[1] + 1)
-        ret.append(coord_x_touch_a_state)
+        for coord_a_state in self.distillation_outputs:
+            coord_x_touch_a_state = (coord_a_state[0], coord_a_state[1] + 1)
+            ret.append(coord_x_touch_a_state)
 
         return ret
 
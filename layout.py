@@ -15,15 +15,23 @@ import random
 import layer_map as lll
 import patches_state as ps
 import operationcollection as opc
+import volume as vol
 
 # are numpy arrays faster?
 import numpy as np
 
 class CubeLayout:
-    def __init__(self, lll_map, nr_commands):
+    def __init__(self, lll_map, time_dimension, congestion_routing=False):
         print("layout begin...")
         self.layer_map = lll_map
 
+        # if True, the routes of the multibody measurements which are busy at the current time
+        # are replaced by routes over the free ancilla patches, see find_free_routes
+        self.congestion_routing = congestion_routing
+
+        # the distillation factory which outputs the A state, see allocate_distillation_factory
+        self.distillation_factory = 0
+
         # default array is 0,0,1 in time with default op
         # self.coordinates = [[[0]]]
         # self.coordinates = [[[OperationCollection(0)]]]
@@ -31,14 +39,13 @@ class CubeLayout:
         # use fixed size? for testing maximum size of volume that i can represent without crashing the computer
         # time_dimension = 10000
 
-        time_dimension = nr_commands
+        # the time dimension is only the initial size of the volume
+        # it grows when operations are placed after its end
         # self.coordinates = np.arange(lll_map.dimension_i * lll_map.dimension_j * time_dimension)\
         #     .reshape(lll_map.dimension_i, lll_map.dimension_j, time_dimension)
-        self.coordinates = np.empty(
-            (lll_map.dimension_i, lll_map.dimension_j, time_dimension),
-            dtype=np.object)
-        # I would assume that everything is initialised to None
+        # only the placed cells are stored, the others are None
         # OperationType.NOOP is None from now on
+        self.coordinates = vol.SparseVolume(lll_map.dimension_i, lll_map.dimension_j, time_dimension)
 
         # the default operation is null - nothing
         # the decorator refers to an operation that is instantaneous, like Measurements and Hadamards
@@ -106,15 +113,10 @@ class CubeLayout:
 
     def add_time_coordinate(self):
         '''
-        Inefficient way of adding another time slice
+        Adds another time slice. The volume is sparse and nothing is allocated.
         :return: current time_coordinate
         '''
-        for si in range(self.get_isize()):
-            for sj in range(self.get_jsize()):
-                raise Exception("Memory should have a fixed size")
-                self.add_NOOP(si, sj)
-
-        return self.get_tsize()
+        return self.coordinates.add_time_slices(1)
 
     def increase_current_time_coordinate(self):
         if self.current_time_coordinate + 1 == self.get_tsize():
@@ -122,49 +124,67 @@ class CubeLayout:
 
         self.current_time_coordinate += 1
 
+    def span_set_to_arrays(self, span_set):
+        '''
+        :param span_set: list of 3D coordinates
+        :return: three numpy arrays with the i, j and t coordinates, or None if a coordinate is out of bounds
+        '''
+        span_array = np.array(span_set, dtype=np.int64).reshape(-1, 3)
+
+        out_of_bounds = (span_array[:, 0] >= self.get_isize()) | (span_array[:, 1] >= self.get_jsize())
+        if out_of_bounds.any():
+            # problem - it goes outside of the available space
+            print("ERROR! The coordinate is out of hardware bounds: ->", span_set[np.flatnonzero(out_of_bounds)[0]])
+            return None
+
+        return span_array[:, 0], span_array[:, 1], span_array[:, 2]
+
     def check_coordinate_span_set(self, span_set, time_offset=0):
-        for coord in span_set:
-            # check if time coordinate is ok
-            if coord[2] + time_offset >= self.get_tsize():
-                # problem - it goes outside of the available time
-                return opc.PlacementStatus.NO_TIME
-
-            if (coord[0] >= self.get_isize()) or (coord[1] >= self.get_jsize()):
-                # problem - it goes outside of the available space
-                print("ERROR! The coordinate is out of hardware bounds: ->", coord)
-                return opc.PlacementStatus.NO_SPACE
-
-            # get the object holding the collection of operations at the specified
-            # 3D coordinate + the time offset of the operation one would like to place
-            current_operation_collection = self.coordinates[coord[0]][coord[1]][coord[2] + time_offset]
-            # if at this coordinate, there is something to execute
-            # meaning that at these coordinates there is much more than a single NOOP placed
-            # then the cell is already busy
-            # if not current_operation_collection.has_single_noop(self.operations_dictionary):
-            if current_operation_collection is not None:
-                return opc.PlacementStatus.ALREADY_BUSY
+        if len(span_set) == 0:
+            return opc.PlacementStatus.OK
+
+        span_arrays = self.span_set_to_arrays(span_set)
+        if span_arrays is None:
+            return opc.PlacementStatus.NO_SPACE
+
+        span_i, span_j, span_t = span_arrays
+        # check if time coordinate is ok
+        if (span_t + time_offset).max() >= self.get_tsize():
+            # problem - it goes outside of the available time
+            return opc.PlacementStatus.NO_TIME
+
+        # if at any of the coordinates + the time offset, there is something to execute
+        # then the cell is already busy
+        busy = self.coordinates.find_busy_offsets(span_i, span_j, span_t, np.array([time_offset]))
+        if busy[0]:
+            return opc.PlacementStatus.ALREADY_BUSY
 
         # everything went ok
         return opc.PlacementStatus.OK
 
     def accommodate_object(self, span_set):
-        # the total number of times the current_time_coordinate was advanced
-        number_of_time_increases = 0
-        placement_status = self.check_coordinate_span_set(span_set, number_of_time_increases)
-        while placement_status != opc.PlacementStatus.OK:
-            if placement_status == opc.PlacementStatus.ALREADY_BUSY:
-                # not the time axis is the proble, but the fact that the cell is already occupied
-                self.increase_current_time_coordinate()
-                # update the time coordinates in the span_set
-                number_of_time_increases += 1
-            elif placement_status == opc.PlacementStatus.NO_TIME:
-                # there is no cell at this coordinate
-                self.add_time_coordinate()
-            elif placement_status == opc.PlacementStatus.NO_SPACE:
-                print("ERROR: No space! -- endless loop")
-                return
-
-            placement_status = self.check_coordinate_span_set(span_set, number_of_time_increases)
+        '''
+        Computes how much the span set has to be moved along the time axis such that none of its cells is busy.
+        The occupancy of the volume is queried once for all the cells and many time offsets,
+        instead of checking the cells after each single increase of the time coordinate.
+        :param span_set: list of 3D coordinates of the object
+        :return: the total number of times the current_time_coordinate was advanced
+        '''
+        if len(span_set) == 0:
+            return 0
+
+        span_arrays = self.span_set_to_arrays(span_set)
+        if span_arrays is None:
+            print("ERROR: No space! -- endless loop")
+            return
+
+        span_i, span_j, span_t = span_arrays
+        number_of_time_increases = self.coordinates.earliest_free_offset(span_i, span_j, span_t)
+
+        # advance the current time coordinate and make sure the object fits into the volume
+        self.current_time_coordinate += number_of_time_increases
+        self.coordinates.ensure_time_coordinate(self.current_time_coordinate)
+        self.coordinates.ensure_time_coordinate(int(span_t.max()) + number_of_time_increases)
 
         return number_of_time_increases
 
@@ -318,13 +338,61 @@ class CubeLayout:
 
         return opc.OperationTypes.USE_ANCILLA, span_set, touch_set_data, touch_set_meas
 
+    def get_distillation_factory_free_time(self, factory_index):
+        '''
+        :param factory_index: which of the distillation factories
+        :return: the time after the last cell placed on the factory, including the A state it still stores
+        '''
+        corner = self.layer_map.get_distillation_corner(factory_index)
+        return self.coordinates.get_free_time(corner[0], corner[0] + self.layer_map.distillation_i_length,
+                                              corner[1], corner[1] + self.layer_map.distillation_j_length)
+
+    def allocate_distillation_factory(self):
+        '''
+        The next distillation uses the factory which is free first, and the A state is output by this factory
+        :return: the time coordinate from which the factory is free
+        '''
+        nr_factories = len(self.layer_map.distillation_corners)
+        if nr_factories == 0:
+            # the arrangement was not setup, and the distillation corner is searched on the map
+            return 0
+
+        free_times = [self.get_distillation_factory_free_time(i) for i in range(nr_factories)]
+        # on equal times, the factories are used one after the other
+        self.distillation_factory = free_times.index(min(free_times))
+        self.layer_map.use_distillation_factory(self.distillation_factory)
+
+        return free_times[self.distillation_factory]
+
+    def extend_patch_in_time(self, patch_name, patches_state, start_time, end_time):
+        '''
+        Fills the free cells of a patch with USE_QUBIT between two time coordinates
+        The cells of the patch which are already used by other operations are left as they are
+        :param patch_name: the name of the patch
+        :param patches_state: object that tracks the orientation of the patch
+        :param start_time: first time coordinate
+        :param end_time: the first time coordinate which is not extended
+        :return: nothing
+        '''
+        (qi, qj) = self.layer_map.get_qubit_coordinate_2d(patch_name)
+        orientation_integer = patches_state.get_patch_orientation_as_number(patch_name)
+        current_time_coordinate = self.current_time_coordinate
+
+        for t in range(start_time, end_time):
+            if self.coordinates[qi][qj][t] is None:
+                self.configure_operation(*self.create_use_data((qi, qj), t))
+                self.coordinates[qi][qj][t].sides_integer_value = orientation_integer
+
+        # a single free cell is not moved, but the current time is not changed in any case
+        self.current_time_coordinate = current_time_coordinate
+
     def create_distillation(self):
-        # assume a single distillation per layer
+        # assume a single distillation per factory
         # everything arranged in a contiguous area
 
 
         #first get the corner of the distillation
-        corner = self.layer_map.get_distillation_corner()
+        corner = self.layer_map.get_distillation_corner(self.distillation_factory)
         if corner == (-1, -1):
             print("ERROR: distillation corner not found!")
 
@@ -601,8 +669,8 @@ class CubeLayout:
         #
         touch_set_meas = []
 
-        # If this is the first part of a longer multibody measurement
-        first_sub_chain = True
+        # the ancillas next to the qubits of each pair
+        ancilla_pairs = []
         for qubit_list_idx in range(len(qubits_list) - 1):
 
             qubit_name_1 = self.layer_map.get_circuit_qubit_name(qubits_list[qubit_list_idx])
@@ -614,12 +682,25 @@ class CubeLayout:
             if (len(ancilla_qub1) == 0) or (len(ancilla_qub2) == 0):
                 print("ERROR! one of the qubits needed to be rotated first! Could not touch its correct boundary!")
 
-            #
-            # Here it is OK to build a tuple
-            # The ancillas exist and can be used
-            #
-            qubit_tuple = (ancilla_qub1[0], ancilla_qub2[0])
-            route = self.layer_map.get_route_between_qubits(*qubit_tuple)
+            ancilla_pairs.append((ancilla_qub1, ancilla_qub2))
+
+        #
+        # Here it is OK to build a tuple
+        # The ancillas exist and can be used
+        #
+        routes = [self.layer_map.get_route_between_qubits(ancilla_qub1[0], ancilla_qub2[0])
+                  for (ancilla_qub1, ancilla_qub2) in ancilla_pairs]
+        if self.congestion_routing:
+            routes = self.find_free_routes(ancilla_pairs, routes)
+
+        # If this is the first part of a longer multibody measurement
+        first_sub_chain = True
+        for qubit_list_idx in range(len(qubits_list) - 1):
+
+            qubit_name_1 = self.layer_map.get_circuit_qubit_name(qubits_list[qubit_list_idx])
+            qubit_name_2 = self.layer_map.get_circuit_qubit_name(qubits_list[qubit_list_idx + 1])
+
+            route = routes[qubit_list_idx]
 
             # take the 2D coordinates and create 3D coordinates using the current_time_coordinate
             for cell in route:
@@ -660,6 +741,52 @@ class CubeLayout:
 
         return opc.OperationTypes.USE_ANCILLA, span_set, touch_set_data, touch_set_meas
 
+    def find_free_routes(self, ancilla_pairs, static_routes):
+        '''
+        Searches in (i, j, t) space for the earliest time, from the current time coordinate on,
+        at which each pair of qubits can be connected by a route over ancilla patches which are free at that time.
+        The static routes of the layer map are kept if they are free at the current time.
+        Otherwise, the free cells of all the times before the static routes are free are looked up at once.
+        At each of these times, a single search from all the ancillas next to the first qubit of a pair
+        finds the shortest route to any of the ancillas next to the second qubit, such that a busy ancilla
+        next to a qubit is replaced by another one.
+        The cells of the routes found first stay usable for the next pairs, such that the routes
+        can share ancilla patches, like the static routes.
+        :param ancilla_pairs: for each pair of qubits, the two lists of ancillas next to the qubits
+        :param static_routes: the routes from the layer map, one per pair
+        :return: list of routes, one per pair
+        '''
+        static_cells = [(*cell, self.current_time_coordinate) for route in static_routes for cell in route]
+        if len(static_cells) == 0:
+            return static_routes
+
+        span_arrays = self.span_set_to_arrays(static_cells)
+        if span_arrays is None:
+            return static_routes
+        static_delay = self.coordinates.earliest_free_offset(*span_arrays)
+        if static_delay == 0:
+            return static_routes
+
+        grid_router = self.layer_map.grid_router
+        free_cells = self.coordinates.free_cells_between(self.current_time_coordinate,
+                                                         self.current_time_coordinate + static_delay)
+        for usable_cells in free_cells:
+            usable_cells = usable_cells.tolist()
+
+            routes = []
+            for (ancillas_1, ancillas_2) in ancilla_pairs:
+                route = grid_router.find_shortest_route(ancillas_1, ancillas_2, usable_cells)
+                if route is None:
+                    break
+
+                routes.append(route)
+
+            if len(routes) == len(ancilla_pairs):
+                return routes
+
+        # waiting for the static routes is not longer
+        return static_routes
+
     def configure_operation(self, op_type, span_set, touch_set_data, touch_set_meas):
         """
         Configures the 3D cells in the cube for the specified operation
@@ -734,32 +861,29 @@ class CubeLayout:
         op_id = self.add_op_id(new_op)
 
         # mark in the coordinates the op_id
+        # the empty cells are collected and placed at once, such that the volume updates
+        # its busy intervals and the skyline once per operation
+        new_cells = {}
         for coord in span_set:
 
-            ops_collection = self.coordinates[coord[0]][coord[1]][coord[2]]
-
-            # I assume this cell has a single NOOP, which will not be used anymore
-            # I can remove it from the dictionary of operations
-            # if ops_collection.has_single_noop(self.operations_dictionary):
+            ops_collection = new_cells.get(coord)
             if ops_collection is None:
-                # add a NOOP
-                self.add_NOOP(coord[0], coord[1], coord[2])
                 ops_collection = self.coordinates[coord[0]][coord[1]][coord[2]]
 
-                # get the old id
-                old_op_id = ops_collection.get_first_op_id()
-                # replace it with the new id
-                ops_collection.replace_single_noop_with_other(op_id)
-                # remove the old id from the operations dictionary
-                self.remove_op_id(old_op_id)
+            if ops_collection is None:
+                # the cell used to get a NOOP, which was replaced right away by the operation
+                # the id of the NOOP is still skipped, such that the ids of the operations do not change
+                self.operations_dictionary_id_incr += 1
 
-                #self.coordinates[coord[0]][coord[1]][coord[2]] = op_id
+                new_cells[coord] = opc.OperationCollection(op_id)
             else:
                 # something is wrong?
                 # should it be possible to add an operation if the cell is not NOOP?
                 # print("ERROR???! Cell is not NOOP for configure_operation")
                 ops_collection.append_operation(op_id)
 
+        self.coordinates.place_cells(new_cells)
+
         return nr_time_increases
 
     def accommodate_hardware_sizes(self, mi, mj):
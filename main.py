@@ -5,9 +5,10 @@ import visualise_layout as vla
 import layer_map as lll
 import patches_state as ps
 import operationcollection as opc
+import multibody_commands as mc
+import scheduler as sch
 
-import cirqinterface as ci
-
+import itertools
 import time
 import sys
 
@@ -23,6 +24,8 @@ def generate_random_circuits(random_configs):
     Used for generating instances of random circuits that are going to be resource estimated
     :return:
     """
+    # Cirq is needed only to generate circuits, the layout works without it
+    import cirqinterface as ci
 
     intf = ci.CirqInterface()
 
@@ -68,7 +71,13 @@ def load_random_circuits(random_configs):
     return circuit_contents
 
 
-def benchmark_layout_method():
+def benchmark_layout_method(rotation_cache_filename="rotation_cache.sqlite"):
+    """
+    Lays out random circuits and prints the time and the size of each layout
+    :param rotation_cache_filename: the sqlite file in which the SK decompositions are cached, such that
+    a run of the benchmark does not decompose the rotations of the previous runs again. None disables the cache
+    :return: nothing
+    """
 
     random_configs = {}
     random_configs["qubits"]  = [10,      20,     100,    200,    500]
@@ -90,7 +99,7 @@ def benchmark_layout_method():
         print(f"....\n{cname}")
         start = time.time()
 
-        layout = process_string_of_circuit(circuit)
+        layout = process_string_of_circuit(circuit, rotation_cache_filename=rotation_cache_filename)
 
         end = time.time()
         duration = end-start
@@ -116,6 +125,7 @@ def main():
 
     print("OpenSurgery (version Santa Barbara)\n")
 
+    import cirqinterface as ci
     interface = ci.CirqInterface()
 
     cirq_circuit = interface.random_circuit(nr_qubits=100, nr_gates=20, ratio_t_gates=0.05)
@@ -125,20 +135,88 @@ def main():
     visualise_layout(local_lay)
 
 
-def process_string_of_circuit(qasm_cirq_circuit):
+class RewoundFile:
+    """
+    An open file, which is read again from the start by each pass
+    """
+    def __init__(self, file):
+        self.file = file
+        self.start = file.tell()
 
-    # cirq_circuit = interface.openfermion_circuit()
+    def __iter__(self):
+        self.file.seek(self.start)
+        return iter(self.file)
 
-    prep = pc.PrepareCircuit()
-    gate_list = prep.parse_to_my_string_format(qasm_cirq_circuit)
+
+def make_reiterable(qasm_cirq_circuit):
+    """
+    A QASM string or a list of lines can be read by more than one pass, but an open file or a generator
+    is used up by the first pass
+    :param qasm_cirq_circuit: QASM string or an iterable of QASM lines
+    :return: the circuit, such that each pass starts from its beginning. A seekable file is
+    rewound by each pass, and only a generator (or a pipe) is read into a list of lines
+    """
+    if iter(qasm_cirq_circuit) is not qasm_cirq_circuit:
+        return qasm_cirq_circuit
+    if hasattr(qasm_cirq_circuit, "seekable") and qasm_cirq_circuit.seekable():
+        return RewoundFile(qasm_cirq_circuit)
+    return list(qasm_cirq_circuit)
+
+
+def compile_to_multibody(prep, qasm_cirq_circuit, gate_list=None):
+    """
+    The pipeline from QASM to multibody commands
+    Each stage is a generator, such that no list of gates or commands is built
+    :param prep: the PrepareCircuit instance
+    :param qasm_cirq_circuit: QASM string (or iterable of QASM lines)
+    :param gate_list: if not None, the GateRecord of the already parsed circuit, and the QASM is not read
+    :return: generator of Command
+    """
+    if gate_list is None:
+        gate_list = prep.parse_to_my_string_format(qasm_cirq_circuit)
 
     # A compaction of the SK decomposition would be good. Too many gates are output.
     # This will start an instance of the SKC decomposer
     gate_list = prep.decompose_arbitrary_rotations(gate_list)
-    # print(gate_list)
 
     # take the gates to M?? commands
-    commands = prep.replace_gates_with_multibody(gate_list)
+    return prep.replace_gates_with_multibody(gate_list)
+
+
+def process_string_of_circuit(qasm_cirq_circuit, t_count=None, batch_decompose=False, nr_processes=None,
+                              congestion_routing=False, schedule_commands=False, number_of_factories=1,
+                              pipeline_distillations=False, rotation_cache_filename=None):
+    """
+    Compiles the QASM circuit and lays it out command by command, while the circuit is still being parsed
+    :param qasm_cirq_circuit: QASM string or an iterable of QASM lines (e.g. an open file)
+    :param t_count: if None, an additional streaming pass over the circuit counts the T gates.
+    The T count is needed for the resource prediction before the first command is placed.
+    The T gates of the arbitrary rotations are known only after their SK decomposition, so that the counting pass
+    compiles the whole circuit (the decompositions are remembered for the layout pass). If the input is a generator
+    or a pipe, its lines are kept in memory for the second pass: pass the T count, e.g. from the header
+    of a program file, to lay out such a circuit while it is streamed.
+    :param batch_decompose: if True, the arbitrary rotations are SK decomposed in a single batch before the layout
+    :param nr_processes: if not None, the arbitrary rotations are SK decomposed before the layout
+    by this number of worker processes
+    :param congestion_routing: see layout_commands
+    :param schedule_commands: see layout_commands
+    :param number_of_factories: see layout_commands
+    :param pipeline_distillations: see layout_commands
+    :param rotation_cache_filename: if not None, the SK decompositions are cached in this sqlite file
+    between runs, see rotation_cache.py
+    :return: the layout
+    """
+
+    # cirq_circuit = interface.openfermion_circuit()
+
+    prep = pc.PrepareCircuit(rotation_cache_filename)
+
+    # the gates of the circuit, if it was parsed by the predecomposition
+    gate_list = None
+    if nr_processes is not None:
+        gate_list = prep.predecompose_arbitrary_rotations(qasm_cirq_circuit, nr_processes)
+    elif batch_decompose:
+        gate_list = prep.predecompose_arbitrary_rotations(qasm_cirq_circuit)
 
     # print(len(commands))
     # print(commands)
@@ -146,7 +224,7 @@ def process_string_of_circuit(qasm_cirq_circuit):
     # return
 
     # load from file
-    # commands = prep.load_multibody_format()
+    # return process_program_file("multibody.bin")
 
     #
     # These are the commands visualised in index.html
@@ -160,7 +238,102 @@ def process_string_of_circuit(qasm_cirq_circuit):
     # commands = ['INIT 4', 'NEED A', 'MZZ A 0', 'MX A' , 'S ANCILLA', 'MXX ANCILLA 0', 'H 3', 'S 3', 'NEED A', 'MZZ A 3', 'MX A', 'S ANCILLA', 'MXX ANCILLA 3', 'S 3', 'H 3', 'H 3', 'S 3', 'NEED A', 'MZZ A 0 3 1 2', 'MX A', 'S ANCILLA', 'MXX ANCILLA 0 3 1 2', 'S 3', 'H 3', 'H 2', 'S 2', 'H 1', 'NEED A', 'MZZ A 2 1', 'MX A', 'S ANCILLA', 'MXX ANCILLA 2 1', 'S 2', 'H 2', 'H 1', 'H 0', 'S 0', 'H 3', 'S 3', 'MZZ 0 1 2 3', 'H 0', 'H 1', 'MZZ 0 1', 'H 0', 'H 3', 'MZZ 0 3']
     # tests end
 
-    if not commands[0].startswith("INIT"):
+    if t_count is None:
+        if gate_list is None:
+            # the circuit is read by two passes
+            qasm_cirq_circuit = make_reiterable(qasm_cirq_circuit)
+
+        # a first pass which does not store the commands
+        # the rotations decomposed in this pass are remembered by prep
+        t_count = mc.count_t_gates(compile_to_multibody(prep, qasm_cirq_circuit, gate_list))
+
+    lay = layout_commands(compile_to_multibody(prep, qasm_cirq_circuit, gate_list), t_count, congestion_routing,
+                          schedule_commands, number_of_factories, pipeline_distillations)
+    prep.close()
+
+    return lay
+
+
+def report_scheduled_depth(qasm_cirq_circuit, t_count=None):
+    """
+    Lays out the circuit in program order and with the CommandScheduler, and compares the depths
+    :param qasm_cirq_circuit: QASM string or an iterable of QASM lines
+    :param t_count: see process_string_of_circuit
+    :return: tuple of the sequential depth and of the scheduled depth
+    """
+    # the circuit is laid out twice
+    qasm_cirq_circuit = make_reiterable(qasm_cirq_circuit)
+
+    sequential_lay = process_string_of_circuit(qasm_cirq_circuit, t_count)
+    scheduled_lay = process_string_of_circuit(qasm_cirq_circuit, t_count, schedule_commands=True)
+
+    sequential_depth = sequential_lay.coordinates.get_depth()
+    scheduled_depth = scheduled_lay.coordinates.get_depth()
+    print("Depth sequential: %d, scheduled: %d" % (sequential_depth, scheduled_depth))
+
+    return sequential_depth, scheduled_depth
+
+
+def compile_to_program_file(qasm_cirq_circuit, filename="multibody.bin", batch_decompose=False, nr_processes=None,
+                            rotation_cache_filename=None):
+    """
+    Compiles the QASM circuit into a program file, which can be laid out later by process_program_file
+    :param qasm_cirq_circuit: QASM string (or iterable of QASM lines)
+    :param filename: the program file
+    :param batch_decompose: see process_string_of_circuit
+    :param nr_processes: see process_string_of_circuit
+    :param rotation_cache_filename: see process_string_of_circuit
+    :return: the header of the program file
+    """
+    prep = pc.PrepareCircuit(rotation_cache_filename)
+
+    # the gates of the circuit, if it was parsed by the predecomposition
+    gate_list = None
+    if nr_processes is not None:
+        gate_list = prep.predecompose_arbitrary_rotations(qasm_cirq_circuit, nr_processes)
+    elif batch_decompose:
+        gate_list = prep.predecompose_arbitrary_rotations(qasm_cirq_circuit)
+    header = prep.save_multibody_format(compile_to_multibody(prep, qasm_cirq_circuit, gate_list), filename)
+    prep.close()
+
+    return header
+
+
+def process_program_file(filename="multibody.bin"):
+    """
+    Lays out a compiled program without parsing and decomposing the circuit again
+    :param filename: the program file written by compile_to_program_file
+    :return: the layout
+    """
+    prep = pc.PrepareCircuit()
+    loaded = prep.load_multibody_format(filename)
+    if loaded is None:
+        return
+
+    header, program = loaded
+    return layout_commands(mc.array_to_commands(program), header["t_count"])
+
+
+def layout_commands(commands, t_count, congestion_routing=False, schedule_commands=False, number_of_factories=1,
+                    pipeline_distillations=False):
+    """
+    Lays out the multibody commands one by one
+    :param commands: iterator of Command, the first one being INIT
+    :param t_count: the number of T gates, needed for the resource prediction
+    :param congestion_routing: if True, the routes of the measurements avoid the busy ancilla patches,
+    see CubeLayout.find_free_routes. The routes are busy only if the commands overlap in time,
+    i.e. together with schedule_commands
+    :param schedule_commands: if True, the commands start when their qubits are ready, and not after
+    the previous command, see CommandScheduler
+    :param number_of_factories: how many distillation factories are placed in the arrangement.
+    Each distillation uses the factory which is free first
+    :param pipeline_distillations: if True, a distillation starts when its factory is free,
+    ahead of the command which needs the A state
+    :return: the layout
+    """
+    first_command = next(commands, None)
+
+    if (first_command is None) or (first_command.op != mc.CommandTypes.INIT):
         # first line should always be INIT
         print("ERROR: No INIT command for the layer map")
         return
@@ -170,14 +343,14 @@ def process_string_of_circuit(qasm_cirq_circuit):
     """
     # data patches + ancilla patches + distillation patches
     # Assume number of patches equals qubits
-    max_log_qubits = int(commands[0].split(" ")[1])
-    t_count = commands.count("NEED A")
+    max_log_qubits = first_command.qubits[0]
 
     # estimate the resources
     ex1 = Experiment()
     ex1.props["footprint"] = max_log_qubits
     ex1.props["t_count"] = t_count
     ex1.props["prefer_depth_over_t_count"] = False
+    ex1.props["number_of_factories"] = number_of_factories
     qentiana = qre.Qentiana(ex1.props)
     # res_values = qentiana.compute_physical_resources()
     # print("Resource prediction (levels, phys. qubits, time): ", res_values)
@@ -197,37 +370,60 @@ def process_string_of_circuit(qasm_cirq_circuit):
     #
     lay = None
 
+    # places the commands out of program order, initialised after the INIT command
+    scheduler = None
+    # the patches which are extended during a command, None for all the active patches
+    extended_patches = None
+
     # determine the hardcoded time depth of a distillation and add some delay
     height_of_distillation = int(layer_map.distillation_t_length * 1)
 
-    # worst case: each command is a distillation
-    nr_commands = len(commands) * height_of_distillation
+    # the layout volume is sparse and grows along the time axis
+    # start with the height of a single distillation instead of the worst case
+    # where each command is a distillation
+    initial_time_dimension = height_of_distillation
 
-
-    # limit the maximum commands to nr_commands, because otherwise memory explodes
-    for command in commands[0: nr_commands]:
+    # the INIT command was already taken from the generator
+    for command in itertools.chain([first_command], commands):
         # print(command)
 
         # each command should add a new time step?
-        command_splits = command.split(" ")
+        op = command.op
 
-        if ("ANCILLA" in command_splits) and (not patches_state.is_patch_active("ANCILLA")):
+        uses_ancilla = (op == mc.CommandTypes.ANCILLA) or (mc.ANCILLA_QUBIT in command.qubits)
+        if uses_ancilla and (not patches_state.is_patch_active("ANCILLA")):
             patches_state.add_active_patch("ANCILLA")
 
-        if command_splits[0] == "INIT":
+        if scheduler is not None:
+            # only the patches of the command are extended, the others when they are used again
+            scheduler.start_command(command)
+            extended_patches = scheduler.command_patches
+
+        if op == mc.CommandTypes.INIT:
             # pass patches_state to be filled by the method
             # with the names of the qubits that will be tracked
-            layer_map.setup_arrangement_one(int(command_splits[1]), patches_state)
+            layer_map.setup_arrangement_one(command.qubits[0], patches_state, number_of_factories)
 
             # initialise the cubic layout
-            lay = la.CubeLayout(layer_map, nr_commands)
+            lay = la.CubeLayout(layer_map, initial_time_dimension, congestion_routing)
 
             # for debugging purposes place some cubes to see if the layout is correct
             # lay.debug_layer_map()
 
-        elif command_splits[0] == "NEED":
+            if schedule_commands:
+                scheduler = sch.CommandScheduler(lay, patches_state)
+
+        elif op == mc.CommandTypes.NEED:
+            # the A state is distilled by the factory which is free first
+            factory_free_time = lay.allocate_distillation_factory()
+            time_coordinate = lay.current_time_coordinate
+            if pipeline_distillations:
+                lay.current_time_coordinate = min(time_coordinate, factory_free_time)
+
             sets = lay.create_distillation()
             lay.configure_operation(*sets)
+            # a distillation ahead of the command does not move the current time back
+            lay.current_time_coordinate = max(time_coordinate, lay.current_time_coordinate)
             # simples solution for the moment
             # without doing any optimisation is:
             # - each time a distillation is needed, a box is placed
@@ -237,36 +433,44 @@ def process_string_of_circuit(qasm_cirq_circuit):
             # Comment the following lines to not show the qubits overlapping
             # in time with the distillation
             filtered_active_patches = filter_active_patches(lay, patches_state,
-                                                            filter_out=[])
+                                                            filter_out=[],
+                                                            only_patches=extended_patches)
             lay.move_curr_time_coord_to_max_from_coords(sets, patches_state,
                                                         filtered_active_patches)
 
             # the distilled A state is available
             patches_state.add_active_patch("A")
 
-        elif command_splits[0] == "MZZ":
+            if pipeline_distillations:
+                # the A state waits in the factory until the current time
+                end_of_distillation = max(x[2] for x in sets[1]) + 1
+                lay.extend_patch_in_time("A", patches_state, end_of_distillation, lay.current_time_coordinate)
+
+        elif op == mc.CommandTypes.MZZ:
             # and this is the route
-            touch_sides = (["Z"] * (len(command_splits) - 1))
-            qubit_list = command_splits[1:]
+            touch_sides = (["Z"] * len(command.qubits))
+            qubit_list = command.qubits
 
             sets = lay.create_route_between_qubits(qubit_list, patches_state, touch_sides)
             lay.configure_operation(*sets)
 
-            filtered_active_patches = filter_active_patches(lay, patches_state, filter_out=qubit_list)
+            filtered_active_patches = filter_active_patches(lay, patches_state, filter_out=qubit_list,
+                                                            only_patches=extended_patches)
             lay.move_curr_time_coord_to_max_from_coords(sets, patches_state, filtered_active_patches)
 
-        elif command_splits[0] == "MXX":
+        elif op == mc.CommandTypes.MXX:
             # for the moment no difference between MXX and MZZ
-            touch_sides = (["X"] * (len(command_splits) - 1))
-            qubit_list = command_splits[1:3]
+            touch_sides = (["X"] * len(command.qubits))
+            qubit_list = command.qubits[0:2]
 
             sets = lay.create_route_between_qubits(qubit_list, patches_state, touch_sides)
             lay.configure_operation(*sets)
 
-            filtered_active_patches = filter_active_patches(lay, patches_state, filter_out=qubit_list)
+            filtered_active_patches = filter_active_patches(lay, patches_state, filter_out=qubit_list,
+                                                            only_patches=extended_patches)
             lay.move_curr_time_coord_to_max_from_coords(sets, patches_state, filtered_active_patches)
 
-        elif (command_splits[0] == "S") or (command_splits[0] == "V"):
+        elif (op == mc.CommandTypes.S) or (op == mc.CommandTypes.V):
             # I will treat S and V the same
             # for the moment not mark them with different colours
 
@@ -291,21 +495,22 @@ def process_string_of_circuit(qasm_cirq_circuit):
             # add on time axis
             # lay.increase_current_time_coordinate()
 
-            coordinates_all_active_patches = filter_active_patches(lay, patches_state, filter_out=[])
+            coordinates_all_active_patches = filter_active_patches(lay, patches_state, filter_out=[],
+                                                                   only_patches=extended_patches)
 
-            sets = lay.create_s_gate(command_splits[1], patches_state, coordinates_all_active_patches)
+            sets = lay.create_s_gate(command.qubits[0], patches_state, coordinates_all_active_patches)
 
         #
         #
         #
         # the following are time-depth zero operations
         # after their execution the patch is error corrected for time equal the distance
-        # elif command_splits[0] == "MX":
+        # elif op == mc.CommandTypes.MX:
         #     continue
-        # elif command_splits[0] == "MZ":
+        # elif op == mc.CommandTypes.MZ:
         #     continue
-        # elif command_splits[0] == "H":
-        elif command_splits[0] in ["MX", "MZ", "H"]:
+        # elif op == mc.CommandTypes.H:
+        elif op in (mc.CommandTypes.MX, mc.CommandTypes.MZ, mc.CommandTypes.H):
             # this adds a decorator to the patch
             # this is like worst case measurements - keep the qubits alive for another d, and only then measure
             # this is not really necessary...
@@ -313,26 +518,27 @@ def process_string_of_circuit(qasm_cirq_circuit):
 
 
             # coordinates of the data qubit
-            qubit_string = lay.layer_map.get_circuit_qubit_name(command_splits[1])
+            qubit_string = lay.layer_map.get_circuit_qubit_name(command.qubits[0])
             qub1_coord = lay.layer_map.get_qubit_coordinate_2d(qubit_string)
 
             span_set = [(*qub1_coord, lay.current_time_coordinate)]
 
             curr_op_type = opc.OperationTypes.HADAMARD_QUBIT
-            if command_splits[0] == "MX":
+            if op == mc.CommandTypes.MX:
                 curr_op_type = opc.OperationTypes.MX_QUBIT
-            elif command_splits[0] == "MZ":
+            elif op == mc.CommandTypes.MZ:
                 curr_op_type = opc.OperationTypes.MZ_QUBIT
 
             sets = (curr_op_type, span_set, [], [])
             lay.configure_operation(*sets)
 
             filtered_active_patches = filter_active_patches(lay, patches_state,
-                                                            filter_out=command_splits[1:])
+                                                            filter_out=command.qubits,
+                                                            only_patches=extended_patches)
             lay.move_curr_time_coord_to_max_from_coords(sets, patches_state,
                                                         filtered_active_patches)
 
-        elif command_splits[0] in ["MOVE"]:
+        elif op == mc.CommandTypes.MOVE:
             # MOVE the state between two patches
             pass
 
@@ -340,13 +546,18 @@ def process_string_of_circuit(qasm_cirq_circuit):
         # If this is a measurement that consumed the A state
         # then the state will not be available any more
         #
-        if ("A" in command_splits) and (command_splits[0] in ["MX", "MZ"]):
+        if (mc.A_QUBIT in command.qubits) and (op in (mc.CommandTypes.MX, mc.CommandTypes.MZ)):
             patches_state.remove_active_patch("A")
 
-        if ("ANCILLA" in command_splits) and (command_splits[0] in ["MX", "MZ"]):
+        if (mc.ANCILLA_QUBIT in command.qubits) and (op in (mc.CommandTypes.MX, mc.CommandTypes.MZ)):
             patches_state.remove_active_patch("ANCILLA")
 
+        if scheduler is not None:
+            scheduler.end_command()
 
+    if scheduler is not None:
+        # the idle patches are extended until the end of the layout
+        scheduler.finish()
 
     # Visual Debug the layer map layout
     # lay.debug_layer_map()
@@ -366,12 +577,14 @@ def visualise_layout(lay):
     write_json(json_result)
 
 
-def filter_active_patches(lay, patches_state, filter_out=[]):
+def filter_active_patches(lay, patches_state, filter_out=[], only_patches=None):
     names_strings = [lay.layer_map.get_circuit_qubit_name(x) for x in filter_out]
     # Get the 2D coordinates of the active patches
     filtered_active_patches = []
 
     for key in patches_state.get_all_active_patches():
+        if (only_patches is not None) and not (key in only_patches):
+            continue
         if not (key in names_strings):
             # coordinates_all_active_patches.append(lay.layer_map.get_qubit_coordinate_2d(key))
             filtered_active_patches.append(key)
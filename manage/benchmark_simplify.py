@@ -0,0 +1,49 @@
+# Benchmark of the simplify engines on the sequences of the generation
+# Each sequence of the generations 10 to 16 in pickles/su2 is extended by
+# each instruction and simplified, like in skc.basic_approx.generate
+
+from skc.basic_approx.file import *
+from skc.simplify import *
+
+import time
+
+iset_names = ['H', 'T', 'Td']
+
+# The rules of manage/generate_su2.py
+simplify_rules = [
+	IdentityRule(),
+	DoubleIdentityRule('H'),
+	AdjointRule(),
+	GeneralRule(['T','T','T','T','T','T','T','T'], 'I'),
+	GeneralRule(['Td','Td','Td','Td','Td','Td','Td','Td'], 'I')
+	]
+
+engines = [("SimplifyEngine", SimplifyEngine(simplify_rules)),
+		   ("CompiledSimplifyEngine", CompiledSimplifyEngine(simplify_rules))]
+
+set_filename_prefix("pickles/su2/gen")
+
+print("generation  sequences  " + "  ".join("%22s" % name for (name, engine) in engines) + "   (us per sequence)")
+for generation_num in range(10, 17):
+	filenames = generation_filenames(generation_num)
+	if (len(filenames) == 0):
+		continue
+
+	sequences = []
+	for filename in filenames:
+		for op in read_from_file(filename):
+			for name in iset_names:
+				sequences.append(list(op.ancestors) + [name])
+
+	times = []
+	results = []
+	for (name, engine) in engines:
+		begin_time = time.time()
+		results.append([engine.simplify(sequence) for sequence in sequences])
+		times.append(time.time() - begin_time)
+
+	# the engines have the same normal forms
+	assert(results[0] == results[1])
+
+	print("%10d %10d  " % (generation_num, len(sequences)) \
+		+ "  ".join("%22.2f" % (t / len(sequences) * 1e6) for t in times))
@@ -0,0 +1,79 @@
+# Micro-benchmark of the single qubit kernels of skc.utils on the SK hot path
+# Compares them with the previous implementations based on numpy.matrix
+# products and eigenvalue solvers
+
+from skc.utils import *
+from skc.operator import *
+
+import timeit
+
+##############################################################################
+# The previous implementations
+def fowler_distance_matrix(matrix_A, matrix_B):
+	d = matrix_A.shape[0]
+	matrix_adjoint = numpy.transpose(numpy.conjugate(matrix_A))
+	prod = matrix_adjoint * matrix_B
+	trace = numpy.trace(prod)
+	frac = (1.0*(d - numpy.abs(trace))) / d
+	return math.sqrt(numpy.abs(frac))
+
+def trace_distance_eigvals(matrix_A, matrix_B):
+	matrix_diff = matrix_A - matrix_B
+	matrix_diff_dag = numpy.transpose(numpy.conjugate(matrix_diff))
+	product = matrix_diff * matrix_diff_dag
+	trace_vals = scipy.linalg.eigvals(product);
+	return scipy.linalg.norm(trace_vals)
+
+def operator_norm_eigvals(M):
+	eig_vals = scipy.linalg.eigvals(M)
+	eig_vals = [numpy.abs(x) for x in eig_vals]
+	return numpy.max(eig_vals)
+
+def multiply_matrix(op, other):
+	return Operator("", op.matrix * other.matrix, op.ancestors + other.ancestors)
+
+def dagger_matrix(op):
+	new_ancestors = [ancestor + "d" for ancestor in reversed(op.ancestors)]
+	return Operator(op.name + "d", op.matrix.H, new_ancestors)
+
+##############################################################################
+def random_su2():
+	z = numpy.random.randn(2, 2) + 1j * numpy.random.randn(2, 2)
+	(q, r) = numpy.linalg.qr(z)
+	return matrixify(q)
+
+def time_per_call(function, count):
+	return timeit.timeit(function, number=count) / count * 1e6
+
+count = 20000
+matrix_A = random_su2()
+matrix_B = random_su2()
+op_A = Operator("A", matrix_A, ["A"])
+op_B = Operator("B", matrix_B, ["B"])
+# the operators can hold numpy.ndarray matrices, which are faster to multiply
+array_op_A = op_A.as_ndarray()
+array_op_B = op_B.as_ndarray()
+
+benchmarks = [
+	("fowler_distance", lambda: fowler_distance_matrix(matrix_A, matrix_B),
+		lambda: fowler_distance(matrix_A, matrix_B)),
+	("trace_distance", lambda: trace_distance_eigvals(matrix_A, matrix_B),
+		lambda: trace_distance(matrix_A, matrix_B)),
+	("operator_norm", lambda: operator_norm_eigvals(matrix_A),
+		lambda: operator_norm(matrix_A)),
+	("Operator.multiply", lambda: multiply_matrix(op_A, op_B),
+		lambda: array_op_A.multiply(array_op_B)),
+	("Operator.dagger", lambda: dagger_matrix(op_A),
+		lambda: array_op_A.dagger()),
+]
+
+print("kernel               before (us)   after (us)   speedup")
+for (name, before, after) in benchmarks:
+	(result_before, result_after) = (before(), after())
+	if isinstance(result_before, Operator):
+		assert_matrices_approx_equal(result_before.matrix, matrixify(result_after.matrix))
+	else:
+		assert_approx_equals_tolerance(result_before, result_after, TOLERANCE6)
+	time_before = time_per_call(before, count)
+	time_after = time_per_call(after, count)
+	print("%-20s %10.2f %12.2f %9.1fx" % (name, time_before, time_after, time_before / time_after))
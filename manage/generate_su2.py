@@ -1,13 +1,22 @@
 from skc.basic_approx.generate import *
 
 from skc.operator import *
+from skc.quaternion import *
 from skc.simplify import *
 from skc.basic_approx import *
 from skc.basis import *
 
+import multiprocessing
 import numpy
 
 iset2 = [H, T, T_inv]
+identity2 = I2
+
+# Store the basic approximations as unit quaternions instead of matrices
+use_quaternions = False
+if use_quaternions:
+	iset2 = [to_quaternion_operator(insn) for insn in iset2]
+	identity2 = to_quaternion_operator(I2)
 
 for insn in iset2:
 	print(str(insn))
@@ -40,7 +49,13 @@ set_filename_prefix("pickles/su2/gen")
 settings = BasicApproxSettings()
 settings.set_iset(iset2)
 settings.init_simplify_engine(simplify_rules)
-settings.set_identity(I2)
+settings.set_identity(identity2)
 settings.basis = H2
 
-generate_approxes(16, settings)
+# The chunks of a generation are extended in parallel. A checkpoint is written to
+# pickles/su2/gen-manifest.json after each chunk, and running the script again
+# resumes an interrupted generation
+nr_processes = multiprocessing.cpu_count()
+
+if __name__ == "__main__":
+	generate_approxes(16, settings, nr_processes)
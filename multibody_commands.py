@@ -0,0 +1,257 @@
+'''
+The multibody commands passed from PrepareCircuit to the layout
+
+A command is an opcode and a tuple of integer qubit ids, e.g. "MZZ A 3" is Command(CommandTypes.MZZ, (A_QUBIT, 3))
+The special patches A and ANCILLA have negative ids, such that they do not collide with the circuit qubits.
+
+A whole program can be stored in two numpy arrays, see Program: a structured array with one fixed size row
+per command, and the flat array of the qubit ids of all the commands.
+The string format, e.g. "MXX 12 ANCILLA", is kept for reading and printing.
+
+On disk, a program file is a header followed by the rows and by the qubit ids. The file is written incrementally
+while the commands are generated and it is loaded with a memory map, such that the compilation
+of a circuit can be stored and only the layout has to be computed again.
+'''
+
+from collections import namedtuple
+from enum import IntEnum
+import os
+import shutil
+
+import numpy as np
+
+
+class CommandTypes(IntEnum):
+    UNKNOWN = 0
+    INIT = 1
+    NEED = 2
+    ANCILLA = 3
+    MZZ = 4
+    MXX = 5
+    MX = 6
+    MZ = 7
+    H = 8
+    S = 9
+    V = 10
+    MOVE = 11
+
+
+# the ids of the patches which are not circuit qubits
+A_QUBIT = -1
+ANCILLA_QUBIT = -2
+
+QUBIT_NAMES = {A_QUBIT: "A", ANCILLA_QUBIT: "ANCILLA"}
+QUBIT_IDS = {"A": A_QUBIT, "ANCILLA": ANCILLA_QUBIT}
+
+# the qubits of a command are qubits[qubit_offset:qubit_offset + nr_qubits] of the flat array of qubit ids,
+# such that a multibody measurement can have any number of qubits
+COMMAND_DTYPE = np.dtype([("op", "<i1"),
+                          ("nr_qubits", "<i4"),
+                          ("qubit_offset", "<i8")])
+# the byte order is fixed, such that the program files can be exchanged
+QUBIT_DTYPE = np.dtype("<i4")
+
+PROGRAM_MAGIC = b"OSMBODY"
+PROGRAM_VERSION = 2
+PROGRAM_HEADER_DTYPE = np.dtype([("magic", "S8"),
+                                 ("version", "<u4"),
+                                 ("nr_qubits", "<i4"),
+                                 ("t_count", "<i8"),
+                                 ("nr_commands", "<i8"),
+                                 ("nr_qubit_ids", "<i8")])
+
+# how many commands are packed before they are written to the file
+WRITE_CHUNK_SIZE = 65536
+
+
+def qubit_to_string(qubit):
+    return QUBIT_NAMES.get(qubit, str(qubit))
+
+
+def string_to_qubit(qubit_string):
+    if qubit_string in QUBIT_IDS:
+        return QUBIT_IDS[qubit_string]
+    return int(qubit_string)
+
+
+class Command(namedtuple("Command", ["op", "qubits"])):
+    """
+    A multibody command
+    op: CommandTypes
+    qubits: tuple of qubit ids
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return " ".join([self.op.name] + [qubit_to_string(q) for q in self.qubits])
+
+    @staticmethod
+    def from_string(command_string):
+        '''
+        :param command_string: e.g. "MZZ A 3"
+        :return: Command, or a command of UNKNOWN type if the string is not understood
+        '''
+        command_splits = command_string.split()
+        if (len(command_splits) == 0) or (command_splits[0] not in CommandTypes.__members__):
+            return Command(CommandTypes.UNKNOWN, ())
+
+        return Command(CommandTypes[command_splits[0]],
+                       tuple(string_to_qubit(q) for q in command_splits[1:]))
+
+
+class Program(namedtuple("Program", ["commands", "qubits"])):
+    """
+    A program stored in arrays
+    commands: numpy array of COMMAND_DTYPE
+    qubits: numpy array of QUBIT_DTYPE, the qubit ids of all the commands one after the other
+    """
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.commands)
+
+
+def commands_to_array(commands):
+    '''
+    Packs the commands into numpy arrays
+    :param commands: iterable of Command
+    :return: Program
+    '''
+    rows = []
+    qubits = []
+    for command in commands:
+        rows.append((command.op, len(command.qubits), len(qubits)))
+        qubits.extend(command.qubits)
+
+    return Program(np.array(rows, dtype=COMMAND_DTYPE), np.array(qubits, dtype=QUBIT_DTYPE))
+
+
+def array_to_commands(program):
+    '''
+    :param program: Program
+    :return: generator of Command
+    '''
+    # the rows are converted to Python values in chunks, and not one array element at a time
+    for chunk_start in range(0, len(program.commands), WRITE_CHUNK_SIZE):
+        chunk = program.commands[chunk_start:chunk_start + WRITE_CHUNK_SIZE]
+        if len(chunk) == 0:
+            continue
+
+        first_qubit = int(chunk["qubit_offset"][0])
+        last_qubit = int(chunk["qubit_offset"][-1] + chunk["nr_qubits"][-1])
+        chunk_qubits = program.qubits[first_qubit:last_qubit].tolist()
+
+        for (op, nr_qubits, qubit_offset) in chunk.tolist():
+            qubit_offset -= first_qubit
+            yield Command(CommandTypes(op), tuple(chunk_qubits[qubit_offset:qubit_offset + nr_qubits]))
+
+
+def count_t_gates(commands):
+    '''
+    Each T gate needs a distilled A state
+    :param commands: Program or an iterable of Command
+    :return: the number of NEED commands
+    '''
+    if isinstance(commands, Program):
+        return int(np.count_nonzero(commands.commands["op"] == CommandTypes.NEED))
+
+    return sum(1 for command in commands if command.op == CommandTypes.NEED)
+
+
+def write_program(filename, commands):
+    '''
+    Writes the commands to a program file while they are generated
+    The rows are written to a temporary file and the qubit ids to a second one, which is appended at the end.
+    The header is written last, when the number of qubits, the T-count and the number of commands are known,
+    and the temporary file is renamed, such that a reader never finds a half written program
+    :param filename: the name of the program file
+    :param commands: iterable of Command
+    :return: the header as a dictionary
+    '''
+    header = np.zeros(1, dtype=PROGRAM_HEADER_DTYPE)
+    header["magic"] = PROGRAM_MAGIC
+    header["version"] = PROGRAM_VERSION
+
+    temporary_filename = filename + "." + str(os.getpid()) + ".tmp"
+    qubits_filename = filename + "." + str(os.getpid()) + ".qubits.tmp"
+    try:
+        with open(temporary_filename, "wb") as f, open(qubits_filename, "w+b") as qubits_file:
+            # placeholder until the end
+            f.write(header.tobytes())
+
+            rows = []
+            qubits = []
+            for command in commands:
+                rows.append((command.op, len(command.qubits), header["nr_qubit_ids"][0] + len(qubits)))
+                qubits.extend(command.qubits)
+
+                if command.op == CommandTypes.INIT:
+                    header["nr_qubits"] = command.qubits[0]
+
+                if len(rows) == WRITE_CHUNK_SIZE:
+                    write_rows(f, qubits_file, Program(np.array(rows, dtype=COMMAND_DTYPE),
+                                                       np.array(qubits, dtype=QUBIT_DTYPE)), header)
+                    rows = []
+                    qubits = []
+
+            write_rows(f, qubits_file, Program(np.array(rows, dtype=COMMAND_DTYPE),
+                                               np.array(qubits, dtype=QUBIT_DTYPE)), header)
+
+            qubits_file.seek(0)
+            shutil.copyfileobj(qubits_file, f)
+
+            f.seek(0)
+            f.write(header.tobytes())
+
+        os.replace(temporary_filename, filename)
+    finally:
+        for name in (temporary_filename, qubits_filename):
+            if os.path.exists(name):
+                os.remove(name)
+
+    return header_to_dictionary(header)
+
+
+def write_rows(f, qubits_file, chunk, header):
+    f.write(chunk.commands.tobytes())
+    qubits_file.write(chunk.qubits.tobytes())
+
+    header["t_count"] += count_t_gates(chunk)
+    header["nr_commands"] += len(chunk.commands)
+    header["nr_qubit_ids"] += len(chunk.qubits)
+
+
+def load_program(filename):
+    '''
+    Memory maps a program file. The commands are read from the disk only when they are accessed
+    :param filename: the name of the program file
+    :return: the header as a dictionary and the Program, or None if the file is not a program file
+    '''
+    header = np.fromfile(filename, dtype=PROGRAM_HEADER_DTYPE, count=1)
+
+    if (len(header) == 0) or (header["magic"][0] != PROGRAM_MAGIC) or (header["version"][0] != PROGRAM_VERSION):
+        print("ERROR! Not a multibody program file:", filename)
+        return None
+
+    nr_qubit_ids = int(header["nr_qubit_ids"][0])
+    header = header_to_dictionary(header)
+
+    # an empty array can not be memory mapped
+    commands = np.zeros(0, dtype=COMMAND_DTYPE)
+    if header["nr_commands"] > 0:
+        commands = np.memmap(filename, dtype=COMMAND_DTYPE, mode="r",
+                             offset=PROGRAM_HEADER_DTYPE.itemsize, shape=(header["nr_commands"],))
+
+    qubits = np.zeros(0, dtype=QUBIT_DTYPE)
+    if nr_qubit_ids > 0:
+        qubits = np.memmap(filename, dtype=QUBIT_DTYPE, mode="r",
+                           offset=PROGRAM_HEADER_DTYPE.itemsize + header["nr_commands"] * COMMAND_DTYPE.itemsize,
+                           shape=(nr_qubit_ids,))
+
+    return header, Program(commands, qubits)
+
+
+def header_to_dictionary(header):
+    return {"nr_qubits": int(header["nr_qubits"][0]),
+            "t_count": int(header["t_count"][0]),
+            "nr_commands": int(header["nr_commands"][0])}
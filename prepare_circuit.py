@@ -1,5 +1,5 @@
 '''
-Decompose a list of strings into another list of strings.
+Decompose the gates of a QASM circuit into a list of multibody commands.
 This is very similar to how SurfBraid http://alexandrupaler.github.io/quantjs works
 
 For a first round of resource estimations from Cirq, the Clifford + T gates are
@@ -11,14 +11,151 @@ from skc.dawson.factor import *
 from skc.dawson import *
 from skc.compose import *
 from skc.basis import *
+from skc.dawson.batch import solovay_kitaev_batch
+from skc.ancestors import flatten_ancestors
 
+import multibody_commands as mc
+import rotation_cache as rc
+from multibody_commands import Command, CommandTypes, A_QUBIT, ANCILLA_QUBIT
+
+from collections import namedtuple
+
+import io
 import math
+import multiprocessing
+import numpy
+import re
+
+
+class GateRecord(namedtuple("GateRecord", ["name", "angle", "qubits"])):
+    """
+    A gate of the circuit
+    name: the opcode, e.g. "H", "CNOT" or "rz"
+    angle: the rotation angle as a fraction of pi, or None if the gate is not a rotation
+    qubits: tuple of the indices of the qubits
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        # the string format is the one used by the multibody commands
+        name = self.name
+        if self.angle is not None:
+            name += "(pi*" + repr(self.angle) + ")"
+        return " ".join([name] + [str(q) for q in self.qubits])
+
+
+# name, optional parameter between parentheses and the arguments of a QASM statement
+QASM_LINE = re.compile(r"\s*([A-Za-z_][A-Za-z_0-9]*)\s*(?:\(([^)]*)\))?\s*([^;]*)")
+QASM_QUBIT = re.compile(r"\[\s*(\d+)\s*\]")
+# the angle of a rotation in the forms: pi, -pi, pi*0.25, 0.25*pi, pi/4
+QASM_PI_FRACTION = re.compile(r"(-?)(?:([0-9.eE+-]+)\*)?pi(?:([*/])([0-9.eE+-]+))?")
+
+# some minus angles are just like the normal rotation, because I do care about resource estimation
+# and not computational correctness
+FIXED_ROTATIONS = {
+    # half pi rotations
+    ("rz", 0.5): "S", ("rz", -0.5): "S",
+    ("rx", 0.5): "V", ("rx", -0.5): "V",
+    # quarter pi rotations
+    ("rz", 0.25): "T", ("rz", -0.25): "T",
+    # pi + fraction angles - works only for the RZ
+    ("rz", 1.5): "T", ("rz", -1.5): "T",
+    # pi angles are the pauli gates?
+    ("rx", 1.0): "x", ("rx", -1.0): "x",
+    ("ry", 1.0): "y", ("ry", -1.0): "y",
+    ("rz", 1.0): "z", ("rz", -1.0): "z",
+}
+
+GATE_NAMES = {
+    "h": "H",
+    "cx": "CNOT",
+    "cz": "CPHASE",
+}
+
+# the axes of the arbitrary rotations which are SK decomposed
+ROTATION_AXES = {
+    "rx": (1, 0, 0),
+    "ry": (0, 1, 0),
+    "rz": (0, 0, 1),
+}
+
+
+def parse_pi_fraction(parameter):
+    '''
+    The angle of a rotation as a fraction of pi
+    :param parameter: the parameter string of a QASM rotation, e.g. "pi*0.25"
+    :return: float, e.g. 0.25
+    '''
+    parameter = parameter.replace(" ", "")
+    match = QASM_PI_FRACTION.fullmatch(parameter)
+    if match is None:
+        # the angle is in radians
+        return float(parameter) / math.pi
+
+    sign, factor, operation, operand = match.groups()
+    angle = float(factor) if factor else 1.0
+    if operation == "*":
+        angle *= float(operand)
+    elif operation == "/":
+        angle /= float(operand)
+
+    return -angle if sign else angle
+
+
+def tokenize_qasm_line(line):
+    '''
+    Scans a QASM line once
+    :param line: e.g. "rz(pi*0.25) q[3];"
+    :return: GateRecord, e.g. GateRecord("rz", 0.25, (3,))
+    '''
+    match = QASM_LINE.match(line)
+    if match is None:
+        # not a gate, e.g. a comment. It is passed on as it is
+        return GateRecord(line.strip(), None, ())
+
+    name, parameter, arguments = match.groups()
+
+    angle = None
+    if parameter is not None:
+        angle = parse_pi_fraction(parameter)
+
+    qubits = tuple(int(q) for q in QASM_QUBIT.findall(arguments))
+
+    return GateRecord(name, angle, qubits)
+
 
 class PrepareCircuit:
-    def __init__(self):
+    def __init__(self, rotation_cache_filename=None):
         self.H2 = None
+
+        # the tree of basic approximations and the depth of the SK recursion
+        self.sk_tree_subdir = "su2"
+        self.sk_tree_filecount = 15
+        self.sk_depth = 4
+        # "kdtree", "array" or "table", see sk_set_tree_index
+        self.sk_tree_index = "kdtree"
+        # the number of nearest kd-points ranked by Fowler distance, see sk_set_candidates
+        self.sk_candidates = None
+
+        # the SK decompositions of the (angle, axis) seen so far
+        self.decomposed_rotations = {}
+
+        # the SK decompositions of previous runs, see rotation_cache.py
+        # None if they should not be stored, which is the default
+        self.rotation_cache = None
+        if rotation_cache_filename is not None:
+            self.rotation_cache = rc.RotationCache(rotation_cache_filename)
+
         print("Prepare Circuit")
 
+    def close(self):
+        '''
+        Writes the pending updates of the rotation cache and closes it
+        :return: nothing
+        '''
+        if self.rotation_cache is not None:
+            self.rotation_cache.close()
+
     def initialise_skc(self):
         '''
         Configure the SK compiler
@@ -31,18 +168,38 @@ class PrepareCircuit:
             sk_set_basis(self.H2)
             # TODO: Paler - what is this for?
             sk_set_axis(X_AXIS)
-            sk_build_tree("su2", 15)
+            sk_set_tree_index(self.sk_tree_index)
+            sk_set_candidates(self.sk_candidates)
+            sk_build_tree(self.sk_tree_subdir, self.sk_tree_filecount)
 
         return
 
+    def get_sk_tree_id(self, batch=False):
+        # the indices do not always find the same basic approximations
+        tree_id = self.sk_tree_subdir + "-g" + str(self.sk_tree_filecount)
+        if self.sk_tree_index != "kdtree":
+            tree_id += "-" + self.sk_tree_index
+        if self.sk_candidates is not None:
+            tree_id += "-k" + str(self.sk_candidates)
+        # neither does the batched factoring
+        if batch:
+            tree_id += "-batch"
+        return tree_id
+
     def decompose_SK_on_gate(self, pi_fraction, which_axis=(0, 0, 1)):
         '''
         Assume Z rotation always, and decompose the rotations accordingly?
         :param pi_fraction:
         :param which_axis: Tuple indicating with bits which axis the rotation is around
-        :return:
+        :return: list of gate names
         '''
 
+        # the tree is not built if the decomposition was already computed in a previous run
+        if self.rotation_cache is not None:
+            cached = self.rotation_cache.get(pi_fraction, which_axis, self.sk_depth, self.get_sk_tree_id())
+            if cached is not None:
+                return cached
+
         self.initialise_skc()
 
         axis = cart3d_to_h2(
@@ -58,7 +215,7 @@ class PrepareCircuit:
         matrix_U = axis_to_unitary(axis, theta, self.H2)
         op_U = Operator(name="U", matrix=matrix_U)
 
-        n = 4
+        n = self.sk_depth
         # print("U= " + str(matrix_U))
         # print("n= " + str(n))
 
@@ -71,11 +228,99 @@ class PrepareCircuit:
         # print("fowler_dist(U,Un)= " + str(fowler_distance(Un.matrix, op_U.matrix)))
 
         # see skc/operator.py for the ancestors member
-        return self.parse_skc_compiler_ancestors(Un.ancestors)
+        decomposition = self.parse_skc_compiler_ancestors(Un.ancestors)
+
+        if self.rotation_cache is not None:
+            self.rotation_cache.put(pi_fraction, which_axis, self.sk_depth, self.get_sk_tree_id(), decomposition)
+
+        return decomposition
+
+    def decompose_SK_on_gates(self, rotation_keys):
+        '''
+        The batched version of decompose_SK_on_gate, see skc/dawson/batch.py
+        :param rotation_keys: list of (pi_fraction, which_axis)
+        :return: dictionary of the rotation keys to the lists of gate names
+        '''
+        tree_id = self.get_sk_tree_id(batch=True)
+
+        decompositions, missing_keys = self.get_cached_decompositions(rotation_keys, tree_id)
+        if len(missing_keys) == 0:
+            return decompositions
+
+        self.initialise_skc()
+
+        matrices = []
+        for pi_fraction, which_axis in missing_keys:
+            axis = cart3d_to_h2(x=which_axis[0], y=which_axis[1], z=which_axis[2])
+            matrices.append(numpy.asarray(axis_to_unitary(axis, math.pi * pi_fraction, self.H2)))
+
+        approximations, all_ancestors = solovay_kitaev_batch(numpy.array(matrices), self.sk_depth)
+
+        new_decompositions = [self.parse_skc_compiler_ancestors(ancestors) for ancestors in all_ancestors]
+        self.store_decompositions(decompositions, missing_keys, new_decompositions, tree_id)
+
+        return decompositions
+
+    def decompose_SK_in_pool(self, rotation_keys, nr_processes):
+        '''
+        Decomposes the rotations in parallel with decompose_SK_on_gate
+        Each worker process loads the SK tree once, see initialise_sk_worker
+        :param rotation_keys: list of (pi_fraction, which_axis)
+        :param nr_processes: the number of worker processes
+        :return: dictionary of the rotation keys to the lists of gate names
+        '''
+        tree_id = self.get_sk_tree_id()
+
+        decompositions, missing_keys = self.get_cached_decompositions(rotation_keys, tree_id)
+        if len(missing_keys) == 0:
+            return decompositions
+
+        # the workers search like this instance, such that their results are stored under its tree_id
+        sk_settings = (self.sk_tree_subdir, self.sk_tree_filecount, self.sk_depth, self.sk_tree_index,
+                       self.sk_candidates)
+        with multiprocessing.Pool(nr_processes, initializer=initialise_sk_worker, initargs=(sk_settings,)) as pool:
+            # the results are in the order of the keys
+            new_decompositions = pool.map(decompose_in_sk_worker, missing_keys)
+
+        self.store_decompositions(decompositions, missing_keys, new_decompositions, tree_id)
+
+        return decompositions
+
+    def get_cached_decompositions(self, rotation_keys, tree_id):
+        '''
+        :return: dictionary of the rotation keys found in the rotation cache to their decompositions,
+        and the list of the rotation keys which were not found
+        '''
+        decompositions = {}
+        missing_keys = []
+        for pi_fraction, which_axis in rotation_keys:
+            cached = None
+            if self.rotation_cache is not None:
+                cached = self.rotation_cache.get(pi_fraction, which_axis, self.sk_depth, tree_id)
+
+            if cached is not None:
+                decompositions[(pi_fraction, which_axis)] = cached
+            else:
+                missing_keys.append((pi_fraction, which_axis))
+
+        return decompositions, missing_keys
+
+    def store_decompositions(self, decompositions, rotation_keys, new_decompositions, tree_id):
+        # into the returned dictionary and the rotation cache
+        for rotation_key, decomposition in zip(rotation_keys, new_decompositions):
+            decompositions[rotation_key] = decomposition
+
+            if self.rotation_cache is not None:
+                self.rotation_cache.put(*rotation_key, self.sk_depth, tree_id, decomposition)
 
     def parse_skc_compiler_ancestors(self, ancestors):
+        '''
+        :param ancestors: the ancestors of an SK approximation, e.g. the linked sequence of skc/ancestors.py
+        :return: list of gate names
+        '''
         ret_list = []
-        for a in ancestors:
+        # the only place where the sequence is flattened into a list
+        for a in flatten_ancestors(ancestors):
             gate = str(a).replace("d", "")
             ret_list.append(gate)
 
@@ -84,162 +329,209 @@ class PrepareCircuit:
 
 
     def parse_to_my_string_format(self, cirq_circuit):
+        '''
+        Generator of the gates of a QASM circuit in my format
+        The lines are processed one at a time, such that huge circuits do not have to be stored.
+        Each line is scanned once by the tokenizer and the gate records are looked up in tables.
+        :param cirq_circuit: QASM string or an iterable of QASM lines (e.g. an open file)
+        :return: generator of GateRecord
+        '''
+        if isinstance(cirq_circuit, str):
+            cirq_circuit = io.StringIO(cirq_circuit)
+
         # the first 5 lines are header
-        str_s = [s for s in cirq_circuit.split("\n") if s.strip() != ''][4:]
+        nr_header_lines = 4
+        for line in cirq_circuit:
+            if line.strip() == '':
+                continue
 
+            if nr_header_lines > 0:
+                nr_header_lines -= 1
+                continue
+
+            for gate in self.replace_rx_ry_with_rz(tokenize_qasm_line(line)):
+                yield self.replace_in_gate_record(gate)
+
+    def replace_rx_ry_with_rz(self, gate):
         # replace rx with rz
         # replace ry with rz
-        tmp_str_s = []
-        for gate in str_s:
-            qubs = gate.split(" ")[1]
-            if gate.startswith("rx"):
-                tmp_str_s.append("h " + qubs)
-                tmp_str_s.append(gate.replace("rx", "rz"))
-                tmp_str_s.append("h " + qubs)
-            elif gate.startswith("ry"):
-                tmp_str_s.append("rz(pi*0.5) " + qubs)
-                tmp_str_s.append(gate.replace("ry", "rz"))
-                tmp_str_s.append("rz(pi*0.5) " + qubs)
-            else:
-                tmp_str_s.append(gate)
+        if gate.name == "rx":
+            return [GateRecord("h", None, gate.qubits), gate._replace(name="rz"), GateRecord("h", None, gate.qubits)]
+        elif gate.name == "ry":
+            return [GateRecord("rz", 0.5, gate.qubits), gate._replace(name="rz"), GateRecord("rz", 0.5, gate.qubits)]
+
+        return [gate]
 
-        # overwrite str_s
-        str_s = tmp_str_s
+    def replace_in_gate_record(self, gate):
+        # the rotations with known angles become gates
+        if gate.angle is not None:
+            name = FIXED_ROTATIONS.get((gate.name, gate.angle))
+            if name is not None:
+                return GateRecord(name, None, gate.qubits)
 
-        # other replacements
-        # some minus angles are just like the normal rotation, because I do care about resource estimation
-        # and not computational correctness
-        str_s = [s.replace("h", "H") for s in str_s]
+        name = GATE_NAMES.get(gate.name)
+        if name is not None:
+            return gate._replace(name=name)
 
-        # half pi rotations
-        str_s = [s.replace("rz(pi*0.5)", "S") for s in str_s]
-        str_s = [s.replace("rz(pi*-0.5)", "S") for s in str_s]
-        str_s = [s.replace("rx(pi*0.5)", "V") for s in str_s]
-        str_s = [s.replace("rx(pi*-0.5)", "V") for s in str_s]
+        return gate
 
-        # quarter pi rotations
-        str_s = [s.replace("rz(pi*0.25)", "T") for s in str_s]
-        str_s = [s.replace("rz(pi*-0.25)", "T") for s in str_s]
+    def get_rotation_key(self, gate):
+        '''
+        The decompositions are stored by angle and axis
+        :param gate: GateRecord of a rotation
+        :return: (angle as fraction of pi in [0, 2], axis tuple)
+        '''
+        angle_float = math.fabs(gate.angle)
 
-        # pi + fraction angles - works only for the RZ
-        str_s = [s.replace("rz(pi*1.5)", "T") for s in str_s]
-        str_s = [s.replace("rz(pi*-1.5)", "T") for s in str_s]
+        # remove 2pi factors
+        while angle_float > 2:
+            angle_float -= 2
 
-        # pi angles are the pauli gates?
-        str_s = [s.replace("rx(pi*1.0)", "x") for s in str_s]
-        str_s = [s.replace("rx(pi*-1.0)", "x") for s in str_s]
-        str_s = [s.replace("ry(pi*1.0)", "y") for s in str_s]
-        str_s = [s.replace("ry(pi*-1.0)", "y") for s in str_s]
-        str_s = [s.replace("rz(pi*1.0)", "z") for s in str_s]
-        str_s = [s.replace("rz(pi*-1.0)", "z") for s in str_s]
+        return angle_float, ROTATION_AXES[gate.name]
 
-        str_s = [s.replace("cx", "CNOT") for s in str_s]
+    def predecompose_arbitrary_rotations(self, cirq_circuit, nr_processes=None):
+        '''
+        Decomposes all the arbitrary rotations of the circuit at once,
+        such that decompose_arbitrary_rotations finds them already decomposed
+        :param cirq_circuit: QASM string or an iterable of QASM lines
+        :param nr_processes: if None, the rotations are decomposed in a single batch.
+        Otherwise, they are decomposed one by one by a pool of worker processes.
+        :return: list of the GateRecord of the circuit, such that the circuit does not have to be read again
+        '''
+        gate_list = list(self.parse_to_my_string_format(cirq_circuit))
 
-        str_s = [s.replace("q[", "")
-                     .replace("]", "")
-                     .replace(",", " ")
-                     .replace(";", "")
-                     .strip() for s in str_s]
+        rotation_keys = set()
+        for gate in gate_list:
+            if gate.name in ROTATION_AXES:
+                rotation_key = self.get_rotation_key(gate)
+                if (rotation_key[0] != 0.5) and (rotation_key not in self.decomposed_rotations):
+                    rotation_keys.add(rotation_key)
 
-        str_s = [s.replace("cz", "CPHASE") for s in str_s]
+        if nr_processes is None:
+            decompositions = self.decompose_SK_on_gates(sorted(rotation_keys))
+        else:
+            decompositions = self.decompose_SK_in_pool(sorted(rotation_keys), nr_processes)
+        self.decomposed_rotations.update(decompositions)
 
-        return str_s
+        return gate_list
 
     def decompose_arbitrary_rotations(self, gate_list):
-        ret_list = []
-
-        dictionary_decomposed_rotations = {}
+        '''
+        Generator which replaces the arbitrary rotations with their SK decompositions
+        The decompositions are stored in the instance, such that multiple passes over a circuit
+        do not decompose the same angle again, and in the rotation cache for the next runs
+        :param gate_list: iterable of GateRecord
+        :return: generator of GateRecord
+        '''
+        dictionary_decomposed_rotations = self.decomposed_rotations
 
         for gate in gate_list:
-            if gate[0] == "r":
-                which_axis = (0, 0, 0)
-                if gate[1] == "x":
-                    which_axis = (1, 0, 0)
-                elif gate[1] == "y":
-                    which_axis = (0, 1, 0)
-                elif gate[1] == "z":
-                    which_axis = (0, 0, 1)
-
-                # split at "pi"
-                half_part = (gate.split("pi"))[1].replace("*", "").replace(")", "")
-                # take the angle and not the qubits the gate is applied to
-                angle_part_string = half_part.split(" ")[0]
-                angle_float = math.fabs(float(angle_part_string))
-
-                qubit_id = half_part.split(" ")[1]
-
-                # remove 2pi factors
-                while angle_float > 2:
-                    angle_float -= 2
+            if gate.name in ROTATION_AXES:
+                rotation_key = self.get_rotation_key(gate)
+                angle_float, which_axis = rotation_key
+
+                # the rotation is applied to a single qubit
+                qubit_id = gate.qubits[0:1]
 
                 if angle_float == 0.5:
-                    ret_list.append("S " + qubit_id)
+                    yield GateRecord("S", None, qubit_id)
                     continue
 
-                if angle_float not in dictionary_decomposed_rotations:
+                if rotation_key not in dictionary_decomposed_rotations:
                     print(gate, "decompose")
                     # decomposition
                     decompo = self.decompose_SK_on_gate(angle_float, which_axis)
                     # store the decomposition
-                    dictionary_decomposed_rotations[angle_float] = decompo
+                    dictionary_decomposed_rotations[rotation_key] = decompo
                     # into the returned list
 
-                for dec in dictionary_decomposed_rotations[angle_float]:
-                    ret_list.append(dec + " " + qubit_id)
+                for dec in dictionary_decomposed_rotations[rotation_key]:
+                    yield GateRecord(dec, None, qubit_id)
 
             else:
-                ret_list.append(gate)
-
-        return ret_list
-
+                yield gate
 
     def replace_gates_with_multibody(self, gate_list):
-        ret_list = []
+        '''
+        Generator of the multibody commands which implement the gates
+        :param gate_list: iterable of GateRecord
+        :return: generator of Command
+        '''
         for gate in gate_list:
-            qub = gate.split(" ")[-1]
-            if gate.startswith("T"):
-                ret_list.append("NEED A")
-                ret_list.append("MZZ A " + qub)
-                ret_list.append("MX A")
-            elif gate.startswith("S"):
-                ret_list.append(gate)
-            elif gate.startswith("V"):
-                ret_list.append(gate)
-            elif gate.startswith("CPHASE"):
-                qub_control = gate.split(" ")[-2]
-                ret_list.append("H " + qub)
-
-                cnot_gate = "CNOT " + qub_control + " " + qub
-                the_cnot_list = self.replace_gates_with_multibody([cnot_gate])
-                ret_list.extend(the_cnot_list)
-
-                ret_list.append("H " + qub)
-            elif gate.startswith("CNOT"):
-                qub_control = gate.split(" ")[-2]
-                ret_list.append("ANCILLA 0")
-                ret_list.append("MXX " + qub + " ANCILLA")
-                ret_list.append("MZZ " + qub_control + " ANCILLA")
-                ret_list.append("MX ANCILLA")
-            elif gate.startswith("qreg"):
-                ret_list.append("INIT " + qub)
-            elif gate.startswith(("x", "y", "z")):
+            if gate.name == "T":
+                qub = gate.qubits[-1]
+                yield Command(CommandTypes.NEED, (A_QUBIT,))
+                yield Command(CommandTypes.MZZ, (A_QUBIT, qub))
+                yield Command(CommandTypes.MX, (A_QUBIT,))
+            elif gate.name == "S":
+                yield Command(CommandTypes.S, gate.qubits)
+            elif gate.name == "V":
+                yield Command(CommandTypes.V, gate.qubits)
+            elif gate.name == "CPHASE":
+                qub_control, qub = gate.qubits[-2:]
+                yield Command(CommandTypes.H, (qub,))
+
+                cnot_gate = GateRecord("CNOT", None, (qub_control, qub))
+                yield from self.replace_gates_with_multibody([cnot_gate])
+
+                yield Command(CommandTypes.H, (qub,))
+            elif gate.name == "CNOT":
+                qub_control, qub = gate.qubits[-2:]
+                yield Command(CommandTypes.ANCILLA, (0,))
+                yield Command(CommandTypes.MXX, (qub, ANCILLA_QUBIT))
+                yield Command(CommandTypes.MZZ, (qub_control, ANCILLA_QUBIT))
+                yield Command(CommandTypes.MX, (ANCILLA_QUBIT,))
+            elif gate.name == "qreg":
+                yield Command(CommandTypes.INIT, gate.qubits[-1:])
+            elif gate.name in ("x", "y", "z"):
                 # do nothing, skip
                 # skip Pauli gates? - yes because in MXX/MZZ format these can be tracked, because the M?? are CNOTs in fact
                 continue
             else:
                 # add the gate to the list -- we do not know what it is, or if it will be decomposed later
-                ret_list.append(gate)
+                # the gates with the name of a command (e.g. H) are the command
+                op = CommandTypes.__members__.get(gate.name, CommandTypes.UNKNOWN)
+                yield Command(op, gate.qubits)
+
+    def save_multibody_format(self, op_list, filename="multibody.bin"):
+        '''
+        Store the compiled circuit, such that the parsing and the SK decomposition are not repeated
+        :param op_list: iterable of Command
+        :param filename: the program file
+        :return: the header of the program file
+        '''
+        return mc.write_program(filename, op_list)
+
+    def load_multibody_format(self, filename="multibody.bin"):
+        '''
+        :param filename: the program file
+        :return: the header of the program file and the memory mapped multibody_commands.Program
+        '''
+        return mc.load_program(filename)
+
+
+# the PrepareCircuit of a worker process of PrepareCircuit.decompose_SK_in_pool
+worker_prepare_circuit = None
+
+
+def initialise_sk_worker(sk_settings):
+    '''
+    Runs once in each worker process. The SK tree is loaded here, and not for each rotation
+    :param sk_settings: (tree subdir, tree file count, SK depth, tree index, candidates) of the parent PrepareCircuit
+    '''
+    global worker_prepare_circuit
+
+    # only the parent process uses the rotation cache
+    worker_prepare_circuit = PrepareCircuit(rotation_cache_filename=None)
+    (worker_prepare_circuit.sk_tree_subdir,
+     worker_prepare_circuit.sk_tree_filecount,
+     worker_prepare_circuit.sk_depth,
+     worker_prepare_circuit.sk_tree_index,
+     worker_prepare_circuit.sk_candidates) = sk_settings
+
+    worker_prepare_circuit.initialise_skc()
+    sk_get_tree()
 
-        return ret_list
 
-    def save_multibody_format(self, op_list):
-        with open("multibody.txt", "w") as f:
-            for gate in op_list:
-                f.write(gate)
-
-    def load_multibody_format(self):
-        ret = []
-        with open("output_instructions.txt", "r") as f:
-            for line in f:
-                ret.append(line.strip())
-        return ret
+def decompose_in_sk_worker(rotation_key):
+    return worker_prepare_circuit.decompose_SK_on_gate(*rotation_key)
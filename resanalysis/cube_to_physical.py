@@ -56,6 +56,8 @@ class Qentiana:
         self.max_logical_qubits = experiment["footprint"]
         self.max_time_units = experiment["depth_units"]
         self.t_count = experiment["t_count"]
+        # the distillations are executed in parallel by this number of factories
+        self.number_of_factories = experiment["number_of_factories"]
 
         if self.t_count == 0 and self.max_time_units == 0:
             print("PROBLEM!!! Both t_count and max_time_units are zero! Results will be wrong!")
@@ -254,8 +256,10 @@ class Qentiana:
             total_dist_qubits = 8 * l1_dist_qubits + l2_dist_qubits
         else:
             total_dist_qubits = "fail"
+            return total_dist_qubits
 
-        return total_dist_qubits
+        # Each factory has its own distillery
+        return self.number_of_factories * total_dist_qubits
 
 
     def compute_footprint_data_qubits(self):
@@ -322,7 +326,9 @@ class Qentiana:
             If the T-count is the worst case (and max_time_units was not specified)
             then the multiplication factor is used to determine the max_time_units
             """
-            execution_rounds = self.compute_number_of_rounds(elements=self.t_count,
+            # The factories work in parallel, such that each executes a fraction of the distillations
+            distillations_per_factory = math.ceil(self.t_count / self.number_of_factories)
+            execution_rounds = self.compute_number_of_rounds(elements=distillations_per_factory,
                                           element_distance=self.dist_box_dimensions["depth_distance"],
                                           element_units_in_time=self.dist_box_dimensions["t"])
 
@@ -46,6 +46,10 @@ class Experiment:
         # option_A is more worst-case like, if for example the depth is only a rule-of-thumb calculation
         self.props["prefer_depth_over_t_count"] = False
 
+        # How many distillation factories produce the T states in parallel
+        # More factories need more physical qubits, but the T states are available earlier
+        self.props["number_of_factories"] = 1
+
 
     def to_json(self):
         obj = {}
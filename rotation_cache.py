@@ -0,0 +1,115 @@
+'''
+Persistent cache of the Solovay-Kitaev decompositions of rotations
+
+Decomposing a rotation is expensive and the same angles appear in many circuits
+(e.g. the Trotter steps of OpenFermion circuits). The decompositions are stored in a sqlite file,
+such that they are shared between runs and between processes.
+
+A decomposition depends on the angle, the axis of the rotation, the depth of the SK recursion
+and on the tree of basic approximations. All of these are part of the key.
+The least recently used decompositions are removed when the cache has too many entries.
+
+A hit does not write to the file. The times of the hits are kept in memory and written with the next put,
+or when many of them are pending. The eviction runs only every eviction_interval puts, such that the cache
+can hold up to eviction_interval entries more than max_entries in between.
+
+The cache is opt-in, see PrepareCircuit.
+'''
+
+import sqlite3
+import time
+
+
+class RotationCache:
+    def __init__(self, filename="rotation_cache.sqlite", max_entries=100000, eviction_interval=1000):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.eviction_interval = eviction_interval
+
+        # the file is opened only when the cache is used
+        self.connection = None
+
+        # the keys of the hits, which were not written yet, to the time of their last hit
+        self.pending_last_used = {}
+        # the number of puts since the last eviction
+        self.nr_puts = 0
+
+    def connect(self):
+        if self.connection is None:
+            # other processes may write to the cache at the same time, wait for them
+            self.connection = sqlite3.connect(self.filename, timeout=60)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS decompositions ("
+                                    "angle REAL, axis TEXT, depth INTEGER, tree TEXT, "
+                                    "gates TEXT, last_used REAL, "
+                                    "PRIMARY KEY (angle, axis, depth, tree))")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS decompositions_last_used "
+                                    "ON decompositions (last_used)")
+            self.connection.commit()
+
+        return self.connection
+
+    def get(self, angle, axis, depth, tree_id):
+        '''
+        :param angle: the rotation angle as a fraction of pi
+        :param axis: tuple indicating the axis of the rotation
+        :param depth: the depth of the SK recursion
+        :param tree_id: string identifying the tree of basic approximations
+        :return: the list of gate names, or None if the decomposition is not in the cache
+        '''
+        connection = self.connect()
+        key = (angle, str(tuple(axis)), depth, tree_id)
+
+        row = connection.execute("SELECT gates FROM decompositions "
+                                 "WHERE angle=? AND axis=? AND depth=? AND tree=?", key).fetchone()
+        if row is None:
+            return None
+
+        # mark as recently used, written later
+        self.pending_last_used[key] = time.time()
+        if len(self.pending_last_used) >= self.eviction_interval:
+            self.write_last_used()
+            connection.commit()
+
+        if row[0] == "":
+            return []
+        return row[0].split(" ")
+
+    def put(self, angle, axis, depth, tree_id, gates):
+        '''
+        Stores a decomposition and evicts the least recently used ones if there are too many
+        :param gates: list of gate names
+        :return: nothing
+        '''
+        connection = self.connect()
+
+        connection.execute("INSERT OR REPLACE INTO decompositions VALUES (?, ?, ?, ?, ?, ?)",
+                           (angle, str(tuple(axis)), depth, tree_id, " ".join(gates), time.time()))
+        self.write_last_used()
+
+        self.nr_puts += 1
+        if self.nr_puts >= self.eviction_interval:
+            self.nr_puts = 0
+            connection.execute("DELETE FROM decompositions WHERE rowid IN "
+                               "(SELECT rowid FROM decompositions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                               (self.max_entries,))
+        connection.commit()
+
+    def write_last_used(self):
+        '''
+        Writes the times of the pending hits, without committing them
+        :return: nothing
+        '''
+        if len(self.pending_last_used) == 0:
+            return
+
+        self.connection.executemany("UPDATE decompositions SET last_used=? "
+                                    "WHERE angle=? AND axis=? AND depth=? AND tree=?",
+                                    [(last_used, *key) for key, last_used in self.pending_last_used.items()])
+        self.pending_last_used = {}
+
+    def close(self):
+        if self.connection is not None:
+            self.write_last_used()
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,146 @@
+import multibody_commands as mc
+
+# the measurements of the same Pauli basis commute, and can be reordered on a qubit
+COMMUTATION_BASIS = {
+    mc.CommandTypes.MZZ: "Z",
+    mc.CommandTypes.MZ: "Z",
+    mc.CommandTypes.MXX: "X",
+    mc.CommandTypes.MX: "X",
+}
+
+
+class CommandScheduler:
+    def __init__(self, lay, patches_state):
+        '''
+            Places each command as early as its qubits allow, instead of after the previous command.
+            The dependencies are the edges of a DAG over the commands: a command depends on the last
+            commands on each of its patches, except the commands of a run of commuting measurements,
+            which depend only on what was before the run. The commands are started at the time
+            their dependencies have finished, and CubeLayout.configure_operation moves them further
+            in time if their spans collide with operations which were already placed.
+        :param lay: the CubeLayout
+        :param patches_state: the PatchesState of the layout
+        '''
+        self.lay = lay
+        self.patches_state = patches_state
+
+        # per patch name: the time after the last command on the patch
+        self.patch_ready = {}
+        # per patch name: (basis of the last run of commuting commands, time at which the run could start)
+        self.patch_run = {}
+        # per patch name: until when the idle patch was extended with USE_QUBIT cells
+        # the data patches of the circuit exist from the beginning
+        self.extended_until = {name: 0 for name in patches_state.get_all_active_patches()}
+
+        # the names of the patches of the current command
+        self.command_patches = []
+
+    def get_command_patches(self, command):
+        '''
+        :param command: a Command
+        :return: the names of the patches the command waits for
+        '''
+        layer_map = self.lay.layer_map
+        op = command.op
+
+        if op == mc.CommandTypes.NEED:
+            return ["A"]
+
+        if op == mc.CommandTypes.MXX:
+            # like in layout_commands
+            qubits = command.qubits[0:2]
+        elif op in (mc.CommandTypes.MZZ, mc.CommandTypes.MX, mc.CommandTypes.MZ, mc.CommandTypes.H,
+                    mc.CommandTypes.S, mc.CommandTypes.V):
+            qubits = command.qubits
+        else:
+            # INIT, ANCILLA and MOVE do not place anything
+            return []
+
+        names = [layer_map.get_circuit_qubit_name(x) for x in qubits]
+
+        if op in (mc.CommandTypes.S, mc.CommandTypes.V) and names[0] != "ANCILLA":
+            # the S gate moves the neighbouring data patch, and uses the place of another one
+            qub1_coord = layer_map.get_qubit_coordinate_2d(names[0])
+            coords = self.lay.compute_qubits_for_s_gate(qub1_coord)
+            for coord in (coords[1], coords[4]):
+                name = self.lay.find_name_for_qubit_coordinate(coord)
+                if name != "" and self.patches_state.is_patch_active(name):
+                    names.append(name)
+
+        return names
+
+    def start_command(self, command):
+        '''
+            Computes when the command can start, and moves the current time coordinate of the layout there.
+            The idle patches of the command are extended until then.
+        :param command: a Command
+        :return: the time coordinate at which the command is placed, before accommodating its spans
+        '''
+        self.command_patches = self.get_command_patches(command)
+        basis = COMMUTATION_BASIS.get(command.op)
+
+        start = 0
+        for name in self.command_patches:
+            last_end = self.patch_ready.get(name, 0)
+            (run_basis, run_start) = self.patch_run.get(name, (None, 0))
+
+            if (basis is None) or (basis != run_basis):
+                # the command starts a new run after all the commands on the patch
+                run_start = last_end
+                self.patch_run[name] = (basis, run_start)
+
+            start = max(start, run_start)
+
+        for name in self.command_patches:
+            self.extend_patch(name, start)
+
+        self.lay.current_time_coordinate = start
+        self.lay.coordinates.ensure_time_coordinate(start)
+
+        return start
+
+    def end_command(self):
+        '''
+            Records the time after the command, which the layout reached in move_curr_time_coord_to_max_from_coords
+        :return: the time after the command
+        '''
+        end = self.lay.current_time_coordinate
+
+        for name in self.command_patches:
+            self.patch_ready[name] = max(self.patch_ready.get(name, 0), end)
+            if self.patches_state.is_patch_active(name):
+                self.extended_until[name] = max(self.extended_until.get(name, 0), end)
+            else:
+                # the patch was measured, and a new one starts with its next command
+                self.extended_until.pop(name, None)
+
+        self.command_patches = []
+
+        return end
+
+    def extend_patch(self, name, time_coordinate):
+        '''
+            Fills the free cells of an active patch with USE_QUBIT until the time coordinate.
+            The cells of the patch which are already used by other operations are left as they are
+        :param name: the name of the patch
+        :param time_coordinate: the first time which is not extended
+        :return: nothing
+        '''
+        if (not self.patches_state.is_patch_active(name)) or (name not in self.extended_until):
+            # the patch is created by the command
+            self.extended_until[name] = time_coordinate
+            return
+
+        self.lay.extend_patch_in_time(name, self.patches_state, self.extended_until[name], time_coordinate)
+        self.extended_until[name] = max(self.extended_until[name], time_coordinate)
+
+    def finish(self):
+        '''
+            Extends all the active patches until the end of the layout
+        :return: the depth of the scheduled layout
+        '''
+        depth = self.lay.coordinates.get_depth()
+        for name in self.patches_state.get_all_active_patches():
+            self.extend_patch(name, depth)
+
+        return depth
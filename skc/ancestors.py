@@ -0,0 +1,93 @@
+# Ancestor sequences which share their parts instead of copying them
+#
+# The Solovay-Kitaev recursion builds U_n = V W V^dagger W^dagger U_{n-1} from
+# the sequences of the previous level. With lists, every product copies the
+# whole sequence, such that the total work grows quadratically with the length
+# of the result. An AncestorSequence only references its parts: a product
+# is a node over the two sequences and a dagger is a node over one sequence,
+# both created in constant time.
+#
+# The list of gate names is computed once, when the sequence is flattened.
+# Until then, an AncestorSequence can be used like the list of ancestors of
+# an Operator: it has a length, it can be iterated and extended with +.
+
+__all__ = ["AncestorSequence", "concatenate_ancestors", "dagger_ancestors",
+		   "flatten_ancestors"]
+
+class AncestorSequence:
+	__slots__ = ("parts", "child", "length")
+
+	# Either parts is a list of sequences to concatenate,
+	# or child is the sequence which is daggered
+	def __init__(self, parts=None, child=None):
+		self.parts = parts
+		self.child = child
+		if child is not None:
+			self.length = len(child)
+		else:
+			self.length = sum(len(part) for part in parts)
+
+	def __len__(self):
+		return self.length
+
+	def __iter__(self):
+		return iter(self.flatten())
+
+	def __add__(self, other):
+		return concatenate_ancestors(self, other)
+
+	def __radd__(self, other):
+		return concatenate_ancestors(other, self)
+
+	def __eq__(self, other):
+		return self.flatten() == flatten_ancestors(other)
+
+	def __str__(self):
+		return str(self.flatten())
+
+	def __repr__(self):
+		return "AncestorSequence(" + str(self) + ")"
+
+	# The list of the gate names
+	# The nodes are visited with a stack, such that long sequences do not hit the recursion limit
+	def flatten(self):
+		result = []
+		# (sequence, how many times it is daggered)
+		stack = [(self, 0)]
+		while stack:
+			(sequence, daggers) = stack.pop()
+
+			if not isinstance(sequence, AncestorSequence):
+				# a list of names, the dagger of a name is the name followed by d
+				if daggers == 0:
+					result.extend(sequence)
+				else:
+					suffix = "d" * daggers
+					names = sequence if (daggers % 2 == 0) else reversed(sequence)
+					result.extend([name + suffix for name in names])
+			elif sequence.child is not None:
+				stack.append((sequence.child, daggers + 1))
+			elif (daggers % 2 == 0):
+				# the first part is taken from the stack first
+				stack.extend([(part, daggers) for part in reversed(sequence.parts)])
+			else:
+				# the dagger reverses the order of the parts
+				stack.extend([(part, daggers) for part in sequence.parts])
+
+		return result
+
+##############################################################################
+def concatenate_ancestors(*sequences):
+	parts = [sequence for sequence in sequences if len(sequence) > 0]
+	return AncestorSequence(parts=parts)
+
+##############################################################################
+# The same names as the ancestors of Operator.dagger
+def dagger_ancestors(sequence):
+	return AncestorSequence(child=sequence)
+
+##############################################################################
+def flatten_ancestors(sequence):
+	if isinstance(sequence, AncestorSequence):
+		return sequence.flatten()
+	return list(sequence)
@@ -0,0 +1,143 @@
+# Nearest neighbour index for the basic approximations, backed by arrays
+#
+# The points of all the operators are stored in a single float array
+# and searched with scipy's cKDTree. The closest candidates are ranked again
+# by their Fowler distance to the searched unitary, which is computed for all
+# the candidates at once.
+#
+# For single qubit operators the points are not the kd-points of the operators.
+# Divided by the square root of its determinant, an operator is in SU(2) and
+# is written as a unit vector q = (Re a, Im a, Re b, Im b) of its first column (a, b).
+# Then trace(A^dagger * B) = 2 <q_A, q_B>, and the Fowler distance
+# sqrt(1 - |<q_A, q_B>|) grows with the euclidean distance between q_B and the
+# closest of q_A and -q_A. The index stores both signs, and the nearest point
+# is the operator with the smallest Fowler distance.
+#
+# The points of quaternion operators are their quaternions.
+#
+# It answers the same queries as KDTree from skc.kdtree. The tree can also be
+# built from the memory mapped columns of a SequenceTable
+# (skc.basic_approx.table), without creating an Operator for each row.
+# The cKDTree is built again from the points each time: this takes a few
+# milliseconds, and a stored copy would hold the points a second time.
+
+import numpy
+import scipy.spatial
+
+from skc.utils import *
+from skc.quaternion import *
+
+__all__ = ["ArrayKDTree", "su2_points"]
+
+# how many candidates from the index are ranked by Fowler distance
+CANDIDATES = 16
+
+def su2_points(matrices):
+	# matrices has the shape (n, 2, 2)
+	det = matrices[:, 0, 0] * matrices[:, 1, 1] - matrices[:, 0, 1] * matrices[:, 1, 0]
+	first_column = matrices[:, :, 0] / numpy.sqrt(det)[:, None]
+	return numpy.stack((first_column[:, 0].real, first_column[:, 0].imag,
+						first_column[:, 1].real, first_column[:, 1].imag), axis=1)
+
+class ArrayKDTree():
+	def __init__(self, data, candidates=CANDIDATES):
+		self.ops = list(data)
+		self.candidates = candidates
+
+		quaternions = None
+		if len(self.ops) > 0 and isinstance(self.ops[0], QuaternionOperator):
+			quaternions = numpy.array([op.quaternion for op in self.ops], dtype=float)
+			# shape (number of operators, 2, 2)
+			self.matrices = quaternions_to_matrices(quaternions)
+		else:
+			# shape (number of operators, d, d)
+			self.matrices = numpy.array([numpy.asarray(op.matrix) for op in self.ops], dtype=complex)
+		self.d = self.matrices.shape[1] if len(self.ops) > 0 else 0
+
+		if self.d == 2 and quaternions is not None:
+			points = quaternions
+		elif self.d == 2:
+			points = su2_points(self.matrices)
+		else:
+			points = numpy.array([op.dimensions for op in self.ops], dtype=float)
+		self.build_index(points)
+
+		# Garbage collect the dimensions, like KDTree does
+		for op in self.ops:
+			del op.dimensions
+
+	def build_index(self, points):
+		if self.d == 2:
+			# the rows n and n + len(ops) are the same operator
+			self.points = numpy.concatenate((points, -numpy.asarray(points)))
+		else:
+			# one row per operator
+			self.points = points
+		self.index = scipy.spatial.cKDTree(self.points)
+
+	@staticmethod
+	def construct_from_data(data):
+		tree = ArrayKDTree(data)
+		return tree
+
+	@staticmethod
+	def construct_from_table(table, candidates=CANDIDATES):
+		tree = ArrayKDTree.__new__(ArrayKDTree)
+		# the operators are built from the rows of the table when they are found
+		tree.ops = None
+		tree.table = table
+		tree.candidates = candidates
+		tree.matrices = table.matrices
+		tree.d = table.matrices.shape[1] if len(table) > 0 else 0
+		tree.build_index(table.points)
+		return tree
+
+	def __len__(self):
+		return len(self.matrices)
+
+	def operator(self, i):
+		if self.ops is None:
+			return self.table.operator(i)
+		return self.ops[i]
+
+	def ancestors(self, i):
+		if self.ops is None:
+			return self.table.ancestors(i)
+		return self.ops[i].ancestors
+
+	def query_point(self, query_op):
+		if self.d == 2:
+			return su2_points(numpy.asarray(query_op.matrix, dtype=complex)[None, :, :])[0]
+		return query_op.dimensions
+
+	def fowler_distances(self, indices, matrix_U):
+		# Fowler distance between each of the indexed operators and matrix_U
+		return fowler_distances(self.matrices[indices], matrix_U)
+
+	# k is the number of candidates from the index, self.candidates if it is None
+	def query(self, query_op, t=1, k=None):
+		if len(self) == 0:
+			return []
+
+		k = min(max(k or self.candidates, t), len(self.points))
+		(index_distances, rows) = self.index.query(self.query_point(query_op), k=k)
+		# both signs of an operator can be among the candidates
+		indices = numpy.unique(numpy.atleast_1d(rows) % len(self))
+
+		distances = self.fowler_distances(indices, numpy.asarray(query_op.matrix))
+		best = numpy.argsort(distances, kind="stable")[:t]
+
+		return [self.operator(indices[i]) for i in best]
+
+	def query_many(self, matrices, k=None):
+		# The index of the closest operator to each of the single qubit matrices (N, 2, 2)
+		assert(self.d == 2)
+		k = min(k or self.candidates, len(self.points))
+		(index_distances, rows) = self.index.query(su2_points(matrices), k=k)
+		# sorted, such that the equally close operators are chosen like in query
+		indices = numpy.sort(rows.reshape(len(matrices), k) % len(self), axis=1)
+
+		traces = numpy.einsum('nkij,nij->nk', self.matrices[indices].conj(), matrices)
+		distances = numpy.sqrt(numpy.abs((2 - numpy.abs(traces)) / 2))
+
+		return indices[numpy.arange(len(matrices)), numpy.argmin(distances, axis=1)]
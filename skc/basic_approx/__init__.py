@@ -52,5 +52,6 @@ class BasicApproxSettings:
 
 	# Initialize the global simplify engine with the given rules for all
 	# subsequent generation of basic approximations
+	# CompiledSimplifyEngine has the same normal forms as SimplifyEngine
 	def init_simplify_engine(self, rules):
-		self.simplify_engine = SimplifyEngine(rules)
+		self.simplify_engine = CompiledSimplifyEngine(rules)
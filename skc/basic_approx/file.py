@@ -1,15 +1,15 @@
 # Utilities for managing sequence generation, file chunking, and stats 
 
 import glob
+import json
+import os
 import time
 
 # import pickle
 # Paler - try cpickle first
 # https://askubuntu.com/questions/742782/how-to-install-cpickle-on-python-3-4
-try:
-   import _pickle as pickle
-except:
-   import pickle
+# In Python 3 pickle uses the C implementation already, and _pickle has no HIGHEST_PROTOCOL
+import pickle
 
 ##############################################################################
 # GLOBAL VARIABLES
@@ -73,25 +73,45 @@ def dump_to_file(object, custom_filename=""):
 	
 	f.close()
 
+##############################################################################
+# Write the object to a temporary file which is renamed, such that a reader
+# never finds a half written file, even if the writing fails
+def dump_to_filename(object, filename):
+	temporary_filename = filename + "." + str(os.getpid()) + ".tmp"
+	try:
+		with open(temporary_filename, 'wb') as f:
+			pickle.dump(object, f, pickle.HIGHEST_PROTOCOL)
+		os.replace(temporary_filename, filename)
+	finally:
+		if os.path.exists(temporary_filename):
+			os.remove(temporary_filename)
+
 ##############################################################################
 def chunk_sequences_to_file():
 	# Do chunking if necessary
 	if (len(global_sequences) >= chunk_size):
 		save_chunk_to_file()
 
+##############################################################################
+# The chunk files of a generation, in the order in which they were written
+def generation_filenames(generation_num):
+	filename_pattern = filename_prefix + "-g" + str(generation_num) + "-*.pickle"
+	# -g1-* does not match the files of -g10-*
+	filenames = glob.glob(filename_pattern)
+	def chunk_number(filename):
+		chunk = filename[len(filename_prefix + "-g" + str(generation_num) + "-"):-len(".pickle")]
+		return int(chunk) if chunk.isdigit() else 0
+	return sorted(filenames, key=chunk_number)
+
 ##############################################################################
 # Returns true if a file already exists for the given generation number
 def generation_file_exists(generation_num):
-	filename_pattern = filename_prefix + "-g" + str(generation_num) \
-		+ "*.pickle"
-	filenames = glob.glob(filename_pattern)
+	filenames = generation_filenames(generation_num)
 	return (len(filenames) > 0)
 
 ##############################################################################
 def map_to_file_chunks(generation_num, callback):
-	filename_pattern = filename_prefix + "-g" + str(generation_num) \
-		+ "*.pickle"
-	filenames = glob.glob(filename_pattern)
+	filenames = generation_filenames(generation_num)
 	if (len(filenames) == 0):
 		raise RuntimeError("No files found for generation " + str(generation_num))
 	for filename in filenames:
@@ -100,6 +120,34 @@ def map_to_file_chunks(generation_num, callback):
 		#for sequence in sequences:
 		#	print str(sequence) 
 		callback(sequences)
+
+##############################################################################
+# The manifest records how far the generation got, such that it can be resumed
+# It is a dictionary of the generation numbers (as strings) to
+# {"chunks_done": input chunks processed, "files": chunk files written, "complete": bool}
+def manifest_filename():
+	return filename_prefix + "-manifest.json"
+
+def load_manifest():
+	if not os.path.exists(manifest_filename()):
+		return None
+	with open(manifest_filename(), 'r') as f:
+		return json.load(f)
+
+def save_manifest(manifest):
+	# Write a new file and replace the old one, such that an interruption
+	# never leaves half a manifest
+	temporary_filename = manifest_filename() + ".tmp"
+	with open(temporary_filename, 'w') as f:
+		json.dump(manifest, f, indent=1, sort_keys=True)
+	os.replace(temporary_filename, manifest_filename())
+
+##############################################################################
+# Remove the chunk files written after the last checkpoint of a generation
+def remove_generation_files_after(generation_num, files):
+	for filename in generation_filenames(generation_num)[files:]:
+		print("Removing unfinished file: " + filename)
+		os.remove(filename)
 		
 ##############################################################################
 # Force saving global sequences to file, without checking chunksize
@@ -131,6 +179,20 @@ def reset_file_counter():
 	global file_counter
 	file_counter = 1
 
+##############################################################################
+def set_file_counter(new_file_counter):
+	global file_counter
+	file_counter = new_file_counter
+
+##############################################################################
+# The number of chunk files written in the current generation
+def get_file_count():
+	return file_counter - 1
+
+##############################################################################
+def global_sequences_count():
+	return len(global_sequences)
+
 ##############################################################################
 def reset_global_stats():
 	global global_count
@@ -2,6 +2,7 @@
 #import time
 #import cPickle
 #import types
+import multiprocessing
 import numpy
 
 from skc.basic_approx.file import *
@@ -12,17 +13,15 @@ from skc.utils import *
 ##############################################################################
 # GLOBAL VARIABLES
 settings = None
+# The simplified ancestors generated so far in the current generation, as strings
+generation_ancestors = set()
 
 ##############################################################################
-# Recursive helper method which enumerates all possible combinations of
-# operators, given prefix an array containing all operators so far concatenated
-# (multiplied into a single matrix)
-def gen_basic_approx_generation(prefixes):
-	# Start with a clean slate
-	reset_global_sequences()
-	reset_generation_stats()
-	
-	simplified_ancestors = []
+# Extends each prefix with each operator of the instruction set.
+# Returns the list of (ancestor string, new operator) of the new sequences,
+# in the order in which they were enumerated, each sequence only once.
+def extend_prefixes(prefixes):
+	simplified_ancestors = set()
 
 	# Simplifies the given "new" prefix within this generation.
 	# If it simplifies to something already generated, then
@@ -38,18 +37,20 @@ def gen_basic_approx_generation(prefixes):
 		#		print "Simplified " + str(new_op.ancestors) + \
 		#			" to " + str(simplified_sequence)
 		ancestor_string = list_as_string(simplified_sequence)
-		already_done = (ancestor_string in simplified_ancestors)
+		# a set, such that checking for duplicates does not scan all the sequences
+		already_done = (ancestor_string in simplified_ancestors) \
+			or (ancestor_string in generation_ancestors)
 		#if (already_done):
 		#	print "Already did " + str(ancestor_string)
 		if (simplified_sequence == [settings.identity.name] or already_done):
-			return True
+			return None
 		
 		# Only assign to operator if we have a valid, new, simplified sequence
 		new_op.ancestors = simplified_sequence
 		close_to_identity = new_op.matrix_from_ancestors(settings.iset_dict, settings.identity)
 		# If this matrix is close to identity, return True to skip it
 		if (close_to_identity):
-			return True
+			return None
 		
 		# Decompose into R^{d^2} for later processing into search trees
 		(components, K, matrix_H) = unitary_to_axis(new_op.matrix, settings.basis)
@@ -73,69 +74,161 @@ def gen_basic_approx_generation(prefixes):
 		new_op.dimensions = dimensions
 
 		# Add this to our list so we don't add it again this generation
-		simplified_ancestors.append(ancestor_string)
+		simplified_ancestors.add(ancestor_string)
 		#print "ancestor_string= " + ancestor_string
-		return False
+		return ancestor_string
 	#------------------------------------------------------------------------
+	new_sequences = []
 	for prefix in prefixes:
 		# Enumerate over iset, appending one op to end of prefix each
 		for insn in settings.iset:
 			new_op = prefix.add_ancestors(insn)
-			#(simplify_length, new_sequence) = \
-			#	settings.simplify(new_op.ancestors)
 			
-			already_done = simplify_new(new_op)
-			if (already_done):
+			ancestor_string = simplify_new(new_op)
+			if (ancestor_string is None):
 				continue
-			#if (simplify_length > 0):
-			#	print str(simplify_length) + " simplified"
-			append_sequence(new_op)
+			new_sequences.append((ancestor_string, new_op))
 			#print "matrix= " + str(new_op.matrix)
 			#print str(new_op.ancestors)
-			
-	# Dump whatever's left this generation into one last file
-	save_chunk_to_file()
+
+	return new_sequences
+
+##############################################################################
+# Appends the sequences of extend_prefixes which were not generated yet in this
+# generation. The sequences of different input chunks can be the same.
+def append_new_sequences(new_sequences):
+	for (ancestor_string, new_op) in new_sequences:
+		if (ancestor_string in generation_ancestors):
+			continue
+		generation_ancestors.add(ancestor_string)
+		append_sequence(new_op)
+
+##############################################################################
+# The sequences of one chunk of prefixes are written to at least one file,
+# the checkpoints of the generation are after them
+def gen_basic_approx_chunk(new_sequences):
+	append_new_sequences(new_sequences)
+
+	# Dump whatever's left into one more file
+	if (global_sequences_count() > 0):
+		save_chunk_to_file()
+
+def gen_basic_approx_generation(prefixes):
+	gen_basic_approx_chunk(extend_prefixes(prefixes))
+
+##############################################################################
+# Worker processes of the generation. Each of them extends a whole input chunk
+def init_generate_worker(new_settings):
+	global settings
+	settings = new_settings
+
+def extend_file_chunk(filename):
+	return extend_prefixes(read_from_file(filename))
+
+##############################################################################
+# Starts a generation from the checkpoint in the manifest, or from the beginning
+def resume_generation(generation_num, manifest):
+	state = manifest.setdefault(str(generation_num), {"chunks_done": 0, "files": 0, "complete": False})
+
+	# The sequences after the last checkpoint are generated again
+	remove_generation_files_after(generation_num, state["files"])
+	set_file_counter(state["files"] + 1)
+
+	# The sequences generated before the checkpoint are not added again
+	generation_ancestors.clear()
+	for filename in generation_filenames(generation_num):
+		for op in read_from_file(filename):
+			generation_ancestors.add(list_as_string(op.ancestors))
+
+	if (state["chunks_done"] > 0):
+		print("Resuming generation " + str(generation_num) + " after " \
+			+ str(state["chunks_done"]) + " chunks")
+	return state
+
+##############################################################################
+# Generates generation_num + 1 from the chunk files of generation_num
+# The chunks are extended by nr_processes worker processes, and the manifest
+# is written after each chunk
+def gen_generation_from_files(generation_num, manifest, nr_processes=None):
+	state = resume_generation(generation_num + 1, manifest)
+
+	filenames = generation_filenames(generation_num)
+	if (len(filenames) == 0):
+		raise RuntimeError("No files found for generation " + str(generation_num))
+	filenames = filenames[state["chunks_done"]:]
+
+	pool = None
+	if (nr_processes is not None) and (nr_processes > 1):
+		pool = multiprocessing.Pool(nr_processes, initializer=init_generate_worker, initargs=(settings,))
+		# in the order of the files, such that the result does not depend on the number of processes
+		results = pool.imap(extend_file_chunk, filenames)
+	else:
+		results = map(extend_file_chunk, filenames)
+
+	try:
+		for new_sequences in results:
+			gen_basic_approx_chunk(new_sequences)
+
+			state["chunks_done"] += 1
+			state["files"] = get_file_count()
+			save_manifest(manifest)
+	finally:
+		if pool is not None:
+			pool.terminate()
 
 ##############################################################################
 ## Generate table of basic approximations as preprocessing
 # l_0 - fixed length of sequences to generate for preprocessing table
-def basic_approxes(l_0, new_settings):
+# nr_processes - the number of worker processes, None to generate in this process
+def basic_approxes(l_0, new_settings, nr_processes=None):
 	global settings
 	
 	settings = new_settings
 
 	reset_global_stats()
-	
-	set_filename_suffix("g1")
-	# Kick things off by generating the first generation
-	# (one-operator sequences for each instruction)
-	# Passing an empty list will cause iset to be used as prefixes
-	gen_basic_approx_generation([settings.identity])
-	print_generation_stats(1)
-	
+
+	# The generations which were completed by a previous run are skipped
+	manifest = load_manifest()
+	if (manifest is None):
+		manifest = {}
+		# Files written without a manifest are assumed to be complete
+		for i in range(1, l_0 + 1):
+			if generation_file_exists(i):
+				manifest[str(i)] = {"chunks_done": 0, "files": len(generation_filenames(i)), "complete": True}
+		save_manifest(manifest)
+
 	# Iterate over 1 to l_0, generating sequences of increasing length
-	for i in range(1,l_0):
-		# Set the generation's filename suffix
-		set_filename_suffix("g" + str(i+1))
-		
-		# Check whether an generation file already exists for the current
-		# generation that we can use
-		already_exists = generation_file_exists(i+1)
-		if (already_exists):
-			print("Yay! Generation " + str(i+1) + " file already found, skipping")
+	for i in range(1, l_0 + 1):
+		if manifest.get(str(i), {}).get("complete", False):
+			print("Yay! Generation " + str(i) + " file already found, skipping")
 			# less work for us. Assume it's correct.
 			continue
-		# Generate a new generation using the previous one as prefixes
-		# we pass in the generation num of the one that just passed
-		reset_file_counter()
-		map_to_file_chunks(i, gen_basic_approx_generation)
-		print_generation_stats(i+1)
+
+		# Set the generation's filename suffix
+		set_filename_suffix("g" + str(i))
+		reset_generation_stats()
+
+		if (i == 1):
+			# Kick things off by generating the first generation
+			# (one-operator sequences for each instruction)
+			# Passing the identity will cause iset to be used as prefixes
+			resume_generation(1, manifest)
+			gen_basic_approx_generation([settings.identity])
+		else:
+			# Generate a new generation using the previous one as prefixes
+			# we pass in the generation num of the one that just passed
+			gen_generation_from_files(i - 1, manifest, nr_processes)
+
+		manifest[str(i)]["files"] = get_file_count()
+		manifest[str(i)]["complete"] = True
+		save_manifest(manifest)
+		print_generation_stats(i)
 	
 	print_global_stats()
 
 ##############################################################################
 # Externally visible function, does top-level timing, etc.
-def generate_approxes(l0, settings):
+def generate_approxes(l0, settings, nr_processes=None):
 
 	set_filename_suffix("iset")
 	settings.print_iset()
@@ -145,7 +238,7 @@ def generate_approxes(l0, settings):
 	begin_time = time.time()
 	
 	# Do it!
-	basic_approxes(l0, settings)
+	basic_approxes(l0, settings, nr_processes)
 	
 	gen_time = time.time() - begin_time
 	print("Generation time: " + str(gen_time))
@@ -2,6 +2,8 @@ from skc.basic_approx.file import *
 from skc.decompose import *
 from skc.operator import *
 from skc.kdtree import *
+from skc.array_kdtree import *
+from skc.basic_approx.table import *
 
 
 def components_to_kdpoint(components, basis, angle):
@@ -16,19 +18,20 @@ def unitary_to_kdpoint(matrix_U):
     return components_to_kdpoint(components, basis, K)
 
 
+# The kd-points under which a unitary is found in the tree, for the candidates search.
+# The basic approximations have the absolute values of the components and the angle K
+# as kd-points (see generate). The unitaries with axis n and angle K and with axis -n
+# and angle 2pi - K are equal up to a phase, so both angles are searched.
+def components_to_search_kdpoints(components, basis, angle):
+    point = [numpy.abs(component) for component in basis.sort_canonical_order(components)]
+    return [point + [angle], point + [TWO_PI - angle]]
+
+
 # Load the sequences from files beginning with filename_prefix and ending with
 # filename_suffix with the numbers 1 to filename_upper (inclusive) in between.
 # Constructs a kdtree from all the loaded sequences and returns it for searching. 
 def build_kdtree(filename_prefix, filecount_upper, filename_suffix):
-    filenames = []
-    for i in range(1, filecount_upper + 1):
-        filenames.append(filename_prefix + str(i) + filename_suffix)
-
-    # This is the data that we load from a file
-    sequences = []
-    for filename in filenames:
-        new_sequences = read_from_file(filename)
-        sequences.extend(new_sequences)
+    sequences = load_sequences(filename_prefix, filecount_upper, filename_suffix)
 
     data = []
     # Process this to produce the format the kdtree expects, namely a list of components in each dimension
@@ -45,6 +48,34 @@ def build_kdtree(filename_prefix, filecount_upper, filename_suffix):
     return tree
 
 
+# Same as build_kdtree, but the sequences are stored in an ArrayKDTree
+def build_array_kdtree(filename_prefix, filecount_upper, filename_suffix):
+    sequences = load_sequences(filename_prefix, filecount_upper, filename_suffix)
+    return ArrayKDTree.construct_from_data(sequences)
+
+
+# Same as build_array_kdtree, but the sequences are written to a table directory first,
+# and the tree is built from the memory mapped table
+def build_table_kdtree(filename_prefix, filecount_upper, filename_suffix, table_dirname):
+    sequences = load_sequences(filename_prefix, filecount_upper, filename_suffix)
+    write_sequence_table(sequences, table_dirname)
+    return ArrayKDTree.construct_from_table(load_sequence_table(table_dirname))
+
+
+def load_sequences(filename_prefix, filecount_upper, filename_suffix):
+    filenames = []
+    for i in range(1, filecount_upper + 1):
+        filenames.append(filename_prefix + str(i) + filename_suffix)
+
+    # This is the data that we load from a file
+    sequences = []
+    for filename in filenames:
+        new_sequences = read_from_file(filename)
+        sequences.extend(new_sequences)
+
+    return sequences
+
+
 def process_kdtree(base_dir, filecount_upper):
     # Start the generate timer
     begin_time = time.time()
@@ -4,6 +4,8 @@ from skc.basic_approx.file import *
 from skc.basic_approx.process import *
 from skc.operator import *
 
+import os
+import pickle
 import time
 
 def load_kdtree(base_dir, filename_suffix):
@@ -11,7 +13,54 @@ def load_kdtree(base_dir, filename_suffix):
 	tree = read_from_file(filename)
 	return tree
 
-def search_kdtree(tree, search_U, basis):
+def load_array_kdtree(base_dir, filename_suffix):
+	filename = base_dir+"/akdt-"+filename_suffix+".pickle"
+	tree = read_from_file(filename)
+	return tree
+
+# Load the tree written by process_kdtree, if it exists. Otherwise build the tree
+# from the sequence files and write it, such that the next process only loads it.
+# tree_index is "kdtree" for KDTree, "array" for ArrayKDTree
+# or "table" for an ArrayKDTree of the sequence table in base_dir/table-<filecount_upper>
+def load_or_build_kdtree(base_dir, filecount_upper, tree_index="kdtree"):
+	filename_suffix = str(filecount_upper)
+	if tree_index == "table":
+		# the table is not pickled, its columns are memory mapped
+		table_dirname = base_dir+"/table-"+filename_suffix
+		if os.path.isdir(table_dirname):
+			return ArrayKDTree.construct_from_table(load_sequence_table(table_dirname))
+		return build_table_kdtree(base_dir + "/gen-g", filecount_upper, "-1.pickle", table_dirname)
+
+	if tree_index == "array":
+		prefix = "akdt"
+		load_function = load_array_kdtree
+		build_function = build_array_kdtree
+	else:
+		prefix = "kdt"
+		load_function = load_kdtree
+		build_function = build_kdtree
+
+	filename = base_dir+"/"+prefix+"-"+filename_suffix+".pickle"
+	if os.path.exists(filename):
+		try:
+			return load_function(base_dir, filename_suffix)
+		except (EOFError, pickle.UnpicklingError) as e:
+			# e.g. the file of an older version, which was written in place and interrupted
+			print("ERROR! Could not read the tree, it is built again: " + str(e))
+
+	tree = build_function(base_dir + "/gen-g", filecount_upper, "-1.pickle")
+
+	try:
+		dump_to_filename(tree, filename)
+	except (IOError, RecursionError) as e:
+		# the tree is still usable, only the next process will build it again
+		print("Could not write the tree: " + str(e))
+
+	return tree
+
+# candidates is the number of the nearest kd-points which are ranked by
+# Fowler distance, see KDTree.query. None searches with the default of the tree.
+def search_kdtree(tree, search_U, basis, candidates=None):
 	
 	begin_time = time.time()
 	
@@ -23,10 +72,12 @@ def search_kdtree(tree, search_U, basis):
 		K *= -1
 	search_op = Operator(name="Search", matrix=search_U)
 	search_op.dimensions = components_to_kdpoint(components, basis, K)
+	if candidates is not None:
+		search_op.search_points = components_to_search_kdpoints(components, basis, K)
 	# comment paler
 	# print("search.dimensions= " + str(search_op.dimensions))
 	
-	nearest = tree.query(search_op, t=1) # find nearest 4 points
+	nearest = tree.query(search_op, t=1, k=candidates)
 	
 	end_time = time.time()
 	# comment paler
@@ -0,0 +1,94 @@
+# Columnar storage of the basic approximations
+#
+# The generated sequences are pickled as lists of Operator objects, which
+# takes minutes to unpickle for large trees. A sequence table stores the same
+# sequences as columns in a directory of .npy files:
+#
+#   points.npy        (N, k) float   the points of the search index
+#   matrices.npy      (N, d, d) complex
+#   gate_offsets.npy  (N + 1,) int64 the gates of sequence i are
+#   gate_codes.npy    (M,) uint16    gate_codes[gate_offsets[i]:gate_offsets[i + 1]]
+#   gate_names.json   the gate name of each code
+#
+# The arrays are memory mapped when the table is loaded, such that only the
+# rows which are used are read from the disk. The Operator of a sequence is
+# built when it is asked for.
+#
+# For single qubit operators the points are the su2_points of
+# skc.array_kdtree, otherwise the kd-points of the operators.
+
+import json
+import os
+
+import numpy
+
+from skc.operator import *
+from skc.array_kdtree import su2_points
+
+__all__ = ["SequenceTable", "write_sequence_table", "load_sequence_table"]
+
+TABLE_COLUMNS = ["points", "matrices", "gate_offsets", "gate_codes"]
+
+class SequenceTable():
+	def __init__(self, points, matrices, gate_offsets, gate_codes, gate_names):
+		self.points = points
+		self.matrices = matrices
+		self.gate_offsets = gate_offsets
+		self.gate_codes = gate_codes
+		self.gate_names = gate_names
+
+	def __len__(self):
+		return len(self.matrices)
+
+	def ancestors(self, i):
+		codes = self.gate_codes[self.gate_offsets[i]:self.gate_offsets[i + 1]]
+		return [self.gate_names[code] for code in codes]
+
+	def operator(self, i):
+		return Operator("", matrixify(self.matrices[i]), self.ancestors(i))
+
+##############################################################################
+# Writes the operators to a new table directory
+# The kd-points are taken from the dimensions of the operators if they are not SU(2)
+def write_sequence_table(operators, dirname):
+	matrices = numpy.array([numpy.asarray(op.matrix) for op in operators], dtype=complex)
+	if (len(operators) > 0) and (matrices.shape[1] == 2):
+		points = su2_points(matrices)
+	else:
+		points = numpy.array([op.dimensions for op in operators], dtype=float)
+
+	gate_names = []
+	gate_codes_of_names = {}
+	gate_offsets = numpy.zeros(len(operators) + 1, dtype=numpy.int64)
+	gate_codes = []
+	for (i, op) in enumerate(operators):
+		for name in op.ancestors:
+			if name not in gate_codes_of_names:
+				gate_codes_of_names[name] = len(gate_names)
+				gate_names.append(name)
+			gate_codes.append(gate_codes_of_names[name])
+		gate_offsets[i + 1] = len(gate_codes)
+	gate_codes = numpy.array(gate_codes, dtype=numpy.uint16)
+
+	# The directory appears only when the table is complete,
+	# such that a reader never finds half a table
+	temporary_dirname = dirname + ".tmp"
+	os.makedirs(temporary_dirname, exist_ok=True)
+	columns = {"points": points, "matrices": matrices,
+			   "gate_offsets": gate_offsets, "gate_codes": gate_codes}
+	for name in TABLE_COLUMNS:
+		numpy.save(os.path.join(temporary_dirname, name + ".npy"), columns[name])
+	with open(os.path.join(temporary_dirname, "gate_names.json"), 'w') as f:
+		json.dump(gate_names, f)
+	os.replace(temporary_dirname, dirname)
+
+##############################################################################
+def load_sequence_table(dirname):
+	columns = {}
+	for name in TABLE_COLUMNS:
+		columns[name] = numpy.load(os.path.join(dirname, name + ".npy"), mmap_mode='r')
+	with open(os.path.join(dirname, "gate_names.json"), 'r') as f:
+		gate_names = json.load(f)
+
+	return SequenceTable(columns["points"], columns["matrices"],
+						 columns["gate_offsets"], columns["gate_codes"], gate_names)
@@ -1,6 +1,7 @@
 # Solovay-Kitaev compiler using Dawson's group factor
 
 from skc.operator import *
+from skc.quaternion import *
 from skc.utils import *
 from skc.basic_approx.search import *
 
@@ -11,17 +12,55 @@ the_basis = None
 the_axis = None
 the_factor_method = None
 the_tree = None
+# the (subdir, filecount_upper) of the tree
+the_tree_files = None
+# "kdtree" for the Python KDTree, "array" for the ArrayKDTree,
+# "table" for the ArrayKDTree of the memory mapped sequence table
+the_tree_index = "kdtree"
+# how many of the nearest kd-points are ranked by Fowler distance in a search,
+# None for the default search of the index
+the_candidates = None
 
 
 # Build the search tree. Kablooey!
+# The tree is loaded only once per process, when it is searched for the first time
 def sk_build_tree(subdir, filecount_upper):
+    global the_tree, the_tree_files
+    if the_tree_files != (subdir, filecount_upper):
+        the_tree_files = (subdir, filecount_upper)
+        the_tree = None
+
+
+def sk_get_tree():
     global the_tree
-    the_tree = build_kdtree("pickles/" + subdir + "/gen-g", filecount_upper, "-1.pickle")
+    if the_tree is None:
+        subdir, filecount_upper = the_tree_files
+        the_tree = load_or_build_kdtree("pickles/" + subdir, filecount_upper, the_tree_index)
+    return the_tree
 
 
 def sk_search_tree(op_U):
-    op = search_kdtree(the_tree, op_U.matrix, the_basis)
-    return op
+    # the search decomposes the matrix with the numpy.matrix code of skc.decompose
+    op = search_kdtree(sk_get_tree(), matrixify(op_U.matrix), the_basis, the_candidates)
+    # the basic approximations stored as quaternions have an arbitrary sign
+    return align_quaternion_operator(op, op_U.matrix).as_ndarray()
+
+
+##############################################################################
+# Which index is used to search the basic approximations
+def sk_set_tree_index(tree_index):
+    global the_tree, the_tree_index
+    if tree_index != the_tree_index:
+        the_tree_index = tree_index
+        # load the other index on the next search
+        the_tree = None
+
+
+##############################################################################
+# The number of candidates of a search, see search_kdtree
+def sk_set_candidates(candidates):
+    global the_candidates
+    the_candidates = candidates
 
 
 ##############################################################################
@@ -47,7 +86,11 @@ def sk_set_factor_method(factor_method):
 
 
 ##############################################################################
+# The operators of the recursion are backed by 2x2 numpy.ndarray matrices, which multiply
+# faster than numpy.matrix. Only the group factor method works on numpy.matrix.
 def solovay_kitaev(U, n, id="U", ancestry=""):
+    U = U.as_ndarray()
+
     # print("*******************************************************************")
     # print(str(id) + "_" + str(n))
     # print(ancestry)
@@ -64,11 +107,11 @@ def solovay_kitaev(U, n, id="U", ancestry=""):
         # print("U_" + str(n - 1) + ": " + str(U_n1))
         U_n1_dagger = U_n1.dagger()
         U_U_n1_dagger = U.multiply(U_n1_dagger).matrix
-        V_matrix, W_matrix = the_factor_method(U_U_n1_dagger, the_basis, the_axis)
+        V_matrix, W_matrix = the_factor_method(matrixify(U_U_n1_dagger), the_basis, the_axis)
         # print("V: " + str(V_matrix))
         # print("W: " + str(W_matrix))
-        V = Operator(name="V", matrix=V_matrix)
-        W = Operator(name="W", matrix=W_matrix)
+        V = Operator(name="V", matrix=numpy.asarray(V_matrix))
+        W = Operator(name="W", matrix=numpy.asarray(W_matrix))
         V_n1 = solovay_kitaev(V, n - 1, 'V', ancestry + id)  # V_{n-1}
         # print("V_" + str(n - 1) + ": " + str(V_n1))
         V_n1_dagger = V_n1.dagger()
@@ -0,0 +1,175 @@
+# Batched Solovay-Kitaev compiler for SU(2) using Dawson's group factor
+#
+# solovay_kitaev_batch approximates many unitaries in one call. The recursion
+# is the one of solovay_kitaev from skc.dawson, but every step is applied to a
+# stack of matrices with the shape (N, 2, 2): the basic approximations of all
+# the unitaries of a level are searched together, and the group commutators
+# are factored with closed formulas instead of diagonalising each matrix.
+#
+# A unitary is written as e^{i phase} * exp(-i angle/2 n.sigma), with the
+# rotation angle in [0, pi]. The serial factoring takes the angle from the
+# principal matrix logarithm, which can be the equivalent rotation by
+# 2pi - angle around -n, so the two do not always return the same sequences.
+
+import numpy
+
+import skc.dawson as dawson
+from skc.ancestors import concatenate_ancestors, dagger_ancestors
+from skc.basic_approx.search import search_kdtree
+from skc.utils import TOLERANCE, TOLERANCE10
+
+I2_ARRAY = numpy.eye(2, dtype=complex)
+
+# Pauli X, Y, Z
+PAULI = numpy.array([[[0, 1], [1, 0]],
+					 [[0, -1j], [1j, 0]],
+					 [[1, 0], [0, -1]]], dtype=complex)
+
+X_VECTOR = numpy.array([1.0, 0.0, 0.0])
+
+##############################################################################
+def dagger_batch(matrices):
+	return numpy.conj(numpy.swapaxes(matrices, -1, -2))
+
+##############################################################################
+# exp(-i angle/2 n.sigma) = cos(angle/2) I - i sin(angle/2) n.sigma
+def axis_angle_to_su2(axes, angles):
+	half = angles / 2.0
+	sigma = numpy.einsum('nk,kij->nij', axes, PAULI)
+	return numpy.cos(half)[:, None, None] * I2_ARRAY - 1j * numpy.sin(half)[:, None, None] * sigma
+
+##############################################################################
+# The rotation axes and angles of the unitaries, ignoring the global phase
+def su2_to_axis_angle(matrices):
+	det = matrices[:, 0, 0] * matrices[:, 1, 1] - matrices[:, 0, 1] * matrices[:, 1, 0]
+	m = matrices / numpy.sqrt(det)[:, None, None]
+
+	# m = w I - i (x X + y Y + z Z)
+	w = ((m[:, 0, 0] + m[:, 1, 1]) / 2).real
+	vectors = numpy.stack((-((m[:, 0, 1] + m[:, 1, 0]) / 2).imag,
+						   ((m[:, 1, 0] - m[:, 0, 1]) / 2).real,
+						   ((m[:, 1, 1] - m[:, 0, 0]) / 2).imag), axis=1)
+
+	# -m is the same rotation, take the one with the smaller angle
+	sign = numpy.where(w < 0, -1.0, 1.0)
+	w = w * sign
+	vectors = vectors * sign[:, None]
+
+	sin_half = numpy.linalg.norm(vectors, axis=1)
+	angles = 2 * numpy.arctan2(sin_half, w)
+
+	# the axis of the identity is not defined, use X
+	axes = numpy.tile(X_VECTOR, (len(matrices), 1))
+	rotating = sin_half > TOLERANCE
+	axes[rotating] = vectors[rotating] / sin_half[rotating, None]
+
+	return (axes, angles)
+
+##############################################################################
+# The rotations which take the axes_b to the axes_a. See find_similarity_matrix
+def similarity_batch(axes_a, axes_b):
+	vectors_s = numpy.cross(axes_b, axes_a)
+	norms_s = numpy.linalg.norm(vectors_s, axis=1)
+	angles_s = numpy.arccos(numpy.clip(numpy.sum(axes_a * axes_b, axis=1), -1, 1))
+
+	result = numpy.tile(I2_ARRAY, (len(axes_a), 1, 1))
+	# The vectors are parallel or anti parallel: identity, like find_similarity_matrix
+	rotating = numpy.abs(norms_s) >= TOLERANCE
+	result[rotating] = axis_angle_to_su2(vectors_s[rotating] / norms_s[rotating, None],
+										 angles_s[rotating])
+	return result
+
+##############################################################################
+# Vectorised dawson_group_factor with the x axis
+def dawson_group_factor_batch(matrices):
+	n = len(matrices)
+	result_V = numpy.tile(I2_ARRAY, (n, 1, 1))
+	result_W = numpy.tile(I2_ARRAY, (n, 1, 1))
+
+	# Too close to identity, just return a pair of identities
+	traces = numpy.abs(matrices[:, 0, 0] + matrices[:, 1, 1])
+	dist = numpy.sqrt(numpy.abs((2 - traces) / 2))
+	(axes_u, angles_u) = su2_to_axis_angle(matrices)
+
+	# The balanced group commutator of the same rotation about the x axis
+	# See dawson_x_group_factor
+	st = numpy.power(0.5 - 0.5 * numpy.cos(angles_u / 2), 0.25)
+	ct = numpy.sqrt(1 - st ** 2)
+	theta = 2 * numpy.arcsin(st)
+	alpha = numpy.arctan(st)
+
+	factoring = (dist >= TOLERANCE10) & (numpy.abs(theta) >= TOLERANCE)
+	if not numpy.any(factoring):
+		return (result_V, result_W)
+
+	st = st[factoring]
+	ct = ct[factoring]
+	theta = theta[factoring]
+	alpha = alpha[factoring]
+
+	vectors_a = numpy.stack((st * numpy.cos(alpha), st * numpy.sin(alpha), ct), axis=1)
+	vectors_b = numpy.stack((st * numpy.cos(alpha), st * numpy.sin(alpha), -ct), axis=1)
+
+	matrices_B = axis_angle_to_su2(vectors_b, theta)
+	# Find similarity between A and B^\dagger, the axis of B^\dagger is -b
+	matrices_C = similarity_batch(vectors_a, -vectors_b)
+
+	# the rotation from the x axis to the axis of U
+	x_axes = numpy.tile(X_VECTOR, (len(theta), 1))
+	matrices_S = similarity_batch(axes_u[factoring], x_axes)
+	matrices_S_dag = dagger_batch(matrices_S)
+
+	result_V[factoring] = matrices_S @ matrices_B @ matrices_S_dag
+	result_W[factoring] = matrices_S @ matrices_C @ matrices_S_dag
+
+	return (result_V, result_W)
+
+##############################################################################
+# The basic approximations of a stack of unitaries
+def search_tree_batch(matrices):
+	tree = dawson.sk_get_tree()
+
+	if hasattr(tree, "query_many"):
+		indices = tree.query_many(matrices, dawson.the_candidates)
+		return (tree.matrices[indices], [tree.ancestors(i) for i in indices])
+
+	# the Python KDTree is searched one unitary at a time
+	ops = [search_kdtree(tree, numpy.matrix(matrix), dawson.the_basis, dawson.the_candidates)
+		   for matrix in matrices]
+	return (numpy.array([numpy.asarray(op.matrix) for op in ops], dtype=complex),
+			[op.ancestors for op in ops])
+
+##############################################################################
+# Approximate each of the unitaries with the shape (N, 2, 2)
+# Returns the approximating matrices (N, 2, 2) and the list of the N sequences of ancestors,
+# see skc.ancestors
+def solovay_kitaev_batch(matrices, n):
+	matrices = numpy.asarray(matrices, dtype=complex)
+	count = len(matrices)
+
+	if (count == 0):
+		return (numpy.zeros((0, 2, 2), dtype=complex), [])
+
+	if (n == 0):
+		return search_tree_batch(matrices)
+
+	(U_n1, ancestors_U) = solovay_kitaev_batch(matrices, n - 1)
+
+	(V_matrices, W_matrices) = dawson_group_factor_batch(matrices @ dagger_batch(U_n1))
+
+	# the V and W of all the unitaries are approximated together
+	(VW_n1, ancestors_VW) = solovay_kitaev_batch(numpy.concatenate((V_matrices, W_matrices)), n - 1)
+	V_n1 = VW_n1[:count]
+	W_n1 = VW_n1[count:]
+
+	U_n = V_n1 @ W_n1 @ dagger_batch(V_n1) @ dagger_batch(W_n1) @ U_n1
+
+	ancestors = []
+	for i in range(count):
+		ancestors_V = ancestors_VW[i]
+		ancestors_W = ancestors_VW[count + i]
+		ancestors.append(concatenate_ancestors(ancestors_V, ancestors_W,
+											   dagger_ancestors(ancestors_V), dagger_ancestors(ancestors_W),
+											   ancestors_U[i]))
+
+	return (U_n, ancestors)
@@ -6,6 +6,7 @@
 Features:
 
 - nearest neighbours search
+- k nearest candidates search, ranked again by Fowler distance
 
 Matej Drame [matej.drame@gmail.com]
 """
@@ -14,6 +15,11 @@ __version__ = "1r11.1.2010"
 __all__ = ["KDTree"]
 
 from skc.utils import *
+from skc.quaternion import *
+
+import heapq
+import math
+import numpy
 
 EPS_0 = 1.0 / 32
 
@@ -53,6 +59,16 @@ class KDTreeNeighbours():
 		self.t = t # neighbours wanted
 		self.largest_distance = 0 # squared
 		self.current_best = []
+		# computed when the first quaternion operator is compared
+		self.query_quaternion = None
+
+	def distance(self, op):
+		# quaternion operators are compared without building their matrices
+		if isinstance(op, QuaternionOperator):
+			if self.query_quaternion is None:
+				self.query_quaternion = quaternion_of(self.query_op)
+			return quaternion_fowler_distance(op.quaternion, self.query_quaternion)
+		return fowler_distance(op.matrix, self.query_op.matrix)
 
 	def calculate_largest(self):
 		if self.t >= len(self.current_best):
@@ -61,7 +77,7 @@ class KDTreeNeighbours():
 			self.largest_distance = self.current_best[self.t-1][1]
 
 	def add(self, op):
-		sd = fowler_distance(op.matrix, self.query_op.matrix)
+		sd = self.distance(op)
 		# run through current_best, try to find appropriate place
 		for i, e in enumerate(self.current_best):
 			if i == self.t:
@@ -76,6 +92,33 @@ class KDTreeNeighbours():
 	
 	def get_best(self):
 		return [element[0] for element in self.current_best[:self.t]]
+
+class KDTreeCandidates():
+	""" Internal structure used in the k nearest candidates search.
+	
+		The distances are squared euclidean distances between kd-points.
+	"""
+	def __init__(self, k):
+		self.k = k # candidates wanted
+		self.largest_distance = float("inf") # squared, until k candidates are found
+		# max-heap of (-distance, -order, op), the candidate found first wins a tie
+		self.heap = []
+		self.order = 0
+
+	def add(self, op, sd):
+		self.order += 1
+		if len(self.heap) < self.k:
+			heapq.heappush(self.heap, (-sd, -self.order, op))
+		elif sd < self.largest_distance:
+			heapq.heapreplace(self.heap, (-sd, -self.order, op))
+		else:
+			return
+		if len(self.heap) == self.k:
+			self.largest_distance = -self.heap[0][0]
+
+	def get_candidates(self):
+		# the nearest first
+		return [element[2] for element in sorted(self.heap, reverse=True)]
 		
 class KDTree():
 	""" KDTree implementation.
@@ -89,61 +132,174 @@ class KDTree():
 			
 			tree = KDTree.construct_from_data(data)
 			nearest = tree.query(point, t=4) # find nearest 4 points
+			
+			# the 4 closest by Fowler distance of the 32 nearest kd-points
+			nearest = tree.query(point, t=4, k=32)
+		
+		The counters of the last query are in tree.statistics.
 	"""
 	
 	def __init__(self, data):
-		def build_kdtree(op_list, depth):
-			# code based on wikipedia article: http://en.wikipedia.org/wiki/Kd-tree
-			if not op_list:
-				return None
-
-			# select axis based on depth so that axis cycles through all valid values
-			axis = depth % len(op_list[0].dimensions) # assumes all points have the same dimension
-			#print "axis= " + str(axis)
-
-			# sort point list and choose median as pivot point,
-			# TODO: better selection method, linear-time selection, distribution
-			op_list.sort(key=lambda point: point.dimensions[axis])
-			median = len(op_list)//2 # choose median
-			op_this = op_list[median]
-			# create node and recursively construct subtrees
-			#print "median= " + str(median)
-			#print "point[median].dims= " + str(op_list[median].dimensions)
-			# Eliminate children that are closer than eps_0
-			left_children = op_list[0:median] #eliminate_close_children(op_list[0:median], op_this.matrix)
-			right_children = op_list[median+1:] #eliminate_close_children(op_list[median+1:], op_this.matrix)
-			node = KDTreeNode(op=op_this,
-							  left=build_kdtree(left_children, depth+1),
-							  right=build_kdtree(right_children, depth+1)
-							  )
-			node.axis = axis
-			node.dim_val = op_this.dimensions[axis]
-			return node
-		
-		self.root_node = build_kdtree(data, depth=0)
+		self.root_node = self.build_kdtree(list(data))
 		# Garbage collect the dimensions, since we don't need them anymore
 		# although we will if we want to combine trees later
 		for op in data:
 			del op.dimensions
-	
+
+	def build_kdtree(self, op_list):
+		# code based on wikipedia article: http://en.wikipedia.org/wiki/Kd-tree
+		#
+		# The tree is built one level at a time, without recursion and without
+		# copying sub-lists. The ops of each subtree are a range of the array perm
+		# of indices of op_list, and the median of each range is its node.
+		#
+		# The recursive version sorted the sub-list of each node by the axis of the
+		# node with a stable sort, so ties were ordered by the axes of the parent
+		# nodes and finally by the position in op_list. This order is computed once
+		# for all the ops for each chain of axes. The ranges of a level are put in
+		# this order with a stable sort of their range numbers, so the tree is the
+		# same as before. Each level costs O(n log n) in numpy instead of in Python
+		# calls of the sort keys, and the build is still O(n log^2 n).
+		if not op_list:
+			self.points = None
+			return None
+
+		points = numpy.array([op.dimensions for op in op_list], dtype=float)
+		# the kd-points are kept for the candidates search, the node of op_list[i] has index i
+		self.points = points
+		nr_ops = len(op_list)
+		nr_axes = points.shape[1] # assumes all points have the same dimension
+		positions = numpy.arange(nr_ops)
+		# the order of op_list by the axes of a level and the levels above
+		orders_by_axes = {(): positions}
+
+		def get_order(axes):
+			if axes not in orders_by_axes:
+				# the stable sort by the first axis keeps the ties in the order of the other axes
+				order_rest = get_order(axes[1:])
+				by_axis = numpy.argsort(points[order_rest, axes[0]], kind="stable")
+				orders_by_axes[axes] = order_rest[by_axis]
+			return orders_by_axes[axes]
+
+		def get_level_order(depth):
+			# the axes of this level and of the levels above, the most recent first
+			axes = []
+			for d in range(depth, -1, -1):
+				axis = d % nr_axes
+				if axis in axes:
+					break
+				axes.append(axis)
+			return get_order(tuple(axes))
+
+		# for each node, the index of its op and of its children (-1 for none)
+		node_ops = numpy.zeros(nr_ops, dtype=numpy.int64)
+		node_lefts = numpy.full(nr_ops, -1, dtype=numpy.int64)
+		node_rights = numpy.full(nr_ops, -1, dtype=numpy.int64)
+		node_axes = numpy.zeros(nr_ops, dtype=numpy.int64)
+
+		perm = positions.copy()
+		# the ranges [starts, ends) of perm of the nodes of the current level
+		starts = numpy.array([0])
+		ends = numpy.array([nr_ops])
+		nodes = numpy.array([0])
+		nr_nodes = 1
+		depth = 0
+		while len(nodes) > 0:
+			lengths = ends - starts
+			# the positions in perm of all the ranges, and the range of each position
+			range_ids = numpy.repeat(numpy.arange(len(nodes)), lengths)
+			range_offsets = numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+			range_positions = numpy.arange(len(range_ids)) - range_offsets + numpy.repeat(starts, lengths)
+
+			# select axis based on depth so that axis cycles through all valid values
+			# The ops of the level in the order of the axis are grouped by their range
+			# with a stable sort of the range numbers
+			op_ranges = numpy.full(nr_ops, -1, dtype=numpy.int64)
+			op_ranges[perm[range_positions]] = range_ids
+			level_order = get_level_order(depth)
+			level_order = level_order[op_ranges[level_order] >= 0]
+			grouping = numpy.argsort(op_ranges[level_order], kind="stable")
+			perm[range_positions] = level_order[grouping]
+
+			# choose median as pivot point
+			medians = starts + lengths//2
+			node_ops[nodes] = perm[medians]
+			node_axes[nodes] = depth % nr_axes
+
+			# the children are the ranges before and after the median
+			has_left = medians > starts
+			has_right = ends > medians + 1
+			nr_lefts = numpy.count_nonzero(has_left)
+			nr_rights = numpy.count_nonzero(has_right)
+			left_nodes = numpy.arange(nr_nodes, nr_nodes + nr_lefts)
+			right_nodes = numpy.arange(nr_nodes + nr_lefts, nr_nodes + nr_lefts + nr_rights)
+			nr_nodes += nr_lefts + nr_rights
+			node_lefts[nodes[has_left]] = left_nodes
+			node_rights[nodes[has_right]] = right_nodes
+
+			starts = numpy.concatenate((starts[has_left], medians[has_right] + 1))
+			ends = numpy.concatenate((medians[has_left], ends[has_right]))
+			nodes = numpy.concatenate((left_nodes, right_nodes))
+			depth += 1
+
+		# the children are created before their parents
+		node_ops = node_ops.tolist()
+		node_lefts = node_lefts.tolist()
+		node_rights = node_rights.tolist()
+		node_axes = node_axes.tolist()
+		# the last element is the missing child -1
+		tree_nodes = [None] * (nr_ops + 1)
+		for node in range(nr_ops - 1, -1, -1):
+			op_this = op_list[node_ops[node]]
+			tree_node = KDTreeNode(op=op_this,
+								   left=tree_nodes[node_lefts[node]],
+								   right=tree_nodes[node_rights[node]])
+			tree_node.axis = node_axes[node]
+			tree_node.dim_val = op_this.dimensions[tree_node.axis]
+			tree_node.index = node_ops[node]
+			tree_nodes[node] = tree_node
+
+		return tree_nodes[0]
+
 	@staticmethod
 	def construct_from_data(data):
 		tree = KDTree(data)
 		return tree
 
-	def query(self, query_op, t=1):
+	def get_point_lists(self):
+		# the kd-points as lists of floats, which are faster to read one by one
+		if getattr(self, "point_lists", None) is None:
+			self.point_lists = self.points.tolist()
+		return self.point_lists
+
+	def __getstate__(self):
+		# the point lists are not pickled, they are created again from the array
+		state = self.__dict__.copy()
+		state.pop("point_lists", None)
+		return state
+
+	def query(self, query_op, t=1, k=None):
+		# With k, the search has two stages: the k nearest kd-points are found
+		# first, and the t closest of them by Fowler distance are returned.
+		# Otherwise the nodes are compared by Fowler distance while the tree is searched.
+		if k is not None:
+			if getattr(self, "points", None) is not None:
+				return self.query_candidates(query_op, t, k)
+			# the trees pickled before the kd-points were kept
+			print("ERROR! The tree has no kd-points, it is searched without candidates")
+
 		statistics = {'nodes_visited': 0, 'far_search': 0, 'leafs_reached': 0}
 		
 		def nn_search(node, query_op, t, depth, best_neighbours):
 			if node == None:
 				return
 			
-			#statistics['nodes_visited'] += 1
+			statistics['nodes_visited'] += 1
 			
 			# if we have reached a leaf, let's add to current best neighbours,
 			# (if it's better than the worst one or if there is not enough neighbours)
 			if node.is_leaf():
-				#statistics['leafs_reached'] += 1
+				statistics['leafs_reached'] += 1
 				best_neighbours.add(node.op)
 				return
 			
@@ -176,7 +332,7 @@ class KDTree():
 			# check whether there could be any points on the other side of the
 			# splitting plane that are closer to the query point than the current best
 			if (node.dim_val - query_op.dimensions[axis])**2 < best_neighbours.largest_distance:
-				#statistics['far_search'] += 1
+				statistics['far_search'] += 1
 				nn_search(far_subtree, query_op, t, depth+1, best_neighbours)
 			
 			return
@@ -189,5 +345,70 @@ class KDTree():
 		else:
 			result = []
 		
-		#print statistics
+		self.statistics = statistics
 		return result
+
+	def query_candidates(self, query_op, t, k):
+		statistics = {'nodes_visited': 0, 'far_search': 0, 'leafs_reached': 0}
+		# the kd-points of the query, query_op.search_points are the kd-points which
+		# are equivalent to it (see search_kdtree), the candidates are the nearest to any of them
+		query_points = getattr(query_op, "search_points", [query_op.dimensions])
+		query_points = [[float(x) for x in query_point] for query_point in query_points]
+		nr_axes = len(query_points[0])
+		point_lists = self.get_point_lists()
+
+		def knn_search(node, depth, candidates):
+			if node == None:
+				return
+
+			statistics['nodes_visited'] += 1
+
+			point = point_lists[node.index]
+			sd = min([math.dist(point, query_point) for query_point in query_points])**2
+			candidates.add(node.op, sd)
+
+			if node.is_leaf():
+				statistics['leafs_reached'] += 1
+				return
+
+			# the same axis as in nn_search
+			axis = depth % nr_axes
+			# the subtree of the first query point is searched first
+			near_is_left = query_points[0][axis] < node.dim_val
+			if near_is_left:
+				near_subtree = node.left
+				far_subtree = node.right
+			else:
+				near_subtree = node.right
+				far_subtree = node.left
+
+			knn_search(near_subtree, depth+1, candidates)
+
+			# the kd-points on the other side of the splitting plane are at least this far
+			# from a query point, or the query point is on the other side
+			far_distance = min([(node.dim_val - query_point[axis])**2
+								if ((query_point[axis] < node.dim_val) == near_is_left) else 0
+								for query_point in query_points])
+			if far_distance < candidates.largest_distance:
+				statistics['far_search'] += 1
+				knn_search(far_subtree, depth+1, candidates)
+
+		candidates = KDTreeCandidates(max(k, t))
+		knn_search(self.root_node, 0, candidates)
+		ops = candidates.get_candidates()
+		statistics['candidates'] = len(ops)
+		self.statistics = statistics
+
+		if not ops:
+			return []
+
+		# the candidates are ranked by Fowler distance all at once
+		if all(isinstance(op, QuaternionOperator) for op in ops):
+			distances = quaternion_fowler_distances([op.quaternion for op in ops],
+													quaternion_of(query_op))
+		else:
+			matrices = numpy.array([numpy.asarray(op.matrix) for op in ops])
+			distances = fowler_distances(matrices, query_op.matrix)
+		best = numpy.argsort(distances, kind="stable")[:t]
+
+		return [ops[i] for i in best]
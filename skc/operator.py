@@ -6,6 +6,7 @@ import math;
 import scipy.linalg;
 
 from skc.utils import *
+from skc.ancestors import *
 
 class Operator:
 
@@ -26,17 +27,21 @@ class Operator:
 			hash *= ancestor.__hash__()
 		return hash
 			
+	# The same operator with its matrix as numpy.ndarray
+	def as_ndarray(self):
+		return Operator(self.name, numpy.asarray(self.matrix), self.ancestors)
+
 	def print_matrix(self):
 			print("  Matrix: " + str(self.matrix))
 			
 	def add_ancestors(self, other, new_name=""):
 		# Append new ancestors to the end of self
-		new_ancestors = self.ancestors + other.ancestors
+		new_ancestors = concatenate_ancestors(self.ancestors, other.ancestors)
 		new_op = Operator(new_name, None, new_ancestors)
 		return new_op
 		
 	def ancestors_as_string(self):
-		return list_as_string(self.ancestors)
+		return list_as_string(flatten_ancestors(self.ancestors))
 	
 	# Sets the matrix of this operator by its ancestors taken from a set
 	# iset - a dictionary of labels to operators for the instruction set
@@ -44,7 +49,7 @@ class Operator:
 	def matrix_from_ancestors(self, iset_dict, identity):
 		self.matrix = identity.matrix
 		for ancestor in self.ancestors:
-			self.matrix = self.matrix * iset_dict[ancestor].matrix
+			self.matrix = self.matrix @ iset_dict[ancestor].matrix
 		#print "MATRIX IS UNITARY"
 		assert_matrix_unitary(self.matrix)
 		msg = "Looks like someone forgot to simplify away this sequence, hmm?" \
@@ -57,19 +62,17 @@ class Operator:
 		#assert_matrices_approx_not_equal(self.matrix, identity.matrix, \
 		#	message=msg)
 
+	# The matrix products work for numpy.matrix and numpy.ndarray matrices
 	def multiply(self, other, new_name=""):
-		new_matrix = self.matrix * other.matrix
-		new_ancestors = self.ancestors + other.ancestors
+		new_matrix = self.matrix @ other.matrix
+		new_ancestors = concatenate_ancestors(self.ancestors, other.ancestors)
 		new_op = Operator(new_name, new_matrix, new_ancestors)
 		return new_op
 		
 	def dagger(self):
-		new_matrix = self.matrix.H
-		reversed_ancestors = list(self.ancestors)
-		reversed_ancestors.reverse()
-		new_ancestors = []
-		for ancestor in reversed_ancestors:
-			new_ancestors.append(ancestor+"d")
+		new_matrix = numpy.conjugate(numpy.transpose(self.matrix))
+		# the reversed ancestors with a "d" appended, computed when they are flattened
+		new_ancestors = dagger_ancestors(self.ancestors)
 		new_name = self.name + "d"
 		return Operator(new_name, new_matrix, new_ancestors)
 		
@@ -0,0 +1,174 @@
+# Single qubit operators stored as unit quaternions
+#
+# Divided by the square root of its determinant, a 2x2 unitary is in SU(2) and
+# has the form [[a, -conj(b)], [b, conj(a)]] with |a|^2 + |b|^2 = 1. The operator
+# is stored as the 4 floats q = (Re a, Im a, Re b, Im b) of its first column,
+# which are the same points as su2_points in skc.array_kdtree.
+#
+# The global phase is dropped, which does not change the Fowler distance:
+#   trace(A^dagger * B) = 2 <q_A, q_B>
+#   fowler_distance(A, B) = sqrt(1 - |<q_A, q_B>|)
+#
+# QuaternionOperator has the interface of Operator which is used by
+# solovay_kitaev, the kd-trees and basic_approx.generate. Its matrix is computed
+# only when it is asked for, such that products, daggers and distances do
+# not allocate matrices.
+
+import cmath
+import math
+import numpy
+
+from skc.utils import *
+from skc.ancestors import *
+from skc.operator import Operator
+
+__all__ = ["QuaternionOperator", "to_quaternion_operator", "quaternion_of",
+		   "matrix_to_quaternion", "quaternion_to_matrix", "quaternions_to_matrices",
+		   "quaternion_product", "quaternion_dagger", "quaternion_fowler_distance",
+		   "quaternion_fowler_distances", "align_quaternion_operator", "I2_QUATERNION"]
+
+I2_QUATERNION = (1.0, 0.0, 0.0, 0.0)
+
+##############################################################################
+def matrix_to_quaternion(matrix):
+	m = numpy.asarray(matrix, dtype=complex)
+	det = m[0, 0] * m[1, 1] - m[0, 1] * m[1, 0]
+	a = m[0, 0] / cmath.sqrt(det)
+	b = m[1, 0] / cmath.sqrt(det)
+	return (a.real, a.imag, b.real, b.imag)
+
+##############################################################################
+def quaternion_to_matrix(q):
+	a = complex(q[0], q[1])
+	b = complex(q[2], q[3])
+	return matrixify([[a, -b.conjugate()], [b, a.conjugate()]])
+
+##############################################################################
+# The matrices (N, 2, 2) of the quaternions (N, 4)
+def quaternions_to_matrices(quaternions):
+	q = numpy.asarray(quaternions, dtype=float)
+	a = q[:, 0] + 1j * q[:, 1]
+	b = q[:, 2] + 1j * q[:, 3]
+	return numpy.stack((numpy.stack((a, -b.conj()), axis=1),
+						numpy.stack((b, a.conj()), axis=1)), axis=1)
+
+##############################################################################
+# The quaternion of the product of the matrices of p and q
+# The first column of the product is (a c - conj(b) d, b c + conj(a) d)
+def quaternion_product(p, q):
+	return (p[0]*q[0] - p[1]*q[1] - p[2]*q[2] - p[3]*q[3],
+			p[0]*q[1] + p[1]*q[0] - p[2]*q[3] + p[3]*q[2],
+			p[0]*q[2] + p[1]*q[3] + p[2]*q[0] - p[3]*q[1],
+			p[0]*q[3] - p[1]*q[2] + p[2]*q[1] + p[3]*q[0])
+
+##############################################################################
+# The first column of the conjugate transpose is (conj(a), -b)
+def quaternion_dagger(q):
+	return (q[0], -q[1], -q[2], -q[3])
+
+##############################################################################
+def quaternion_fowler_distance(p, q):
+	dot = p[0]*q[0] + p[1]*q[1] + p[2]*q[2] + p[3]*q[3]
+	# Because the fraction can be negative due to floating point error, take the absolute value
+	return math.sqrt(abs(1 - abs(dot)))
+
+##############################################################################
+# The Fowler distances of the quaternions (n, 4) to the quaternion q at once
+def quaternion_fowler_distances(quaternions, q):
+	dots = numpy.asarray(quaternions) @ numpy.asarray(q, dtype=float)
+	return numpy.sqrt(numpy.abs(1 - numpy.abs(dots)))
+
+##############################################################################
+def quaternion_of(op):
+	if isinstance(op, QuaternionOperator):
+		return op.quaternion
+	return matrix_to_quaternion(op.matrix)
+
+##############################################################################
+def to_quaternion_operator(op):
+	new_op = QuaternionOperator(op.name, quaternion_of(op), op.ancestors)
+	if hasattr(op, "dimensions"):
+		new_op.dimensions = op.dimensions
+	return new_op
+
+##############################################################################
+# q and -q are the same operator. The Solovay-Kitaev recursion takes the matrix
+# logarithm of U * U_{n-1}^dagger, which is close to 2pi instead of close to zero
+# if the signs are opposite. Returns the operator with the sign of matrix_U
+def align_quaternion_operator(op, matrix_U):
+	if not isinstance(op, QuaternionOperator):
+		return op
+	q = matrix_to_quaternion(matrix_U)
+	p = op.quaternion
+	if p[0]*q[0] + p[1]*q[1] + p[2]*q[2] + p[3]*q[3] >= 0:
+		return op
+	return QuaternionOperator(op.name, (-p[0], -p[1], -p[2], -p[3]), op.ancestors)
+
+##############################################################################
+class QuaternionOperator:
+	# many basic approximations are kept in memory, do not give each a __dict__
+	__slots__ = ("name", "quaternion", "ancestors", "dimensions")
+
+	def __init__(self, name, quaternion, ancestors=[]):
+		self.name = name
+		self.quaternion = quaternion
+		if (len(ancestors) == 0):
+			ancestors = [name]
+		self.ancestors = ancestors
+
+	@property
+	def matrix(self):
+		return quaternion_to_matrix(self.quaternion)
+
+	# The operator with its matrix as numpy.ndarray, see Operator.as_ndarray
+	def as_ndarray(self):
+		return Operator(self.name, numpy.asarray(self.matrix), self.ancestors)
+
+	def __str__(self):
+		return "QuaternionOperator: " + str(self.name) + "\n" \
+			"  Ancestors: " + str(self.ancestors)
+
+	def __hash__(self):
+		hash = self.name.__hash__()
+		for ancestor in self.ancestors:
+			hash *= ancestor.__hash__()
+		return hash
+
+	def __eq__(self, other):
+		if other is None:
+			return False
+
+		return (self.name == other.name) and (self.ancestors == other.ancestors)
+
+	def print_matrix(self):
+		print("  Matrix: " + str(self.matrix))
+
+	def add_ancestors(self, other, new_name=""):
+		# Append new ancestors to the end of self
+		new_ancestors = concatenate_ancestors(self.ancestors, other.ancestors)
+		return QuaternionOperator(new_name, None, new_ancestors)
+
+	def ancestors_as_string(self):
+		return list_as_string(flatten_ancestors(self.ancestors))
+
+	# Sets the quaternion of this operator by its ancestors taken from a set
+	# Returns True if the operator is the identity up to a global phase
+	def matrix_from_ancestors(self, iset_dict, identity):
+		q = quaternion_of(identity)
+		for ancestor in self.ancestors:
+			q = quaternion_product(q, quaternion_of(iset_dict[ancestor]))
+		self.quaternion = q
+		dist = 1 - abs(q[0])
+		close_to_identity = approx_equals(dist, 0)
+		named_identity = (self.name == identity.name)
+		return close_to_identity and (not named_identity)
+
+	def multiply(self, other, new_name=""):
+		new_quaternion = quaternion_product(self.quaternion, quaternion_of(other))
+		new_ancestors = concatenate_ancestors(self.ancestors, other.ancestors)
+		return QuaternionOperator(new_name, new_quaternion, new_ancestors)
+
+	def dagger(self):
+		new_ancestors = dagger_ancestors(self.ancestors)
+		new_name = self.name + "d"
+		return QuaternionOperator(new_name, quaternion_dagger(self.quaternion), new_ancestors)
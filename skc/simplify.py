@@ -218,3 +218,129 @@ class GeneralRule(SimplifyRule):
 		#print "GeneralRule.__simplify__: " + str(arg_list) + " -> " + self.new_sym
 		# If we made it all the way through, congrats! We have an identity
 		return (True, self.new_sym)
+
+##############################################################################
+# A rewrite engine with the same normal forms as SimplifyEngine
+#
+# SimplifyEngine applies the rules to the end of the sequence, in passes
+# over a scratch list of at least max_arg_count elements, until a pass in
+# which no rule obtains. It moves the elements with pop and insert(0, ...)
+# and calls each rule with a new list of its arguments.
+#
+# Here the sequence is a stack and the scratch list is its top. The rules with
+# a fixed pattern (GeneralRule, DoubleIdentityRule) are compiled into a trie of
+# the reversed patterns, which is walked once from the top of the stack to find
+# all the patterns matching at the end. AdjointRule and IdentityRule compare the
+# two names on top. Rules of other types are called with their arguments.
+# A rule which obtains replaces the top of the stack, such that the work is
+# linear in the number of reductions.
+class CompiledSimplifyEngine:
+
+	# How each rule is checked
+	PATTERN = 0
+	ADJOINT = 1
+	IDENTITY = 2
+	OTHER = 3
+
+	#-------------------------------------------------------------------------
+	def __init__(self, rules):
+		self.rules = rules
+		self.max_arg_count = 0
+		for rule in self.rules:
+			if (rule.arg_count > self.max_arg_count):
+				self.max_arg_count = rule.arg_count
+
+		# nested dictionaries of gate names, the key None of a node holds the
+		# indices of the rules whose patterns end there
+		self.trie = {}
+		# (index, kind, arg_count, symbol) of each rule, in order
+		self.compiled_rules = []
+		for (index, rule) in enumerate(self.rules):
+			if isinstance(rule, GeneralRule):
+				self.add_pattern(index, rule.sequence)
+				self.compiled_rules.append((index, self.PATTERN, rule.arg_count, rule.new_sym))
+			elif isinstance(rule, DoubleIdentityRule):
+				self.add_pattern(index, [rule.symbol, rule.symbol])
+				self.compiled_rules.append((index, self.PATTERN, rule.arg_count, rule.id_sym))
+			elif isinstance(rule, AdjointRule):
+				self.compiled_rules.append((index, self.ADJOINT, rule.arg_count, rule.id_sym))
+			elif isinstance(rule, IdentityRule):
+				self.compiled_rules.append((index, self.IDENTITY, rule.arg_count, rule.id_sym))
+			else:
+				self.compiled_rules.append((index, self.OTHER, rule.arg_count, None))
+
+	#-------------------------------------------------------------------------
+	def add_pattern(self, index, sequence):
+		node = self.trie
+		for name in reversed(sequence):
+			node = node.setdefault(name, {})
+		node.setdefault(None, []).append(index)
+
+	#-------------------------------------------------------------------------
+	# The indices of the pattern rules which match the top of the stack,
+	# using at most scratch_length elements
+	def match_patterns(self, stack, scratch_length):
+		matches = ()
+		node = self.trie
+		for depth in range(1, scratch_length + 1):
+			node = node.get(stack[-depth])
+			if node is None:
+				break
+			if None in node:
+				matches = matches + tuple(node[None])
+		return matches
+
+	#-------------------------------------------------------------------------
+	# The main simplify method called from outside, see SimplifyEngine.simplify
+	def simplify(self, sequence):
+		# Make a defensive copy
+		stack = list(sequence)
+		simplify_length = len(stack)
+
+		# The scratch list of SimplifyEngine is the top of the stack
+		scratch_length = 0
+		global_obtains = True
+		while (global_obtains):
+			global_obtains = False
+
+			# Prefill the scratch space to max_arg_count
+			if (scratch_length < self.max_arg_count):
+				scratch_length = min(len(stack), self.max_arg_count)
+
+			matches = self.match_patterns(stack, scratch_length)
+			for (index, kind, arg_count, symbol) in self.compiled_rules:
+				if (scratch_length < arg_count):
+					continue
+
+				C = None
+				if (kind == self.PATTERN):
+					if index in matches:
+						C = symbol
+				elif (kind == self.ADJOINT):
+					A = stack[-2]
+					B = stack[-1]
+					if (B == A + "d") or (A == B + "d"):
+						C = symbol
+				elif (kind == self.IDENTITY):
+					if (stack[-2] == symbol):
+						C = stack[-1]
+					elif (stack[-1] == symbol):
+						C = stack[-2]
+				else:
+					(obtains, new_symbol) = self.rules[index].__simplify__(stack[-arg_count:])
+					if (obtains):
+						C = new_symbol
+
+				if (C is None):
+					continue
+
+				del stack[len(stack) - arg_count:]
+				stack.append(C)
+				scratch_length -= arg_count - 1
+				global_obtains = True
+				# the top of the stack changed
+				matches = self.match_patterns(stack, scratch_length)
+
+		simplify_length -= len(stack)
+
+		return (simplify_length, stack)
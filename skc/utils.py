@@ -1,5 +1,6 @@
 # Utilities for Solovay-Kitaev compiler
 
+import cmath
 import math
 import numpy
 import random
@@ -34,38 +35,67 @@ def normalize(array):
 def matrixify(array):
 	return numpy.matrix(array, dtype=numpy.complex)
 
+##############################################################################
+# The closed forms below avoid the eigenvalue solvers and numpy.matrix products.
+# They work for numpy.matrix and numpy.ndarray operands, and single qubit (2x2)
+# matrices have their own formulas.
+
 ##############################################################################
 def trace_norm(M):
-	trace = numpy.trace(M * M.H)
+	# trace(M * M^dagger) is the sum of |M_ij|^2
+	array_M = numpy.asarray(M)
+	trace = numpy.vdot(array_M, array_M).real
 	return math.sqrt(trace)
 	
 ##############################################################################
 def operator_norm(M):
+	if (M.shape == (2, 2)):
+		# eigenvalues of a 2x2 matrix from its trace and determinant
+		(m00, m01, m10, m11) = numpy.asarray(M).ravel().tolist()
+		half_trace = (m00 + m11) / 2
+		root = cmath.sqrt(half_trace * half_trace - (m00 * m11 - m01 * m10))
+		return max(abs(half_trace + root), abs(half_trace - root))
+
 	eig_vals = scipy.linalg.eigvals(M)
 	eig_vals = [numpy.abs(x) for x in eig_vals]
 	return numpy.max(eig_vals)
 	
 ##############################################################################
 def trace_distance(matrix_A, matrix_B):
-	matrix_diff = matrix_A - matrix_B
-	matrix_diff_dag = numpy.transpose(numpy.conjugate(matrix_diff))
-	product = matrix_diff * matrix_diff_dag
-	#print "prod= " + str(product)	
-	trace_vals = scipy.linalg.eigvals(product);
-	return scipy.linalg.norm(trace_vals)
+	# The product P = (A - B) * (A - B)^dagger is Hermitian, so the norm of
+	# its eigenvalues is its Frobenius norm
+	matrix_diff = numpy.asarray(matrix_A) - numpy.asarray(matrix_B)
+
+	if (matrix_diff.shape == (2, 2)):
+		(d00, d01, d10, d11) = matrix_diff.ravel().tolist()
+		p00 = abs(d00)**2 + abs(d01)**2
+		p11 = abs(d10)**2 + abs(d11)**2
+		p01 = d00 * d10.conjugate() + d01 * d11.conjugate()
+		return math.sqrt(p00**2 + p11**2 + 2 * abs(p01)**2)
+
+	product = numpy.dot(matrix_diff, numpy.conjugate(matrix_diff.T))
+	return numpy.linalg.norm(product)
 	
 ##############################################################################
 def fowler_distance(matrix_A, matrix_B):
 	d = matrix_A.shape[0]
 	assert(matrix_A.shape == matrix_B.shape)
-	matrix_adjoint = numpy.transpose(numpy.conjugate(matrix_A))
-	prod = matrix_adjoint * matrix_B
-	trace = numpy.trace(prod)
+	# trace(A^dagger * B) is the sum of the elementwise products conj(A) * B
+	# numpy.vdot flattens arrays, but not numpy.matrix objects
+	trace = numpy.vdot(numpy.asarray(matrix_A), numpy.asarray(matrix_B))
 	frac = (1.0*(d - numpy.abs(trace))) / d
 	# Because frac can be negative due to floating point error, take the
 	# absolute value before taking square root, since we expect real numbers
 	return math.sqrt(numpy.abs(frac))
 
+##############################################################################
+# The Fowler distances of a stack of matrices (n, d, d) to matrix_B at once
+def fowler_distances(matrices, matrix_B):
+	d = matrix_B.shape[0]
+	traces = numpy.einsum('nij,ij->n', numpy.conjugate(matrices), numpy.asarray(matrix_B))
+	# Because the fraction can be negative due to floating point error, take the absolute value
+	return numpy.sqrt(numpy.abs((d - numpy.abs(traces)) / d))
+
 ##############################################################################
 def list_as_string(list_A):
 	if (len(list_A) == 0):
@@ -0,0 +1,61 @@
+import random
+
+from skc.ancestors import *
+
+
+# the lists of ancestors of Operator, before they were shared
+def list_dagger(ancestors):
+    return [name + "d" for name in reversed(ancestors)]
+
+
+def random_sequences(rnd, depth):
+    # a sequence and its list, built with the same random products and daggers
+    if depth == 0 or rnd.random() < 0.2:
+        names = [rnd.choice(["H", "T", "Td"]) for _ in range(rnd.randrange(0, 4))]
+        return names, list(names)
+
+    if rnd.random() < 0.3:
+        sequence, names = random_sequences(rnd, depth - 1)
+        return dagger_ancestors(sequence), list_dagger(names)
+
+    parts = [random_sequences(rnd, depth - 1) for _ in range(rnd.randrange(1, 4))]
+    names = []
+    for (_, part_names) in parts:
+        names += part_names
+    return concatenate_ancestors(*[sequence for (sequence, _) in parts]), names
+
+
+def test_flatten_matches_the_lists():
+    rnd = random.Random(0)
+    for _ in range(300):
+        sequence, names = random_sequences(rnd, 6)
+
+        assert flatten_ancestors(sequence) == names
+        assert len(sequence) == len(names)
+        assert list(sequence) == names
+        if isinstance(sequence, AncestorSequence):
+            assert sequence == names
+            assert str(sequence) == str(names)
+
+
+def test_sequences_extend_like_lists():
+    sequence = concatenate_ancestors(["H", "T"], dagger_ancestors(["T", "H"]))
+    assert sequence + ["S"] == ["H", "T", "Hd", "Td", "S"]
+    assert ["S"] + sequence == ["S", "H", "T", "Hd", "Td"]
+    assert dagger_ancestors(dagger_ancestors(["T"])) == ["Tdd"]
+    assert len(concatenate_ancestors([], [])) == 0
+
+
+def test_long_sequences_do_not_recurse():
+    # as deep as the products of a long SK decomposition and more
+    sequence = ["H"]
+    names = ["H"]
+    for i in range(5000):
+        if i % 2 == 0:
+            sequence = concatenate_ancestors(sequence, ["T"])
+            names = names + ["T"]
+        else:
+            sequence = dagger_ancestors(sequence)
+            names = list_dagger(names)
+
+    assert flatten_ancestors(sequence) == names
@@ -0,0 +1,58 @@
+import numpy
+import pytest
+
+from skc.array_kdtree import ArrayKDTree
+from skc.basic_approx.process import load_sequences
+from skc.basic_approx.table import write_sequence_table, load_sequence_table
+from skc.operator import Operator
+from skc.utils import matrixify, fowler_distances
+
+from test_generate import generate_tree_files
+from test_sk_batch import random_unitaries
+
+L0 = 6
+
+
+@pytest.fixture(scope="module")
+def sequences(tmp_path_factory):
+    dirname = str(tmp_path_factory.mktemp("su2"))
+    settings = generate_tree_files(dirname, L0)
+    return dirname, settings.basis
+
+
+def load_trees(dirname, tmp_path):
+    sequences = load_sequences(dirname + "/gen-g", L0, "-1.pickle")
+    write_sequence_table(load_sequences(dirname + "/gen-g", L0, "-1.pickle"), str(tmp_path / "table"))
+    return (sequences,
+            ArrayKDTree.construct_from_data(sequences),
+            ArrayKDTree.construct_from_table(load_sequence_table(str(tmp_path / "table"))))
+
+
+def test_query_finds_the_closest_operator(sequences, tmp_path):
+    dirname, basis = sequences
+    (ops, tree, table_tree) = load_trees(dirname, tmp_path)
+    matrices = numpy.array([numpy.asarray(op.matrix) for op in ops])
+
+    unitaries = random_unitaries(basis, 50, seed=0)
+    for U in unitaries:
+        distances = fowler_distances(matrices, U)
+        # the search in the space of the quaternions is exact, with both signs of each operator
+        (nearest,) = tree.query(Operator("U", matrixify(U)))
+        assert fowler_distances(numpy.asarray(nearest.matrix)[None], U)[0] == pytest.approx(distances.min(), abs=1e-12)
+
+        (table_nearest,) = table_tree.query(Operator("U", matrixify(U)))
+        assert table_nearest.ancestors == nearest.ancestors
+        assert numpy.allclose(table_nearest.matrix, nearest.matrix)
+
+        # the t closest, in order
+        best = tree.query(Operator("U", matrixify(U)), t=3)
+        best_distances = fowler_distances(numpy.array([numpy.asarray(op.matrix) for op in best]), U)
+        assert list(best_distances) == sorted(best_distances)
+        assert best_distances == pytest.approx(numpy.sort(distances)[:3], abs=1e-12)
+
+    # the batched query finds the same operators
+    indices = tree.query_many(unitaries)
+    for (U, index) in zip(unitaries, indices):
+        assert tree.ancestors(index) == tree.query(Operator("U", matrixify(U)))[0].ancestors
+    assert numpy.array_equal(table_tree.query_many(unitaries), indices)
+
@@ -0,0 +1,44 @@
+import os
+import pickle
+
+import skc.basic_approx.file as approx_file
+import skc.basic_approx.search as search
+
+
+class TreeWhichCannotBeWritten:
+    def __reduce__(self):
+        raise RecursionError("too deep")
+
+
+def test_truncated_tree_is_built_again(tmp_path, monkeypatch):
+    base_dir = str(tmp_path)
+    filename = os.path.join(base_dir, "kdt-3.pickle")
+    with open(filename, "wb") as f:
+        f.write(pickle.dumps({"tree": list(range(100))})[:20])
+
+    monkeypatch.setattr(search, "build_kdtree", lambda *args: {"tree": "built"})
+
+    assert search.load_or_build_kdtree(base_dir, 3) == {"tree": "built"}
+    # the next process loads the tree which was written again
+    assert approx_file.read_from_file(filename) == {"tree": "built"}
+    assert os.listdir(base_dir) == ["kdt-3.pickle"]
+
+
+def test_failed_write_leaves_no_file(tmp_path, monkeypatch):
+    base_dir = str(tmp_path)
+    tree = TreeWhichCannotBeWritten()
+    monkeypatch.setattr(search, "build_array_kdtree", lambda *args: tree)
+
+    assert search.load_or_build_kdtree(base_dir, 3, "array") is tree
+    assert os.listdir(base_dir) == []
+
+
+def test_filename_settings_are_not_changed(tmp_path, monkeypatch):
+    approx_file.set_filename_prefix("generate-prefix")
+    approx_file.set_filename_suffix("generate-suffix")
+    monkeypatch.setattr(search, "build_kdtree", lambda *args: {"tree": "built"})
+
+    search.load_or_build_kdtree(str(tmp_path), 3)
+
+    assert approx_file.filename_prefix == "generate-prefix"
+    assert approx_file.filename_suffix == "generate-suffix"
@@ -0,0 +1,110 @@
+import math
+
+import pytest
+
+import layer_map as lll
+import main
+import patches_state as ps
+from multibody_commands import Command, CommandTypes, A_QUBIT
+from resanalysis.cube_to_physical import Qentiana
+from resanalysis.experiment import Experiment
+
+DISTILLATION_BOX = {"x": 4, "y": 8, "t": 3}
+
+
+@pytest.mark.parametrize("number_of_factories", [1, 2, 3])
+def test_factories_are_placed_side_by_side(number_of_factories):
+    layer_map = lll.LayerMap(DISTILLATION_BOX)
+    patches_state = ps.PatchesState()
+    layer_map.setup_arrangement_one(30, patches_state, number_of_factories)
+
+    (di, dj) = (DISTILLATION_BOX["x"], DISTILLATION_BOX["y"])
+    assert layer_map.dimension_j == dj * number_of_factories
+    assert layer_map.distillation_corners == [(0, k * dj) for k in range(number_of_factories)]
+    assert layer_map.distillation_outputs == [(di - 1, k * dj) for k in range(number_of_factories)]
+
+    for qi in range(di):
+        assert all(cell == lll.MapCellType.DISTILLATION for cell in layer_map.placement_map[qi])
+
+    # the A state of each factory can be routed to from the cell below it
+    ancillas = layer_map.get_potential_ancilla_patches_coordinates_2d()
+    for output in layer_map.distillation_outputs:
+        assert (output[0] + 1, output[1]) in ancillas
+
+    # the first factory outputs the A state, until another one is used
+    assert layer_map.get_qubit_coordinate_2d("A") == layer_map.distillation_outputs[0]
+    assert layer_map.use_distillation_factory(number_of_factories - 1) == layer_map.distillation_outputs[-1]
+
+    # the circuit qubits have their own data patches outside of the distilleries
+    data_patches = [layer_map.get_qubit_coordinate_2d(layer_map.get_circuit_qubit_name(q)) for q in range(30)]
+    assert len(set(data_patches)) == 30
+    assert all(patch[0] >= di for patch in data_patches)
+
+
+def qentiana_with_factories(number_of_factories, t_count=5):
+    experiment = Experiment()
+    experiment.props["footprint"] = 10
+    experiment.props["t_count"] = t_count
+    experiment.props["prefer_depth_over_t_count"] = False
+    experiment.props["number_of_factories"] = number_of_factories
+    return Qentiana(experiment.props)
+
+
+def test_experiment_has_one_factory():
+    assert Experiment().props["number_of_factories"] == 1
+
+
+@pytest.mark.parametrize("number_of_factories", [1, 2, 3, 5])
+def test_qentiana_scales_with_the_factories(number_of_factories):
+    single = qentiana_with_factories(1)
+    several = qentiana_with_factories(number_of_factories)
+
+    # each factory has its own distillery
+    assert several.compute_footprint_distillation_qubits() == \
+        number_of_factories * single.compute_footprint_distillation_qubits()
+
+    # the T rounds are shared by the factories
+    distillations_per_factory = math.ceil(several.t_count / number_of_factories)
+    rounds = Qentiana.compute_number_of_rounds(elements=distillations_per_factory,
+                                               element_distance=several.dist_box_dimensions["depth_distance"],
+                                               element_units_in_time=several.dist_box_dimensions["t"])
+    rounds *= several.parameters["multiplication_factor_for_Clifford_domination"]
+    assert several.compute_execution_rounds() == rounds
+    assert several.compute_execution_rounds() <= single.compute_execution_rounds()
+
+
+def test_layout_distillations_over_factories():
+    commands = [Command(CommandTypes.INIT, (4,))]
+    for qubit in range(3):
+        commands += [Command(CommandTypes.NEED, (A_QUBIT,)),
+                     Command(CommandTypes.MZZ, (A_QUBIT, qubit)),
+                     Command(CommandTypes.MX, (A_QUBIT,))]
+
+    def distillations(lay):
+        # (factory, start time) of each distillation, in the order in which they were placed
+        cells = {}
+        for ((i, j, t), cell) in lay.coordinates.placed_cells():
+            for op_id in cell.operations:
+                if lay.operations_dictionary[op_id].op_type.name == "USE_DISTILLATION":
+                    cells.setdefault(op_id, []).append((j, t))
+        dj = lay.layer_map.distillation_j_length
+        return [(min(cell[0] for cell in cells[op_id]) // dj, min(cell[1] for cell in cells[op_id]))
+                for op_id in sorted(cells)]
+
+    def crowded(lay):
+        return [coordinate for coordinate, cell in lay.coordinates.placed_cells() if len(cell.operations) > 1]
+
+    single = main.layout_commands(iter(commands), 3)
+    assert [factory for factory, start in distillations(single)] == [0, 0, 0]
+
+    # the distillations go to the factory which is free first
+    alternating = main.layout_commands(iter(commands), 3, number_of_factories=2)
+    assert [factory for factory, start in distillations(alternating)] == [0, 1, 0]
+    assert crowded(alternating) == []
+
+    # pipelined, both factories start distilling at once
+    pipelined = main.layout_commands(iter(commands), 3, number_of_factories=2, pipeline_distillations=True)
+    placed = distillations(pipelined)
+    assert placed[0] == (0, 0) and placed[1] == (1, 0)
+    assert crowded(pipelined) == []
+    assert pipelined.coordinates.get_depth() < single.coordinates.get_depth()
@@ -0,0 +1,139 @@
+import glob
+import json
+import os
+import pickle
+
+import pytest
+
+import skc.basic_approx.file as approx_file
+import skc.basic_approx.generate as generate
+from skc.basic_approx import BasicApproxSettings
+from skc.basis import get_hermitian_basis
+from skc.operator import I2, H, T, T_inv
+from skc.simplify import *
+from skc.utils import list_as_string
+
+
+def su2_settings():
+    # the settings of manage/generate_su2.py
+    settings = BasicApproxSettings()
+    settings.set_iset([H, T, T_inv])
+    settings.init_simplify_engine([IdentityRule(),
+                                   DoubleIdentityRule('H'),
+                                   AdjointRule(),
+                                   GeneralRule(['T'] * 8, 'I'),
+                                   GeneralRule(['Td'] * 8, 'I')])
+    settings.set_identity(I2)
+    settings.basis = get_hermitian_basis(d=2)
+    return settings
+
+
+def generate_tree_files(dirname, l0, nr_processes=None, chunk_size=None):
+    '''
+    Generates the basic approximations like manage/generate_su2.py, into dirname/gen-g<n>-<chunk>.pickle
+    :return: the settings
+    '''
+    settings = su2_settings()
+
+    prefix, suffix, size = approx_file.filename_prefix, approx_file.filename_suffix, approx_file.chunk_size
+    approx_file.set_filename_prefix(os.path.join(dirname, "gen"))
+    if chunk_size is not None:
+        approx_file.chunk_size = chunk_size
+    try:
+        generate.generate_approxes(l0, settings, nr_processes)
+    finally:
+        # a new process starts with an empty list of sequences
+        approx_file.reset_global_sequences()
+        approx_file.set_filename_prefix(prefix)
+        approx_file.set_filename_suffix(suffix)
+        approx_file.chunk_size = size
+
+    return settings
+
+
+def reference_generations(settings, l0):
+    # the generator before the chunks: each generation extends all the sequences of the previous one
+    engine = SimplifyEngine(settings.simplify_engine.rules)
+    generations = []
+    prefixes = [settings.identity]
+    for _ in range(l0):
+        generated = set()
+        new_ops = []
+        for prefix in prefixes:
+            for insn in settings.iset:
+                new_op = prefix.add_ancestors(insn)
+                (length, simplified) = engine.simplify(new_op.ancestors)
+                ancestor_string = list_as_string(simplified)
+                if simplified == [settings.identity.name] or ancestor_string in generated:
+                    continue
+                new_op.ancestors = simplified
+                if new_op.matrix_from_ancestors(settings.iset_dict, settings.identity):
+                    continue
+                generated.add(ancestor_string)
+                new_ops.append(new_op)
+        generations.append([list(op.ancestors) for op in new_ops])
+        prefixes = new_ops
+    return generations
+
+
+def read_generations(dirname, l0):
+    prefix = approx_file.filename_prefix
+    approx_file.set_filename_prefix(os.path.join(dirname, "gen"))
+    try:
+        return [[list(op.ancestors) for filename in approx_file.generation_filenames(i)
+                 for op in approx_file.read_from_file(filename)]
+                for i in range(1, l0 + 1)]
+    finally:
+        approx_file.set_filename_prefix(prefix)
+
+
+L0 = 6
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return reference_generations(su2_settings(), L0)
+
+
+def test_generation_matches_the_reference(tmp_path, reference):
+    generate_tree_files(str(tmp_path), L0)
+
+    assert read_generations(str(tmp_path), L0) == reference
+    # one file per generation
+    assert len(glob.glob(str(tmp_path / "gen-g*.pickle"))) == L0
+
+
+@pytest.mark.parametrize("nr_processes", [None, 2])
+def test_chunked_generation_matches_the_reference(tmp_path, reference, nr_processes):
+    # many input chunks, whose sequences can be the same
+    generate_tree_files(str(tmp_path), L0, nr_processes, chunk_size=7)
+
+    assert read_generations(str(tmp_path), L0) == reference
+
+
+def test_resumed_generation_matches_the_reference(tmp_path, reference, monkeypatch):
+    save_manifest = generate.save_manifest
+    nr_saves = [0]
+
+    def interrupted_save_manifest(manifest):
+        save_manifest(manifest)
+        nr_saves[0] += 1
+        if nr_saves[0] == 12:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(generate, "save_manifest", interrupted_save_manifest)
+    with pytest.raises(KeyboardInterrupt):
+        generate_tree_files(str(tmp_path), L0, chunk_size=7)
+    monkeypatch.setattr(generate, "save_manifest", save_manifest)
+
+    # a file written after the last checkpoint
+    with open(tmp_path / "gen-manifest.json") as f:
+        manifest = json.load(f)
+    (interrupted,) = [int(key) for key, state in manifest.items() if not state["complete"]]
+    assert manifest[str(interrupted)]["chunks_done"] > 0
+    with open(tmp_path / ("gen-g%d-999.pickle" % interrupted), "wb") as f:
+        pickle.dump([], f)
+
+    generate_tree_files(str(tmp_path), L0, chunk_size=7)
+
+    assert read_generations(str(tmp_path), L0) == reference
@@ -0,0 +1,134 @@
+import os
+import random
+
+import networkx as nx
+import numpy
+import pytest
+
+import layer_map as lll
+import patches_state as ps
+from grid_router import GridRouter
+
+DISTILLATION_BOX = {"x": 4, "y": 8, "t": 3}
+
+
+def arranged_layer_map(nr_qubits, number_of_factories=1, **kwargs):
+    layer_map = lll.LayerMap(DISTILLATION_BOX, **kwargs)
+    layer_map.setup_arrangement_one(nr_qubits, ps.PatchesState(), number_of_factories)
+    return layer_map
+
+
+def old_grid_graph(dimension_i, dimension_j, free_coordinates):
+    # the graph which LayerMap built before the grid router
+    grid_graph = nx.grid_2d_graph(dimension_i, dimension_j)
+    for qi in range(dimension_i):
+        for qj in range(dimension_j):
+            if (qi, qj) not in free_coordinates:
+                grid_graph.remove_node((qi, qj))
+    return grid_graph
+
+
+def old_route(grid_graph, start, end):
+    try:
+        return nx.astar_path(grid_graph, start, end)
+    except nx.NetworkXNoPath:
+        return None
+
+
+def old_cached_route(routes, grid_graph, start, end):
+    # like LayerMap.get_route_between_qubits, a route is also stored for the reversed pair
+    if (start, end) not in routes:
+        route = old_route(grid_graph, start, end)
+        if route is None:
+            return None
+        routes[(start, end)] = route
+        routes[(end, start)] = list(reversed(route))
+    return routes[(start, end)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_routes_match_astar_on_random_maps(seed):
+    rnd = random.Random(seed)
+    dimension_i, dimension_j = rnd.randrange(3, 12), rnd.randrange(3, 12)
+    free_coordinates = [(qi, qj) for qi in range(dimension_i) for qj in range(dimension_j) if rnd.random() < 0.7]
+
+    router = GridRouter(dimension_i, dimension_j, free_coordinates)
+    grid_graph = old_grid_graph(dimension_i, dimension_j, free_coordinates)
+    route_table = router.compute_route_table(free_coordinates)
+
+    for (index, start) in enumerate(free_coordinates):
+        for end in free_coordinates:
+            expected = old_route(grid_graph, start, end)
+            assert router.find_route(start, end) == expected
+            assert router.route_from_table(route_table[index], start, end) == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_shortest_route_between_sets_of_cells(seed):
+    rnd = random.Random(seed)
+    dimension_i, dimension_j = rnd.randrange(3, 12), rnd.randrange(3, 12)
+    free_coordinates = [(qi, qj) for qi in range(dimension_i) for qj in range(dimension_j) if rnd.random() < 0.7]
+    router = GridRouter(dimension_i, dimension_j, free_coordinates)
+
+    for _ in range(50):
+        usable_cells = [rnd.random() < 0.8 for _ in range(dimension_i * dimension_j)]
+        starts = rnd.sample(free_coordinates, min(3, len(free_coordinates)))
+        ends = rnd.sample(free_coordinates, min(3, len(free_coordinates)))
+
+        routes = [router.find_route(start, end, usable_cells) for start in starts for end in ends]
+        routes = [route for route in routes if route is not None]
+        route = router.find_shortest_route(starts, ends, usable_cells)
+        if len(routes) == 0:
+            assert route is None
+            continue
+
+        assert len(route) == min(len(other) for other in routes)
+        assert (route[0] in starts) and (route[-1] in ends)
+        assert all(usable_cells[router.cell_index(cell)] for cell in route)
+        assert all(abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 for a, b in zip(route, route[1:]))
+
+
+@pytest.mark.parametrize("number_of_factories", [1, 2])
+def test_layer_map_routes_match_astar(number_of_factories):
+    layer_map = arranged_layer_map(30, number_of_factories)
+    table_layer_map = arranged_layer_map(30, number_of_factories, precompute_routes=True)
+
+    ancillas = list(dict.fromkeys(layer_map.get_potential_ancilla_patches_coordinates_2d()))
+    grid_graph = old_grid_graph(layer_map.dimension_i, layer_map.dimension_j, ancillas)
+
+    old_routes = {}
+    rnd = random.Random(number_of_factories)
+    for _ in range(300):
+        start, end = rnd.choice(ancillas), rnd.choice(ancillas)
+        expected = old_cached_route(old_routes, grid_graph, start, end)
+        assert layer_map.get_route_between_qubits(start, end) == expected
+        assert table_layer_map.get_route_between_qubits(start, end) == expected
+
+
+def test_stored_route_table_is_checked(tmp_path):
+    dirname = str(tmp_path)
+
+    computed = arranged_layer_map(30, route_table_dirname=dirname, precompute_routes=True)
+    filename = computed.get_route_table_filename()
+    assert os.path.exists(filename)
+
+    loaded = arranged_layer_map(30, route_table_dirname=dirname, precompute_routes=True)
+    assert numpy.array_equal(loaded.route_table, computed.route_table)
+
+    # another arrangement has another file
+    other = arranged_layer_map(60, route_table_dirname=dirname, precompute_routes=True)
+    assert other.get_route_table_filename() != filename
+
+    # a file of another arrangement under the name of this one is not used
+    os.replace(other.get_route_table_filename(), filename)
+    stale = arranged_layer_map(30, route_table_dirname=dirname, precompute_routes=True)
+    assert numpy.array_equal(stale.route_table, computed.route_table)
+
+    # an unreadable file is not used either
+    with open(filename, "wb") as f:
+        f.write(b"not a route table")
+    broken = arranged_layer_map(30, route_table_dirname=dirname, precompute_routes=True)
+    assert numpy.array_equal(broken.route_table, computed.route_table)
+
+    # the file was written again
+    assert numpy.array_equal(loaded.load_route_table(filename), computed.route_table)
@@ -0,0 +1,125 @@
+import random
+
+import numpy
+import pytest
+
+from skc.basic_approx.process import load_sequences, components_to_kdpoint, components_to_search_kdpoints
+from skc.basic_approx.search import search_kdtree
+from skc.decompose import unitary_to_axis
+from skc.kdtree import KDTree, KDTreeNode
+from skc.operator import Operator
+from skc.utils import matrixify, fowler_distance, fowler_distances
+
+from test_generate import generate_tree_files
+from test_sk_batch import random_unitaries
+
+
+class Point:
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+
+
+def recursive_kdtree(op_list, depth=0):
+    # the build of KDTree before it was done one level at a time
+    if not op_list:
+        return None
+
+    axis = depth % len(op_list[0].dimensions)
+    op_list.sort(key=lambda point: point.dimensions[axis])
+    median = len(op_list) // 2
+    op_this = op_list[median]
+    node = KDTreeNode(op=op_this,
+                      left=recursive_kdtree(op_list[0:median], depth + 1),
+                      right=recursive_kdtree(op_list[median + 1:], depth + 1))
+    node.axis = axis
+    node.dim_val = op_this.dimensions[axis]
+    return node
+
+
+def assert_same_nodes(node, expected):
+    if expected is None:
+        assert node is None
+        return
+
+    assert node.op is expected.op
+    assert node.axis == expected.axis
+    assert node.dim_val == expected.dim_val
+    assert_same_nodes(node.left, expected.left)
+    assert_same_nodes(node.right, expected.right)
+
+
+@pytest.mark.parametrize("nr_axes", [1, 2, 3])
+def test_tree_is_the_recursive_tree(nr_axes):
+    rnd = random.Random(nr_axes)
+    for nr_ops in range(0, 70):
+        # few distinct values, such that there are many ties
+        ops = [Point([rnd.randrange(4) for _ in range(nr_axes)]) for _ in range(nr_ops)]
+        expected = recursive_kdtree(list(ops))
+
+        tree = KDTree(ops)
+        assert_same_nodes(tree.root_node, expected)
+
+
+def test_node_indices_are_the_positions_of_the_ops():
+    rnd = random.Random(0)
+    ops = [Point([rnd.random(), rnd.random()]) for _ in range(50)]
+    dimensions = [op.dimensions for op in ops]
+
+    tree = KDTree(ops)
+
+    nodes = [tree.root_node]
+    while nodes:
+        node = nodes.pop()
+        assert node.op is ops[node.index]
+        assert tree.points[node.index].tolist() == dimensions[node.index]
+        nodes += [child for child in (node.left, node.right) if child is not None]
+
+
+@pytest.fixture(scope="module")
+def su2_tree(tmp_path_factory):
+    dirname = str(tmp_path_factory.mktemp("su2"))
+    settings = generate_tree_files(dirname, 6)
+    ops = load_sequences(dirname + "/gen-g", 6, "-1.pickle")
+    return KDTree(ops), ops, settings.basis
+
+
+def search_op(U, basis):
+    # the query of search_kdtree
+    (components, K, matrix_H) = unitary_to_axis(matrixify(U), basis)
+    if K < 0:
+        components = {k: -v for (k, v) in components.items()}
+        K = -K
+    op = Operator(name="Search", matrix=matrixify(U))
+    op.dimensions = components_to_kdpoint(components, basis, K)
+    op.search_points = components_to_search_kdpoints(components, basis, K)
+    return op
+
+
+def test_candidates_are_the_nearest_kd_points(su2_tree):
+    (tree, ops, basis) = su2_tree
+    rows = {id(op): row for (row, op) in enumerate(ops)}
+
+    for U in random_unitaries(basis, 20, seed=5):
+        query_op = search_op(U, basis)
+        square_distances = numpy.min([numpy.sum((tree.points - numpy.array(point, dtype=float)) ** 2, axis=1)
+                                      for point in query_op.search_points], axis=0)
+
+        for k in (1, 8, 30):
+            candidates = tree.query_candidates(query_op, t=k, k=k)
+            assert tree.statistics["candidates"] == k
+            found = sorted(square_distances[rows[id(op)]] for op in candidates)
+            assert found == pytest.approx(numpy.sort(square_distances)[:k], abs=1e-12)
+
+            # ranked by Fowler distance
+            distances = [fowler_distance(numpy.asarray(op.matrix), U) for op in candidates]
+            assert numpy.all(numpy.diff(distances) > -1e-12)
+
+
+def test_all_candidates_give_the_closest_operator(su2_tree):
+    (tree, ops, basis) = su2_tree
+    matrices = numpy.array([numpy.asarray(op.matrix) for op in ops])
+
+    for U in random_unitaries(basis, 20, seed=6):
+        nearest = search_kdtree(tree, matrixify(U), basis, candidates=len(ops))
+        assert fowler_distance(numpy.asarray(nearest.matrix), U) == \
+            pytest.approx(fowler_distances(matrices, U).min(), abs=1e-12)
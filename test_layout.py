@@ -0,0 +1,53 @@
+import layer_map as lll
+import layout as la
+import operationcollection as opc
+import patches_state as ps
+
+from test_grid_router import DISTILLATION_BOX
+
+BLOCKED_STEPS = 3
+
+
+def blocked_measurement(congestion_routing):
+    '''
+    Lays out an MZZ between two qubits, after the middle of their static route was made busy for a few time steps
+    :return: the layout, the static route, the busy cell and the span set of the measurement
+    '''
+    patches_state = ps.PatchesState()
+    layer_map = lll.LayerMap(DISTILLATION_BOX)
+    layer_map.setup_arrangement_one(20, patches_state)
+    lay = la.CubeLayout(layer_map, 5, congestion_routing)
+
+    qubits = ["0", "13"]
+    ancillas = [lay.get_ancilla_based_on_operator_orientation(layer_map.get_circuit_qubit_name(qubit),
+                                                              patches_state, "Z")[0] for qubit in qubits]
+    static_route = layer_map.get_route_between_qubits(*ancillas)
+    busy_cell = static_route[len(static_route) // 2]
+    lay.configure_operation(opc.OperationTypes.MOVE_PATCH,
+                            [(*busy_cell, t) for t in range(BLOCKED_STEPS)], [], [])
+
+    sets = lay.create_route_between_qubits(qubits, patches_state, ["Z", "Z"])
+    lay.configure_operation(*sets)
+    return lay, static_route, busy_cell, sets[1]
+
+
+def test_blocked_measurement_waits_for_the_static_route():
+    lay, static_route, busy_cell, span_set = blocked_measurement(False)
+
+    assert span_set == [(*cell, BLOCKED_STEPS) for cell in static_route]
+    assert lay.coordinates.get_depth() == BLOCKED_STEPS + 1
+
+
+def test_blocked_measurement_is_routed_around_the_busy_cell():
+    lay, static_route, busy_cell, span_set = blocked_measurement(True)
+    route = [(si, sj) for (si, sj, st) in span_set]
+
+    # the route is longer, but the measurement does not wait
+    assert all(st == 0 for (si, sj, st) in span_set)
+    assert busy_cell not in route
+    assert (route[0], route[-1]) == (static_route[0], static_route[-1])
+    assert all(abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 for a, b in zip(route, route[1:]))
+
+    # the measurement ends before the busy cell is free, so the layout is not deeper than the busy cell
+    assert lay.coordinates.get_depth() == BLOCKED_STEPS
+    assert lay.coordinates.get_depth() < blocked_measurement(False)[0].coordinates.get_depth()
@@ -0,0 +1,82 @@
+import io
+import random
+
+import pytest
+
+import main
+
+
+def random_qasm(nr_qubits, nr_gates, seed):
+    rnd = random.Random(seed)
+    lines = ["// Generated from Cirq", "", "OPENQASM 2.0;", "include \"qelib1.inc\";", "",
+             "// Qubits: []", "qreg q[%d];" % nr_qubits, ""]
+    nr_t_gates = 0
+    for _ in range(nr_gates):
+        qubit = rnd.randrange(nr_qubits)
+        gate = rnd.randrange(4)
+        if gate == 0 and nr_t_gates < 3:
+            lines.append("rz(pi*0.25) q[%d];" % qubit)
+            nr_t_gates += 1
+        elif gate == 1:
+            lines.append("rz(pi*0.5) q[%d];" % qubit)
+        elif gate == 2:
+            lines.append("h q[%d];" % qubit)
+        else:
+            qubit2 = (qubit + rnd.randrange(1, nr_qubits)) % nr_qubits
+            lines.append("cx q[%d],q[%d];" % (qubit, qubit2))
+    return "\n".join(lines)
+
+
+def layout_cells(lay):
+    return [(coordinate, [lay.operations_dictionary[op_id].op_type for op_id in cell.operations])
+            for coordinate, cell in lay.coordinates.placed_cells()]
+
+
+def test_single_use_input_is_read_by_both_passes():
+    circuit = random_qasm(nr_qubits=6, nr_gates=40, seed=1)
+
+    from_string = main.process_string_of_circuit(circuit)
+    from_file = main.process_string_of_circuit(io.StringIO(circuit))
+    from_generator = main.process_string_of_circuit(line for line in circuit.splitlines())
+
+    assert layout_cells(from_file) == layout_cells(from_string)
+    assert layout_cells(from_generator) == layout_cells(from_string)
+
+
+def test_seekable_file_is_rewound_and_not_read_into_a_list(tmp_path):
+    circuit = random_qasm(nr_qubits=6, nr_gates=40, seed=1)
+    filename = tmp_path / "circuit.qasm"
+    filename.write_text(circuit)
+
+    with open(filename) as f:
+        reiterable = main.make_reiterable(f)
+        assert not isinstance(reiterable, list)
+        assert list(reiterable) == list(reiterable) == circuit.splitlines(keepends=True)
+
+        from_file = main.process_string_of_circuit(reiterable)
+    assert layout_cells(from_file) == layout_cells(main.process_string_of_circuit(circuit))
+
+    assert isinstance(main.make_reiterable(line for line in circuit.splitlines()), list)
+    assert main.make_reiterable(circuit) is circuit
+
+
+def test_predecomposed_single_use_input_is_compiled():
+    circuit = random_qasm(nr_qubits=6, nr_gates=40, seed=2)
+
+    from_string = main.process_string_of_circuit(circuit)
+    from_file = main.process_string_of_circuit(io.StringIO(circuit), batch_decompose=True)
+
+    assert layout_cells(from_file) == layout_cells(from_string)
+
+
+def test_program_file_from_single_use_input(tmp_path):
+    circuit = random_qasm(nr_qubits=6, nr_gates=40, seed=3)
+    filename = str(tmp_path / "multibody.bin")
+
+    header = main.compile_to_program_file(io.StringIO(circuit), filename, batch_decompose=True)
+    assert header["nr_commands"] > 0
+
+    from_string = main.process_string_of_circuit(circuit)
+    from_program = main.process_program_file(filename)
+
+    assert layout_cells(from_program) == layout_cells(from_string)
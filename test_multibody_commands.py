@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+import multibody_commands as mc
+from multibody_commands import Command, CommandTypes, A_QUBIT, ANCILLA_QUBIT
+
+
+COMMANDS = [
+    Command(CommandTypes.INIT, (5,)),
+    Command(CommandTypes.H, (0,)),
+    Command(CommandTypes.NEED, (A_QUBIT,)),
+    Command(CommandTypes.MZZ, (A_QUBIT, 3)),
+    Command(CommandTypes.MX, (A_QUBIT,)),
+    Command(CommandTypes.S, (ANCILLA_QUBIT,)),
+    Command(CommandTypes.MXX, (ANCILLA_QUBIT, 3)),
+    Command(CommandTypes.ANCILLA, (0,)),
+    Command(CommandTypes.MZZ, (0, 1, 2, 4)),
+    # the multibody measurements of a T gate on several qubits are as wide as the circuit
+    Command(CommandTypes.MZZ, (A_QUBIT, 0, 3, 1, 2)),
+    Command(CommandTypes.MXX, tuple(range(10))),
+    Command(CommandTypes.NEED, (A_QUBIT,)),
+    Command(CommandTypes.MZZ, (A_QUBIT, 1)),
+]
+
+
+def test_command_strings():
+    for command in COMMANDS:
+        assert Command.from_string(str(command)) == command
+
+    assert str(Command(CommandTypes.MXX, (12, ANCILLA_QUBIT))) == "MXX 12 ANCILLA"
+    assert Command.from_string("NOT A COMMAND").op == CommandTypes.UNKNOWN
+
+
+def test_command_array():
+    program = mc.commands_to_array(COMMANDS)
+
+    assert program.commands.dtype == mc.COMMAND_DTYPE
+    assert program.qubits.dtype == mc.QUBIT_DTYPE
+    assert len(program) == len(COMMANDS)
+    assert len(program.qubits) == sum(len(command.qubits) for command in COMMANDS)
+    assert list(mc.array_to_commands(program)) == COMMANDS
+    assert mc.count_t_gates(program) == mc.count_t_gates(iter(COMMANDS)) == 2
+
+
+def test_command_array_chunks(monkeypatch):
+    monkeypatch.setattr(mc, "WRITE_CHUNK_SIZE", 4)
+    assert list(mc.array_to_commands(mc.commands_to_array(COMMANDS))) == COMMANDS
+
+
+def test_program_file_round_trip(tmp_path, monkeypatch):
+    # several chunks, the last one partial
+    monkeypatch.setattr(mc, "WRITE_CHUNK_SIZE", 3)
+    filename = str(tmp_path / "multibody.bin")
+
+    header = mc.write_program(filename, iter(COMMANDS))
+    assert header == {"nr_qubits": 5, "t_count": 2, "nr_commands": len(COMMANDS)}
+
+    loaded_header, program = mc.load_program(filename)
+    assert loaded_header == header
+    assert isinstance(program.commands, np.memmap)
+    assert isinstance(program.qubits, np.memmap)
+    assert list(mc.array_to_commands(program)) == COMMANDS
+    assert mc.count_t_gates(program) == 2
+
+
+def test_empty_program_file(tmp_path):
+    filename = str(tmp_path / "multibody.bin")
+
+    header = mc.write_program(filename, [])
+    assert header == {"nr_qubits": 0, "t_count": 0, "nr_commands": 0}
+
+    loaded_header, program = mc.load_program(filename)
+    assert loaded_header == header
+    assert len(program) == 0
+
+
+def test_not_a_program_file(tmp_path):
+    filename = tmp_path / "multibody.bin"
+    filename.write_bytes(b"INIT 5\nH 0\n" * 10)
+
+    assert mc.load_program(str(filename)) is None
+
+
+def test_aborted_write_leaves_no_program_file(tmp_path):
+    filename = tmp_path / "multibody.bin"
+
+    def failing_commands():
+        yield from COMMANDS
+        raise RuntimeError("compilation failed")
+
+    with pytest.raises(RuntimeError):
+        mc.write_program(str(filename), failing_commands())
+    assert list(tmp_path.iterdir()) == []
+
+    # an existing program is kept
+    header = mc.write_program(str(filename), COMMANDS)
+    with pytest.raises(RuntimeError):
+        mc.write_program(str(filename), failing_commands())
+    assert list(tmp_path.iterdir()) == [filename]
+    loaded_header, program = mc.load_program(str(filename))
+    assert loaded_header == header
+    assert list(mc.array_to_commands(program)) == COMMANDS
@@ -0,0 +1,114 @@
+import pytest
+
+import prepare_circuit as pc
+
+
+def old_replace_rx_ry_with_rz(gate):
+    # the string parser which was replaced by the tokenizer
+    qubs = gate.split(" ")[1]
+    if gate.startswith("rx"):
+        return ["h " + qubs, gate.replace("rx", "rz"), "h " + qubs]
+    elif gate.startswith("ry"):
+        return ["rz(pi*0.5) " + qubs, gate.replace("ry", "rz"), "rz(pi*0.5) " + qubs]
+
+    return [gate]
+
+
+def old_replace_in_gate_string(s):
+    s = s.replace("h", "H")
+
+    s = s.replace("rz(pi*0.5)", "S")
+    s = s.replace("rz(pi*-0.5)", "S")
+    s = s.replace("rx(pi*0.5)", "V")
+    s = s.replace("rx(pi*-0.5)", "V")
+
+    s = s.replace("rz(pi*0.25)", "T")
+    s = s.replace("rz(pi*-0.25)", "T")
+
+    s = s.replace("rz(pi*1.5)", "T")
+    s = s.replace("rz(pi*-1.5)", "T")
+
+    s = s.replace("rx(pi*1.0)", "x")
+    s = s.replace("rx(pi*-1.0)", "x")
+    s = s.replace("ry(pi*1.0)", "y")
+    s = s.replace("ry(pi*-1.0)", "y")
+    s = s.replace("rz(pi*1.0)", "z")
+    s = s.replace("rz(pi*-1.0)", "z")
+
+    s = s.replace("cx", "CNOT")
+
+    s = s.replace("q[", "")\
+        .replace("]", "")\
+        .replace(",", " ")\
+        .replace(";", "")\
+        .strip()
+
+    s = s.replace("cz", "CPHASE")
+
+    return s
+
+
+def old_parse_line(line):
+    return [old_replace_in_gate_string(gate) for gate in old_replace_rx_ry_with_rz(line)]
+
+
+def old_parse_circuit(circuit):
+    nr_header_lines = 4
+    for line in circuit.splitlines():
+        if line.strip() == '':
+            continue
+
+        if nr_header_lines > 0:
+            nr_header_lines -= 1
+            continue
+
+        yield from old_parse_line(line)
+
+
+QASM_LINES = [
+    "h q[0];",
+    "cx q[3],q[12];",
+    "cz q[1],q[2];",
+    "x q[4];",
+    "rz(pi*0.5) q[1];",
+    "rz(pi*-0.5) q[1];",
+    "rz(pi*0.25) q[2];",
+    "rz(pi*-0.25) q[2];",
+    "rz(pi*1.5) q[0];",
+    "rz(pi*-1.0) q[7];",
+    "rx(pi*0.5) q[3];",
+    "rx(pi*1.0) q[3];",
+    "ry(pi*0.25) q[5];",
+    "ry(pi*-1.0) q[5];",
+    "rz(pi*0.3) q[6];",
+    "rz(pi*-0.123) q[6];",
+    "rx(pi*0.7) q[10];",
+    "ry(pi*0.0625) q[11];",
+]
+
+
+@pytest.mark.parametrize("line", QASM_LINES)
+def test_tokenized_records_match_the_string_parser(line):
+    prep = pc.PrepareCircuit()
+
+    records = prep.replace_rx_ry_with_rz(pc.tokenize_qasm_line(line))
+    records = [prep.replace_in_gate_record(record) for record in records]
+
+    assert [str(record) for record in records] == old_parse_line(line)
+
+
+def test_circuit_records_match_the_string_parser():
+    header = ["// Generated from Cirq", "", "OPENQASM 2.0;", "include \"qelib1.inc\";", "",
+              "// Qubits: []", "qreg q[16];", ""]
+    circuit = "\n".join(header + QASM_LINES)
+
+    records = pc.PrepareCircuit().parse_to_my_string_format(circuit)
+
+    assert [str(record) for record in records] == list(old_parse_circuit(circuit))
+
+
+def test_tokenize_qasm_line():
+    assert pc.tokenize_qasm_line("rz(pi*0.25) q[3];") == pc.GateRecord("rz", 0.25, (3,))
+    assert pc.tokenize_qasm_line("cx q[0], q[1];") == pc.GateRecord("cx", None, (0, 1))
+    assert pc.tokenize_qasm_line("rz(pi/4) q[2];") == pc.GateRecord("rz", 0.25, (2,))
+    assert pc.tokenize_qasm_line("rz(-pi) q[2];") == pc.GateRecord("rz", -1.0, (2,))
@@ -0,0 +1,84 @@
+import numpy
+import pytest
+
+from skc.operator import Operator, I2, H, T, T_inv
+from skc.quaternion import *
+from skc.utils import fowler_distance, fowler_distances
+
+
+def random_unitary(rnd):
+    q, r = numpy.linalg.qr(rnd.normal(size=(2, 2)) + 1j * rnd.normal(size=(2, 2)))
+    return q * (numpy.diag(r) / numpy.abs(numpy.diag(r)))
+
+
+def same_operator(A, B):
+    # equal up to a global phase
+    return fowler_distance(numpy.asarray(A), numpy.asarray(B)) < 1e-7
+
+
+def test_quaternions_are_the_matrices_up_to_a_phase():
+    rnd = numpy.random.default_rng(0)
+    for _ in range(50):
+        U = random_unitary(rnd)
+        q = matrix_to_quaternion(U)
+
+        assert sum(x * x for x in q) == pytest.approx(1)
+        assert same_operator(quaternion_to_matrix(q), U)
+        assert numpy.allclose(quaternions_to_matrices([q])[0], quaternion_to_matrix(q))
+
+
+def test_quaternion_operations_match_the_matrix_operations():
+    rnd = numpy.random.default_rng(1)
+    for _ in range(50):
+        A = random_unitary(rnd)
+        B = random_unitary(rnd)
+        p = matrix_to_quaternion(A)
+        q = matrix_to_quaternion(B)
+
+        assert same_operator(quaternion_to_matrix(quaternion_product(p, q)), A @ B)
+        assert same_operator(quaternion_to_matrix(quaternion_dagger(p)), A.conj().T)
+        assert quaternion_fowler_distance(p, q) == pytest.approx(fowler_distance(A, B), abs=1e-7)
+
+    quaternions = [matrix_to_quaternion(random_unitary(rnd)) for _ in range(20)]
+    matrices = quaternions_to_matrices(quaternions)
+    assert quaternion_fowler_distances(quaternions, q) == pytest.approx(fowler_distances(matrices, B), abs=1e-7)
+
+
+def test_quaternion_operators_match_operators():
+    iset = [H, T, T_inv]
+    quaternion_iset = [to_quaternion_operator(insn) for insn in iset]
+
+    product = H.multiply(T).multiply(T_inv.dagger()).multiply(H)
+    quaternion_product_op = quaternion_iset[0].multiply(quaternion_iset[1]) \
+        .multiply(quaternion_iset[2].dagger()).multiply(quaternion_iset[0])
+    assert same_operator(quaternion_product_op.matrix, product.matrix)
+    assert quaternion_product_op.ancestors == product.ancestors
+
+    # the matrix of a generated sequence
+    iset_dict = {insn.name: insn for insn in iset + [I2]}
+    quaternion_iset_dict = {insn.name: insn for insn in quaternion_iset + [to_quaternion_operator(I2)]}
+    for ancestors in (["H", "T", "H", "Td"], ["T", "T", "H", "T", "T", "T"]):
+        op = Operator("", None, list(ancestors))
+        quaternion_op = QuaternionOperator("", None, list(ancestors))
+        assert not op.matrix_from_ancestors(iset_dict, I2)
+        assert not quaternion_op.matrix_from_ancestors(quaternion_iset_dict, to_quaternion_operator(I2))
+        assert same_operator(quaternion_op.matrix, op.matrix)
+
+    # H^2 is the identity
+    quaternion_op = QuaternionOperator("", None, ["H", "H"])
+    assert quaternion_op.matrix_from_ancestors(quaternion_iset_dict, to_quaternion_operator(I2))
+
+
+def test_aligned_quaternion_has_the_sign_of_the_matrix():
+    rnd = numpy.random.default_rng(2)
+    U = random_unitary(rnd)
+    q = matrix_to_quaternion(U)
+
+    for sign in (1, -1):
+        op = QuaternionOperator("U", tuple(sign * x for x in q))
+        aligned = align_quaternion_operator(op, U)
+        assert aligned.quaternion == pytest.approx(q)
+        assert aligned.ancestors == op.ancestors
+
+    # the operators with matrices are not changed
+    assert align_quaternion_operator(H, U) is H
@@ -0,0 +1,109 @@
+import sqlite3
+
+import rotation_cache as rc
+
+
+def stored_rows(filename):
+    connection = sqlite3.connect(filename)
+    rows = connection.execute("SELECT angle, axis, depth, tree, gates, last_used FROM decompositions").fetchall()
+    connection.close()
+    return {(angle, axis, depth, tree): (gates, last_used) for (angle, axis, depth, tree, gates, last_used) in rows}
+
+
+def fake_clock(monkeypatch):
+    clock = [0.0]
+
+    def tick():
+        clock[0] += 1
+        return clock[0]
+
+    monkeypatch.setattr(rc.time, "time", tick)
+
+
+def test_hit_and_miss(tmp_path):
+    filename = str(tmp_path / "rotation_cache.sqlite")
+
+    cache = rc.RotationCache(filename)
+    assert cache.get(0.125, (0, 0, 1), 2, "tree") is None
+    cache.put(0.125, (0, 0, 1), 2, "tree", ["H", "T", "S"])
+    cache.put(0.5, (1, 0, 0), 2, "tree", [])
+    cache.close()
+
+    # another run reads the decompositions of this one
+    cache = rc.RotationCache(filename)
+    assert cache.get(0.125, (0, 0, 1), 2, "tree") == ["H", "T", "S"]
+    assert cache.get(0.5, (1, 0, 0), 2, "tree") == []
+
+    # each part of the key has to match
+    assert cache.get(0.25, (0, 0, 1), 2, "tree") is None
+    assert cache.get(0.125, (1, 0, 0), 2, "tree") is None
+    assert cache.get(0.125, (0, 0, 1), 3, "tree") is None
+    assert cache.get(0.125, (0, 0, 1), 2, "other tree") is None
+    cache.close()
+
+
+def test_the_file_is_opened_when_used(tmp_path):
+    filename = tmp_path / "rotation_cache.sqlite"
+
+    cache = rc.RotationCache(str(filename))
+    cache.close()
+    assert not filename.exists()
+
+
+def test_hits_are_written_in_batches(tmp_path, monkeypatch):
+    fake_clock(monkeypatch)
+    filename = str(tmp_path / "rotation_cache.sqlite")
+
+    cache = rc.RotationCache(filename, eviction_interval=3)
+    for angle in range(3):
+        cache.put(angle, (0, 0, 1), 1, "tree", ["T"])
+    before = stored_rows(filename)
+
+    # the hits are not written, until there are eviction_interval of them
+    cache.get(0, (0, 0, 1), 1, "tree")
+    cache.get(1, (0, 0, 1), 1, "tree")
+    assert stored_rows(filename) == before
+    assert len(cache.pending_last_used) == 2
+
+    cache.get(2, (0, 0, 1), 1, "tree")
+    assert len(cache.pending_last_used) == 0
+    after = stored_rows(filename)
+    assert all(after[key][1] > before[key][1] for key in before)
+
+    # a put writes the pending hits
+    cache.get(0, (0, 0, 1), 1, "tree")
+    cache.put(5, (0, 0, 1), 1, "tree", ["S"])
+    assert len(cache.pending_last_used) == 0
+    assert stored_rows(filename)[(0, "(0, 0, 1)", 1, "tree")][1] > after[(0, "(0, 0, 1)", 1, "tree")][1]
+
+    # and so does closing the cache
+    cache.get(1, (0, 0, 1), 1, "tree")
+    last_hit = max(cache.pending_last_used.values())
+    cache.close()
+    assert stored_rows(filename)[(1, "(0, 0, 1)", 1, "tree")][1] == last_hit
+
+
+def test_least_recently_used_are_evicted(tmp_path, monkeypatch):
+    fake_clock(monkeypatch)
+    filename = str(tmp_path / "rotation_cache.sqlite")
+
+    cache = rc.RotationCache(filename, max_entries=3, eviction_interval=2)
+    cache.put(0, (0, 0, 1), 1, "tree", ["T"])
+    cache.put(1, (0, 0, 1), 1, "tree", ["T"])
+    cache.put(2, (0, 0, 1), 1, "tree", ["T"])
+
+    # 0 is used again, so 1 is the least recently used
+    assert cache.get(0, (0, 0, 1), 1, "tree") == ["T"]
+
+    # the eviction runs every second put: after four puts, the cache is back to max_entries
+    cache.put(3, (0, 0, 1), 1, "tree", ["T"])
+    assert sorted(key[0] for key in stored_rows(filename)) == [0, 2, 3]
+
+    # in between evictions, the cache holds more than max_entries
+    cache.put(4, (0, 0, 1), 1, "tree", ["T"])
+    assert len(stored_rows(filename)) == 4
+    cache.put(5, (0, 0, 1), 1, "tree", ["T"])
+    assert sorted(key[0] for key in stored_rows(filename)) == [3, 4, 5]
+
+    assert cache.get(1, (0, 0, 1), 1, "tree") is None
+    cache.close()
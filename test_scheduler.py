@@ -0,0 +1,110 @@
+import pytest
+
+import main
+import scheduler as sch
+from multibody_commands import Command, CommandTypes
+
+from test_main import random_qasm
+
+
+def record_commands(monkeypatch):
+    '''
+    :return: list of [command, patch names, start, end], filled while the scheduler lays out the commands
+    '''
+    records = []
+    start_command = sch.CommandScheduler.start_command
+    end_command = sch.CommandScheduler.end_command
+
+    def recording_start_command(self, command):
+        start = start_command(self, command)
+        records.append([command, list(self.command_patches), start, None])
+        return start
+
+    def recording_end_command(self):
+        end = end_command(self)
+        # the scheduler is created by the INIT command, after its start
+        if len(records) > 0:
+            records[-1][3] = end
+        return end
+
+    monkeypatch.setattr(sch.CommandScheduler, "start_command", recording_start_command)
+    monkeypatch.setattr(sch.CommandScheduler, "end_command", recording_end_command)
+
+    return records
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_scheduled_commands_do_not_overlap(seed):
+    circuit = random_qasm(nr_qubits=8, nr_gates=80, seed=seed)
+
+    sequential_lay = main.process_string_of_circuit(circuit)
+    scheduled_lay = main.process_string_of_circuit(circuit, schedule_commands=True)
+
+    for lay in (sequential_lay, scheduled_lay):
+        crowded = [coordinate for coordinate, cell in lay.coordinates.placed_cells() if len(cell.operations) > 1]
+        assert crowded == []
+
+    assert scheduled_lay.coordinates.get_depth() <= sequential_lay.coordinates.get_depth()
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_non_commuting_commands_keep_their_order(seed, monkeypatch):
+    records = record_commands(monkeypatch)
+    main.process_string_of_circuit(random_qasm(nr_qubits=8, nr_gates=80, seed=seed), schedule_commands=True)
+    assert len(records) > 0
+
+    # per patch: the basis of the current run of commuting commands, the end of the commands before the run,
+    # and the end of all the commands
+    patch_runs = {}
+    for (command, patch_names, start, end) in records:
+        basis = sch.COMMUTATION_BASIS.get(command.op)
+        for name in patch_names:
+            (run_basis, before_run, last_end) = patch_runs.get(name, (None, 0, 0))
+            if (basis is None) or (basis != run_basis):
+                before_run = last_end
+
+            # a command starts after the commands it does not commute with
+            assert start >= before_run, (command, name)
+
+            patch_runs[name] = (basis, before_run, max(last_end, end))
+
+
+def test_commands_on_a_patch_are_placed_in_order():
+    commands = [
+        Command(CommandTypes.INIT, (6,)),
+        Command(CommandTypes.H, (0,)),
+        Command(CommandTypes.MZZ, (0, 1)),
+        Command(CommandTypes.H, (0,)),
+        Command(CommandTypes.H, (3,)),
+        Command(CommandTypes.MXX, (0, 1)),
+        Command(CommandTypes.H, (0,)),
+    ]
+    lay = main.layout_commands(iter(commands), 1, schedule_commands=True)
+
+    patch_0 = lay.layer_map.get_qubit_coordinate_2d("circuit_0")
+    patch_3 = lay.layer_map.get_qubit_coordinate_2d("circuit_3")
+
+    hadamard_times = {}
+    measurement_times = []
+    for ((i, j, t), cell) in lay.coordinates.placed_cells():
+        for op_id in cell.operations:
+            op_type = lay.operations_dictionary[op_id].op_type
+            if op_type.name == "HADAMARD_QUBIT":
+                hadamard_times.setdefault((i, j), []).append(t)
+            elif op_type.name == "USE_ANCILLA":
+                measurement_times.append(t)
+
+    (h1, h2, h3) = sorted(hadamard_times[patch_0])
+    (mzz, mxx) = sorted(set(measurement_times))
+    assert h1 < mzz < h2 < mxx < h3
+
+    # the Hadamard on the idle qubit 3 does not wait for the commands on the qubits 0 and 1
+    assert hadamard_times[patch_3] == [0]
+
+
+def test_report_scheduled_depth_of_single_use_input():
+    circuit = random_qasm(nr_qubits=6, nr_gates=40, seed=4)
+
+    depths = main.report_scheduled_depth(circuit)
+    assert main.report_scheduled_depth(line for line in circuit.splitlines()) == depths
+    assert depths[1] <= depths[0]
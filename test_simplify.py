@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from skc.simplify import *
+
+
+# the rules of manage/generate_su2.py
+def su2_rules():
+    return [IdentityRule(),
+            DoubleIdentityRule('H'),
+            AdjointRule(),
+            GeneralRule(['T'] * 8, 'I'),
+            GeneralRule(['Td'] * 8, 'I')]
+
+
+class SwapRule(SimplifyRule):
+    # a rule which is not compiled: T H = H T, such that the engines call it with its arguments
+    def __init__(self):
+        SimplifyRule.__init__(self, "TH = HT", 2)
+
+    def __simplify__(self, arg_list):
+        if arg_list == ['T', 'H']:
+            return (True, 'HT')
+        return (False, '')
+
+
+def random_sequence(rnd, names):
+    return [rnd.choice(names) for _ in range(rnd.randrange(0, 30))]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_compiled_engine_has_the_same_normal_forms(seed):
+    rnd = random.Random(seed)
+    rules = su2_rules()
+    # the rules are applied in order, which changes the normal forms
+    rnd.shuffle(rules)
+    rules += [GeneralRule(['H', 'T', 'H'], 'X'), DoubleIdentityRule('X'), SwapRule()]
+
+    engine = SimplifyEngine(rules)
+    compiled_engine = CompiledSimplifyEngine(rules)
+
+    names = ['H', 'T', 'Td', 'I', 'X', 'Hd']
+    for _ in range(500):
+        sequence = random_sequence(rnd, names)
+        assert compiled_engine.simplify(sequence) == engine.simplify(sequence), sequence
+
+
+def test_compiled_engine_does_not_change_the_sequence():
+    sequence = ['H', 'H', 'T', 'Td']
+    assert CompiledSimplifyEngine(su2_rules()).simplify(sequence) == (3, ['I'])
+    assert sequence == ['H', 'H', 'T', 'Td']
+
+
+def test_generated_sequences_have_the_same_normal_forms():
+    # the sequences which the generation extends, see manage/benchmark_simplify.py
+    rules = su2_rules()
+    engine = SimplifyEngine(rules)
+    compiled_engine = CompiledSimplifyEngine(rules)
+
+    sequences = [[]]
+    for _ in range(6):
+        extended = []
+        for sequence in sequences:
+            for name in ['H', 'T', 'Td']:
+                (length, simplified) = engine.simplify(sequence + [name])
+                assert compiled_engine.simplify(sequence + [name]) == (length, simplified)
+                if simplified != ['I']:
+                    extended.append(simplified)
+        sequences = extended
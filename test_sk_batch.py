@@ -0,0 +1,133 @@
+import math
+
+import numpy
+import pytest
+
+import skc.dawson as dawson
+from skc.ancestors import flatten_ancestors
+from skc.basic_approx.search import load_or_build_kdtree
+from skc.basis import X_AXIS, cart3d_to_h2
+from skc.compose import axis_to_unitary
+from skc.dawson.batch import solovay_kitaev_batch, dawson_group_factor_batch, dagger_batch
+from skc.dawson.factor import dawson_group_factor
+from skc.operator import Operator, H, T
+from skc.utils import matrixify, fowler_distance, fowler_distances
+
+from test_generate import generate_tree_files
+
+L0 = 7
+
+
+@pytest.fixture(scope="module")
+def tree_files(tmp_path_factory):
+    dirname = str(tmp_path_factory.mktemp("su2"))
+    settings = generate_tree_files(dirname, L0)
+    return dirname, settings.basis
+
+
+@pytest.fixture(params=["array", "table"])
+def sk_tree(request, tree_files, monkeypatch):
+    # the globals of the SK compiler, as PrepareCircuit.initialise_skc sets them
+    dirname, basis = tree_files
+    tree = load_or_build_kdtree(dirname, L0, request.param)
+    monkeypatch.setattr(dawson, "the_tree", tree)
+    monkeypatch.setattr(dawson, "the_tree_files", ("su2", L0))
+    monkeypatch.setattr(dawson, "the_basis", basis)
+    monkeypatch.setattr(dawson, "the_axis", X_AXIS)
+    monkeypatch.setattr(dawson, "the_factor_method", dawson_group_factor)
+    monkeypatch.setattr(dawson, "the_candidates", None)
+    return tree
+
+
+def random_unitaries(basis, count, seed, max_angle=math.pi):
+    rnd = numpy.random.default_rng(seed)
+    unitaries = []
+    for _ in range(count):
+        axis = rnd.normal(size=3)
+        axis /= numpy.linalg.norm(axis)
+        # axis_to_unitary rotates by twice the angle
+        angle = rnd.uniform(0, max_angle)
+        unitaries.append(numpy.asarray(axis_to_unitary(cart3d_to_h2(x=axis[0], y=axis[1], z=axis[2]), angle, basis)))
+    return numpy.array(unitaries)
+
+
+def sequence_matrix(ancestors):
+    # the names are H or T, followed by one d for each dagger
+    matrix = numpy.eye(2, dtype=complex)
+    for name in flatten_ancestors(ancestors):
+        gate = numpy.asarray({"H": H, "T": T}[name[0]].matrix)
+        if (len(name) - 1) % 2 == 1:
+            gate = gate.conj().T
+        matrix = matrix @ gate
+    return matrix
+
+
+def batch_factor(matrix_U, basis, x_axis):
+    # the batched factoring of a single matrix, with the interface of dawson_group_factor
+    (V, W) = dawson_group_factor_batch(numpy.asarray(matrix_U)[None])
+    return (V[0], W[0])
+
+
+def test_basic_approximations_are_the_serial_ones(sk_tree):
+    unitaries = random_unitaries(dawson.the_basis, 30, seed=0)
+
+    (matrices, ancestors) = solovay_kitaev_batch(unitaries, 0)
+
+    for (U, matrix, sequence) in zip(unitaries, matrices, ancestors):
+        serial = dawson.solovay_kitaev(Operator("U", matrixify(U)), 0)
+        assert flatten_ancestors(sequence) == flatten_ancestors(serial.ancestors)
+        assert numpy.allclose(matrix, serial.matrix, atol=1e-14)
+
+
+def test_factors_are_the_serial_factors(tree_files):
+    dirname, basis = tree_files
+
+    # in SU(2), the rotations by less than pi are factored like dawson_group_factor does
+    for U in random_unitaries(basis, 50, seed=2, max_angle=0.49 * math.pi):
+        (V, W) = dawson_group_factor(matrixify(U), basis, X_AXIS)
+        (batch_V, batch_W) = batch_factor(U, basis, X_AXIS)
+        assert numpy.allclose(batch_V, V, atol=1e-10)
+        assert numpy.allclose(batch_W, W, atol=1e-10)
+
+    # all the factors are balanced group commutators of the unitary
+    unitaries = random_unitaries(basis, 50, seed=3)
+    (V, W) = dawson_group_factor_batch(unitaries)
+    commutators = V @ W @ dagger_batch(V) @ dagger_batch(W)
+    assert fowler_distances(commutators, numpy.eye(2)) == pytest.approx(
+        [fowler_distance(U, numpy.eye(2)) for U in unitaries], abs=1e-7)
+    for (U, commutator) in zip(unitaries, commutators):
+        assert fowler_distance(commutator, U) < 1e-6
+
+
+@pytest.mark.parametrize("n", [1, 2, 3])
+def test_batch_is_the_serial_recursion(sk_tree, monkeypatch, n):
+    # the serial recursion takes the rotation angle from the principal matrix logarithm, so
+    # it is compared with the batch when both factor alike
+    monkeypatch.setattr(dawson, "the_factor_method", batch_factor)
+    unitaries = random_unitaries(dawson.the_basis, 10, seed=n)
+
+    (matrices, ancestors) = solovay_kitaev_batch(unitaries, n)
+
+    for (U, matrix, sequence) in zip(unitaries, matrices, ancestors):
+        serial = dawson.solovay_kitaev(Operator("U", matrixify(U)), n)
+        assert numpy.allclose(matrix, serial.matrix, atol=1e-12)
+        # the equally close basic approximations can be different sequences of the same operator
+        assert fowler_distance(sequence_matrix(sequence), matrix) < 1e-6
+        assert fowler_distance(sequence_matrix(serial.ancestors), serial.matrix) < 1e-6
+
+
+def test_array_and_table_indexes_give_the_same_sequences(tree_files):
+    dirname, basis = tree_files
+    unitaries = random_unitaries(basis, 10, seed=4)
+
+    results = []
+    for tree_index in ["array", "table"]:
+        dawson_tree = load_or_build_kdtree(dirname, L0, tree_index)
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            monkeypatch.setattr(dawson, "the_tree", dawson_tree)
+            monkeypatch.setattr(dawson, "the_candidates", None)
+            (matrices, ancestors) = solovay_kitaev_batch(unitaries, 2)
+        results.append((matrices, [flatten_ancestors(sequence) for sequence in ancestors]))
+
+    assert numpy.array_equal(results[0][0], results[1][0])
+    assert results[0][1] == results[1][1]
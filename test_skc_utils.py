@@ -0,0 +1,87 @@
+import math
+
+import numpy
+import pytest
+import scipy.linalg
+
+from skc.operator import H, T, T_inv
+from skc.utils import matrixify, operator_norm, trace_distance, fowler_distance, fowler_distances, trace_norm
+
+
+# the eigenvalue based kernels, before their closed forms
+def old_trace_norm(M):
+    M = matrixify(M)
+    return math.sqrt(numpy.trace(M * M.H).real)
+
+
+def old_operator_norm(M):
+    return numpy.max([numpy.abs(x) for x in scipy.linalg.eigvals(M)])
+
+
+def old_trace_distance(matrix_A, matrix_B):
+    matrix_diff = matrixify(matrix_A) - matrixify(matrix_B)
+    product = matrix_diff * numpy.transpose(numpy.conjugate(matrix_diff))
+    return scipy.linalg.norm(scipy.linalg.eigvals(product))
+
+
+def old_fowler_distance(matrix_A, matrix_B):
+    d = matrix_A.shape[0]
+    trace = numpy.trace(numpy.transpose(numpy.conjugate(matrixify(matrix_A))) * matrixify(matrix_B))
+    return math.sqrt(numpy.abs((d - numpy.abs(trace)) / d))
+
+
+def random_matrix(rnd, d):
+    return rnd.normal(size=(d, d)) + 1j * rnd.normal(size=(d, d))
+
+
+def random_unitary(rnd, d):
+    q, r = numpy.linalg.qr(random_matrix(rnd, d))
+    return q * (numpy.diag(r) / numpy.abs(numpy.diag(r)))
+
+
+@pytest.mark.parametrize("d", [2, 4])
+def test_closed_forms_match_the_eigenvalue_kernels(d):
+    rnd = numpy.random.default_rng(d)
+    for _ in range(50):
+        A = random_matrix(rnd, d)
+        B = random_matrix(rnd, d)
+        U = random_unitary(rnd, d)
+        V = random_unitary(rnd, d)
+
+        # numpy.matrix and numpy.ndarray operands give the same values
+        for (X, Y) in [(A, B), (matrixify(A), matrixify(B))]:
+            assert trace_norm(X) == pytest.approx(old_trace_norm(A), rel=1e-12)
+            assert trace_distance(X, Y) == pytest.approx(old_trace_distance(A, B), rel=1e-12)
+        for (X, Y) in [(U, V), (matrixify(U), matrixify(V))]:
+            assert fowler_distance(X, Y) == pytest.approx(old_fowler_distance(U, V), rel=1e-9, abs=1e-12)
+
+        # the 2x2 closed form of the operator norm is for the eigenvalues, not the singular values
+        assert operator_norm(A) == pytest.approx(old_operator_norm(A), rel=1e-12)
+        assert operator_norm(matrixify(A)) == pytest.approx(old_operator_norm(A), rel=1e-12)
+
+
+def test_distances_of_close_operators():
+    rnd = numpy.random.default_rng(0)
+    U = random_unitary(rnd, 2)
+    for phase in (1, -1, 1j):
+        assert fowler_distance(U, phase * U) == pytest.approx(0, abs=1e-7)
+    assert trace_distance(U, U) == 0
+
+    # the batched distances are the distances of each matrix
+    matrices = numpy.array([random_unitary(rnd, 2) for _ in range(20)])
+    expected = [old_fowler_distance(M, U) for M in matrices]
+    assert fowler_distances(matrices, U) == pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+
+def test_operators_on_ndarrays_match_numpy_matrix_operators():
+    product = H.multiply(T).multiply(T_inv.dagger()).multiply(H.dagger())
+    array_product = H.as_ndarray().multiply(T.as_ndarray()).multiply(T_inv.as_ndarray().dagger()) \
+        .multiply(H.as_ndarray().dagger())
+
+    assert isinstance(product.matrix, numpy.matrix)
+    assert type(array_product.matrix) is numpy.ndarray
+    assert numpy.allclose(array_product.matrix, product.matrix, atol=1e-14)
+    assert array_product.ancestors == product.ancestors == ["H", "T", "Tdd", "Hd"]
+
+    # the dagger with ndarray matrices is the conjugate transpose
+    assert numpy.allclose(T.as_ndarray().dagger().matrix, T.matrix.H, atol=1e-15)
@@ -0,0 +1,131 @@
+import random
+
+import numpy as np
+
+import volume as vol
+
+
+def span(*cells):
+    return tuple(np.array(coordinates, dtype=np.int64) for coordinates in zip(*cells))
+
+
+def test_busy_until_after_removing_cells():
+    volume = vol.SparseVolume(2, 2)
+    volume.ensure_time_coordinate(10)
+
+    for t in (2, 3, 7):
+        volume[0][1][t] = "cell"
+    assert volume.busy_until[0, 1] == 8
+    assert volume.get_depth() == 8
+
+    # removing a cell before the last one does not move the skyline
+    volume[0][1][3] = None
+    assert volume.busy_until[0, 1] == 8
+
+    # removing the last cell moves it back to the previous cell
+    volume[0][1][7] = None
+    assert volume.busy_until[0, 1] == 3
+
+    volume[0][1][2] = None
+    assert volume.busy_until[0, 1] == 0
+    assert volume.get_depth() == 0
+
+
+def test_intervals_match_the_placed_cells():
+    rnd = random.Random(0)
+    volume = vol.SparseVolume(1, 1, 40)
+    column = volume[0][0]
+
+    for _ in range(500):
+        t = rnd.randrange(40)
+        column[t] = "cell" if rnd.random() < 0.6 else None
+
+        times = np.arange(45)
+        assert column.find_busy(times).tolist() == [int(x) in column.cells for x in times]
+        assert volume.busy_until[0, 0] == ((max(column.cells) + 1) if column.cells else 0)
+
+        # the intervals are sorted and disjoint, and do not touch
+        assert all(end > start for start, end in zip(column.busy_starts, column.busy_ends))
+        assert all(end < start for end, start in zip(column.busy_ends, column.busy_starts[1:]))
+
+
+def test_place_cells_matches_placing_each_cell():
+    rnd = random.Random(1)
+    volume = vol.SparseVolume(3, 3, 60)
+    batched_volume = vol.SparseVolume(3, 3, 60)
+
+    for _ in range(200):
+        # an operation, whose cells can be consecutive along the time axis
+        cells = {}
+        for _ in range(rnd.randrange(1, 6)):
+            (si, sj, st) = (rnd.randrange(3), rnd.randrange(3), rnd.randrange(50))
+            for t in range(st, st + rnd.randrange(1, 4)):
+                cells[(si, sj, t)] = "cell"
+
+        for (si, sj, st), cell in cells.items():
+            volume[si][sj][st] = cell
+        batched_volume.place_cells(cells)
+
+        assert np.array_equal(batched_volume.busy_until, volume.busy_until)
+        for si in range(3):
+            for sj in range(3):
+                column, batched_column = volume[si][sj], batched_volume[si][sj]
+                assert batched_column.cells == column.cells
+                assert batched_column.busy_starts == column.busy_starts
+                assert batched_column.busy_ends == column.busy_ends
+
+
+def test_earliest_free_offset_finds_a_gap_before_the_skyline():
+    volume = vol.SparseVolume(2, 2)
+    volume.ensure_time_coordinate(20)
+
+    # (0, 0) is free at 4 and 5, and busy until 20
+    for t in list(range(0, 4)) + list(range(6, 20)):
+        volume[0][0][t] = "cell"
+    volume[1][0][5] = "cell"
+
+    assert volume.earliest_free_offset(*span((0, 0, 0))) == 4
+    # both cells have to be free: at the offset 4, (1, 0) is busy at 4 + 1
+    assert volume.earliest_free_offset(*span((0, 0, 0), (1, 0, 1))) == 5
+    # two consecutive time steps on (0, 0) fit in the gap
+    assert volume.earliest_free_offset(*span((0, 0, 0), (0, 0, 1))) == 4
+    # three do not, they go after the skyline
+    assert volume.earliest_free_offset(*span((0, 0, 0), (0, 0, 1), (0, 0, 2))) == 20
+    # a free patch does not wait
+    assert volume.earliest_free_offset(*span((1, 1, 3))) == 0
+
+
+def test_earliest_free_offset_with_capped_windows(monkeypatch):
+    monkeypatch.setattr(vol, "MAX_WINDOW", 4)
+
+    volume = vol.SparseVolume(1, 1, 200)
+    for t in range(200):
+        if t != 150:
+            volume[0][0][t] = "cell"
+
+    # the gap is found after many windows of at most 4 offsets
+    assert volume.earliest_free_offset(*span((0, 0, 0)), window=2) == 150
+
+
+def test_placed_cells_order():
+    volume = vol.SparseVolume(3, 2, 10)
+    cells = [(2, 1, 0), (0, 1, 5), (0, 1, 2), (1, 0, 9), (0, 0, 7)]
+    for (i, j, t) in cells:
+        volume[i][j][t] = (i, j, t)
+
+    placed = list(volume.placed_cells())
+
+    assert [coordinate for coordinate, cell in placed] == sorted(cells)
+    assert all(coordinate == cell for coordinate, cell in placed)
+    assert volume.get_number_of_cells() == len(cells)
+
+
+def test_free_cells_at():
+    volume = vol.SparseVolume(2, 3, 5)
+    volume[1][2][4] = "cell"
+    volume[0][1][4] = "cell"
+    volume[0][1][3] = "cell"
+
+    assert volume.free_cells_at(4).tolist() == [True, False, True, True, True, False]
+    assert volume.free_cells_at(3).tolist() == [True, False, True, True, True, True]
+    assert volume.free_cells_at(100).all()
@@ -0,0 +1,359 @@
+'''
+Sparse storage of the 3D cells of a layout
+
+The layout used to be a dense numpy object array of size (i, j, t) where t was the worst case
+number of time steps. Almost all of the entries were None. Here only the cells which were placed are stored,
+and the time axis grows when it is needed.
+
+The access pattern is the same as for the dense array: volume[i][j][t]
+
+Next to the cells, each (i, j) patch keeps its occupied time coordinates as sorted, disjoint intervals.
+A patch which is used for many consecutive time steps is a single interval, such that the memory
+scales with the number of placed cells (or less) and not with i * j * t.
+The intervals answer for many time offsets at once where a set of cells can be placed.
+
+For each (i, j) patch the volume remembers also until when the patch is busy (the skyline).
+Placing a set of cells after the skyline is always possible, so the skyline bounds the search.
+'''
+
+import bisect
+
+import numpy as np
+
+# the largest number of time offsets checked at once by earliest_free_offset
+MAX_WINDOW = 1024
+
+
+class TimeColumn:
+    """
+    The cells of a single (i, j) patch along the time axis
+    Only the cells which were placed are stored in a dictionary indexed by the time coordinate
+    """
+    def __init__(self, volume, i, j):
+        # the volume holds the size of the time axis, which is the same for all the columns
+        self.volume = volume
+        self.cells = {}
+
+        # the occupied time coordinates as sorted, disjoint intervals [busy_starts[k], busy_ends[k])
+        self.busy_starts = []
+        self.busy_ends = []
+
+        # the 2D coordinates of the column are needed to update the occupancy of the volume
+        self.i = i
+        self.j = j
+
+    def __len__(self):
+        return self.volume.time_dimension
+
+    def normalise_time_coordinate(self, t):
+        # behave like the numpy array: negative indices are counted from the end
+        if t < 0:
+            t += len(self)
+
+        if (t < 0) or (t >= len(self)):
+            raise IndexError("Time coordinate %s is outside of the volume" % str(t))
+
+        return t
+
+    def __getitem__(self, t):
+        if not (0 <= t < self.volume.time_dimension):
+            t = self.normalise_time_coordinate(t)
+        # an empty cell is None, like in the dense version
+        return self.cells.get(t)
+
+    def __setitem__(self, t, value):
+        t = self.normalise_time_coordinate(t)
+        if value is None:
+            self.cells.pop(t, None)
+        else:
+            self.cells[t] = value
+
+        self.volume.mark_occupied(self.i, self.j, t, value is not None)
+
+    def __iter__(self):
+        for t in range(len(self)):
+            yield self.cells.get(t)
+
+    def mark_busy(self, t):
+        k = bisect.bisect_right(self.busy_starts, t)
+        if (k > 0) and (self.busy_ends[k - 1] >= t):
+            if self.busy_ends[k - 1] > t:
+                # already busy
+                return
+            # extend the previous interval, and merge it with the next one if they touch
+            self.busy_ends[k - 1] = t + 1
+            if (k < len(self.busy_starts)) and (self.busy_starts[k] == t + 1):
+                self.busy_ends[k - 1] = self.busy_ends[k]
+                del self.busy_starts[k]
+                del self.busy_ends[k]
+        elif (k < len(self.busy_starts)) and (self.busy_starts[k] == t + 1):
+            # extend the next interval
+            self.busy_starts[k] = t
+        else:
+            self.busy_starts.insert(k, t)
+            self.busy_ends.insert(k, t + 1)
+
+    def mark_busy_range(self, start, end):
+        # mark [start, end) as busy, and merge it with the intervals which overlap or touch it
+        if (len(self.busy_ends) == 0) or (start > self.busy_ends[-1]):
+            # the cells are usually placed after the last interval
+            self.busy_starts.append(start)
+            self.busy_ends.append(end)
+            return
+        if start == self.busy_ends[-1]:
+            self.busy_ends[-1] = end
+            return
+
+        lo = bisect.bisect_left(self.busy_ends, start)
+        hi = bisect.bisect_right(self.busy_starts, end)
+        if lo < hi:
+            start = min(start, self.busy_starts[lo])
+            end = max(end, self.busy_ends[hi - 1])
+        self.busy_starts[lo:hi] = [start]
+        self.busy_ends[lo:hi] = [end]
+
+    def mark_busy_times(self, times):
+        '''
+        Marks many time coordinates as busy, one interval for each run of consecutive ones
+        :param times: list of time coordinates
+        '''
+        if len(times) == 1:
+            self.mark_busy_range(times[0], times[0] + 1)
+            return
+
+        times = sorted(times)
+        start = times[0]
+        for k in range(1, len(times)):
+            if times[k] > times[k - 1] + 1:
+                self.mark_busy_range(start, times[k - 1] + 1)
+                start = times[k]
+        self.mark_busy_range(start, times[-1] + 1)
+
+    def mark_free(self, t):
+        k = bisect.bisect_right(self.busy_starts, t) - 1
+        if (k < 0) or (self.busy_ends[k] <= t):
+            # already free
+            return
+
+        start, end = self.busy_starts[k], self.busy_ends[k]
+        if (start == t) and (end == t + 1):
+            del self.busy_starts[k]
+            del self.busy_ends[k]
+        elif start == t:
+            self.busy_starts[k] = t + 1
+        elif end == t + 1:
+            self.busy_ends[k] = t
+        else:
+            # split the interval
+            self.busy_ends[k] = t
+            self.busy_starts.insert(k + 1, t + 1)
+            self.busy_ends.insert(k + 1, end)
+
+    def find_busy(self, times):
+        '''
+        :param times: numpy array of time coordinates
+        :return: numpy boolean array, True where the time coordinate is occupied
+        '''
+        if len(self.busy_starts) == 0:
+            return np.zeros(len(times), dtype=bool)
+
+        k = np.searchsorted(self.busy_starts, times, side="right") - 1
+        ends = np.asarray(self.busy_ends)[np.maximum(k, 0)]
+        return (k >= 0) & (times < ends)
+
+    def get_busy_until(self):
+        # the first time coordinate after the last occupied cell
+        return self.busy_ends[-1] if len(self.busy_ends) > 0 else 0
+
+
+class SparseVolume:
+    """
+    The 3D volume of a layout. It is indexed like a three dimensional array volume[i][j][t]
+    The memory scales with the number of placed cells and not with i * j * t
+    """
+    def __init__(self, dimension_i, dimension_j, time_dimension=1):
+        self.time_dimension = time_dimension
+
+        self.columns = []
+        for si in range(dimension_i):
+            self.columns.append([TimeColumn(self, si, sj) for sj in range(dimension_j)])
+
+        # the first time coordinate after the last placed cell of each (i, j) patch
+        # it is the end of the last busy interval of the column, and is stored for the vectorised queries
+        self.busy_until = np.zeros((dimension_i, dimension_j), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __getitem__(self, i):
+        return self.columns[i]
+
+    def add_time_slices(self, nr_slices=1):
+        '''
+        Grow the volume along the time axis. Nothing is allocated.
+        :param nr_slices: how many time steps to add
+        :return: the new size of the time axis
+        '''
+        self.time_dimension += nr_slices
+        return self.time_dimension
+
+    def ensure_time_coordinate(self, t):
+        '''
+        Grow the volume such that the time coordinate t is inside of it
+        :param t: time coordinate
+        :return: the size of the time axis
+        '''
+        if t >= self.time_dimension:
+            self.add_time_slices(t - self.time_dimension + 1)
+        return self.time_dimension
+
+    def mark_occupied(self, i, j, t, is_occupied):
+        column = self.columns[i][j]
+        if is_occupied:
+            column.mark_busy(t)
+        else:
+            column.mark_free(t)
+
+        # update the skyline
+        self.busy_until[i, j] = column.get_busy_until()
+
+    def place_cells(self, cells):
+        '''
+        Places many cells at once, like volume[i][j][t] = cell for each of them
+        The busy intervals of a column and the skyline are updated once per call, and not once per cell
+        :param cells: dictionary {(i, j, t): cell} of cells which are not None
+        '''
+        times_of_columns = {}
+        for (si, sj, st), cell in cells.items():
+            column = self.columns[si][sj]
+            if not (0 <= st < self.time_dimension):
+                st = column.normalise_time_coordinate(st)
+            column.cells[st] = cell
+
+            times = times_of_columns.get(column)
+            if times is None:
+                times_of_columns[column] = [st]
+            else:
+                times.append(st)
+
+        if len(times_of_columns) == 0:
+            return
+
+        for column, times in times_of_columns.items():
+            column.mark_busy_times(times)
+
+        # update the skyline
+        columns = list(times_of_columns)
+        span_i = np.array([column.i for column in columns])
+        span_j = np.array([column.j for column in columns])
+        self.busy_until[span_i, span_j] = [column.get_busy_until() for column in columns]
+
+    def skyline_offset(self, span_i, span_j, span_t):
+        '''
+        The delay after which all the cells of the span set are after the skyline
+        :return: the offset, which is zero if the cells are already free
+        '''
+        delays = self.busy_until[span_i, span_j] - span_t
+        return max(0, int(delays.max()))
+
+    def find_busy_offsets(self, span_i, span_j, span_t, offsets):
+        '''
+        For each of the offsets, is any of the cells of the span set occupied when moved by the offset?
+        :param span_i: numpy array of the i coordinates of the span set
+        :param span_j: numpy array of the j coordinates of the span set
+        :param span_t: numpy array of the t coordinates of the span set
+        :param offsets: numpy array of time offsets to check
+        :return: numpy boolean array, True for the offsets where at least a cell is busy
+        '''
+        busy = np.zeros(len(offsets), dtype=bool)
+        first_offset = int(offsets.min()) if len(offsets) > 0 else 0
+
+        for (si, sj, st) in zip(span_i.tolist(), span_j.tolist(), span_t.tolist()):
+            if st + first_offset >= self.busy_until[si, sj]:
+                # the cell is after the skyline for all the offsets
+                continue
+            busy |= self.columns[si][sj].find_busy(st + offsets)
+
+        return busy
+
+    def free_cells_between(self, t_start, t_stop):
+        '''
+        :param t_start: first time coordinate
+        :param t_stop: time coordinate after the last one
+        :return: numpy boolean array (t_stop - t_start, dimension_i * dimension_j), True where the cell indexed by
+        i * dimension_j + j is free at the time coordinate t_start + row
+        '''
+        times = np.arange(t_start, t_stop)
+        free = np.ones((len(times), self.busy_until.size), dtype=bool)
+
+        # the patches are free after the skyline, and only the others are looked up in their intervals
+        dimension_j = self.busy_until.shape[1]
+        for cell in np.flatnonzero(self.busy_until.ravel() > t_start).tolist():
+            free[:, cell] = ~self.columns[cell // dimension_j][cell % dimension_j].find_busy(times)
+
+        return free
+
+    def free_cells_at(self, t):
+        '''
+        :param t: time coordinate
+        :return: flat numpy boolean array indexed by i * dimension_j + j, True where the cell is free at time t
+        '''
+        return self.free_cells_between(t, t + 1)[0]
+
+    def earliest_free_offset(self, span_i, span_j, span_t, window=32):
+        '''
+        Computes the smallest time offset at which all the cells of the span set are free
+        The skyline gives the offset directly. Only if it is not zero, the offsets before it are checked
+        in windows for a gap where the span set fits. The window size is doubled after each unsuccessful one,
+        up to MAX_WINDOW offsets, such that a query does not grow with the depth of the layout.
+        :return: the offset
+        '''
+        max_offset = self.skyline_offset(span_i, span_j, span_t)
+
+        offset = 0
+        while offset < max_offset:
+            offsets = np.arange(offset, min(offset + window, max_offset))
+            busy = self.find_busy_offsets(span_i, span_j, span_t, offsets)
+
+            free = np.flatnonzero(~busy)
+            if len(free) > 0:
+                return int(offsets[free[0]])
+
+            offset += window
+            window = min(2 * window, MAX_WINDOW)
+
+        return max_offset
+
+    def get_depth(self):
+        '''
+        :return: the number of time slices until the last placed cell, which can be less than the time dimension
+        '''
+        return int(self.busy_until.max()) if self.busy_until.size > 0 else 0
+
+    def get_free_time(self, i_start, i_stop, j_start, j_stop):
+        '''
+        :return: the time after the last placed cell in the rectangle of patches [i_start, i_stop) x [j_start, j_stop)
+        '''
+        region = self.busy_until[i_start:i_stop, j_start:j_stop]
+        return int(region.max()) if region.size > 0 else 0
+
+    def get_number_of_cells(self):
+        '''
+        :return: the number of cells which were placed in the volume
+        '''
+        total = 0
+        for row in self.columns:
+            for column in row:
+                total += len(column.cells)
+        return total
+
+    def placed_cells(self):
+        '''
+        Iterates over the placed cells in the order (i, j, t), without visiting the empty ones
+        :return: generator of ((i, j, t), cell) tuples
+        '''
+        for si in range(len(self.columns)):
+            for sj in range(len(self.columns[si])):
+                column = self.columns[si][sj]
+                for st in sorted(column.cells):
+                    yield (si, sj, st), column.cells[st]